@@ -0,0 +1,84 @@
+"""
+Offline batch evaluation: replay a JSONL file of questions against the local index.
+
+    python -m scripts.batch_eval --in data/eval/questions.jsonl --out data/eval/results.jsonl
+    python -m scripts.batch_eval --in questions.jsonl --generate --concurrency 8
+    python -m scripts.batch_eval --in questions.jsonl --fake      # no API key: scripts/fake_gemini.py
+
+Input, one object per line:  {"query": "...", "id"?: ..., "top_k"?: ..., "expected_source"?: "faq.txt"}
+Output, one object per line, in input order (see rag.answer_batch). Input is read lazily
+and results are written as they come, so the file can be larger than memory.
+
+Queries are embedded --batch-size at a time and scored with one matrix-matrix product per
+segment (instead of one embedding call + one scan per question). With --generate, answers
+are produced with at most --concurrency model calls in flight.
+When lines carry "expected_source", hit@k and MRR of the retrieved sources are reported.
+"""
+import argparse
+import json
+import sys
+import time
+
+
+def _read(path):
+    with (sys.stdin if path == "-" else open(path, "r", encoding="utf-8")) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not item.get("query"):
+                raise SystemExit(f"{path}:{n}: expected an object with a 'query'")
+            item.setdefault("id", n)
+            yield item
+
+
+def main(inp, out, top_k, generate, concurrency, batch_size):
+    from src.core.rag import answer_batch
+
+    expected = {}
+
+    def items():
+        for it in _read(inp):
+            if it.get("expected_source"):
+                expected[it["id"]] = it["expected_source"]
+            yield it
+
+    n = scored = hits = 0
+    rr = 0.0
+    t0 = time.perf_counter()
+    with (sys.stdout if out == "-" else open(out, "w", encoding="utf-8")) as f:
+        for rec in answer_batch(items(), top_k=top_k, generate=generate,
+                                concurrency=concurrency, batch_size=batch_size):
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+            want = expected.pop(rec["id"], None)
+            if want is not None:
+                scored += 1
+                sources = [h["source"] for h in rec["hits"]]
+                if want in sources:
+                    hits += 1
+                    rr += 1.0 / (sources.index(want) + 1)
+    dt = time.perf_counter() - t0
+
+    print(f"{n} queries in {dt:.2f}s ({n / dt if dt else 0:.0f} q/s)"
+          f"{' with generation' if generate else ''}", file=sys.stderr)
+    if scored:
+        print(f"hit@{top_k} = {hits / scored:.3f}   MRR = {rr / scored:.3f}   ({scored} labelled)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", required=True, help="JSONL questions ('-' for stdin)")
+    ap.add_argument("--out", default="-", help="JSONL results ('-' for stdout)")
+    ap.add_argument("--top-k", type=int, default=6)
+    ap.add_argument("--generate", action="store_true", help="also generate answers (model calls)")
+    ap.add_argument("--concurrency", type=int, default=8, help="model calls in flight with --generate")
+    ap.add_argument("--batch-size", type=int, default=256, help="queries per embedding/search batch")
+    ap.add_argument("--fake", action="store_true", help="use scripts/fake_gemini.py (no API key / network)")
+    args = ap.parse_args()
+    if args.fake:
+        from scripts import fake_gemini
+
+        fake_gemini.install(latency_ms=20)
+        fake_gemini.install_model(200)
+    main(args.inp, args.out, args.top_k, args.generate, args.concurrency, args.batch_size)
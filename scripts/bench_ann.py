@@ -0,0 +1,76 @@
+"""
+Recall@k vs. latency for the IVF index against exact search.
+
+    python -m scripts.bench_ann                          # 100k chunks, dim 768
+    python -m scripts.bench_ann --n 1000000 --nprobe 4 8 16 32
+
+The corpus is a synthetic mixture of Gaussian clusters (real embeddings are
+clustered; uniform noise would make any IVF look bad). Pick the smallest
+nprobe that meets your recall target and set IVF_NPROBE to it.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.core.ann import build_ivf, ivf_candidates
+from src.core.vectordb import _normalize, _top_k
+
+
+def _corpus(n, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return _normalize(centers[labels] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32))
+
+
+def _ivf_search(ivf, matrix, q, k, nprobe):
+    rows = np.sort(ivf_candidates(ivf, q, nprobe))
+    scores = matrix[rows] @ q
+    return rows[_top_k(scores, k)], len(rows)
+
+
+def _pct(xs, p):
+    return float(np.percentile(np.asarray(xs) * 1e3, p))
+
+
+def run(n, dim, k, queries, nlist, nprobes, clusters):
+    rng = np.random.default_rng(0)
+    matrix = _corpus(n, dim, clusters, rng)
+    qs = _corpus(queries, dim, clusters, np.random.default_rng(1))
+
+    t0 = time.perf_counter()
+    ivf = build_ivf(matrix, nlist or None)
+    print(f"n={n} dim={dim} nlist={ivf['centroids'].shape[0]} build={time.perf_counter() - t0:.1f}s")
+
+    truth, exact_t = [], []
+    for q in qs:
+        t0 = time.perf_counter()
+        truth.append(set(_top_k(matrix @ q, k).tolist()))
+        exact_t.append(time.perf_counter() - t0)
+    print(f"\n{'mode':>12} | {'recall@' + str(k):>9} | {'p50 ms':>7} | {'p99 ms':>7} | rows scored")
+    print("-" * 62)
+    print(f"{'exact':>12} | {1.0:>9.3f} | {_pct(exact_t, 50):>7.2f} | {_pct(exact_t, 99):>7.2f} | {n}")
+
+    for nprobe in nprobes:
+        hits, times, scanned = 0, [], 0
+        for q, want in zip(qs, truth):
+            t0 = time.perf_counter()
+            got, rows = _ivf_search(ivf, matrix, q, k, nprobe)
+            times.append(time.perf_counter() - t0)
+            hits += len(want & set(got.tolist()))
+            scanned += rows
+        print(f"{'nprobe=' + str(nprobe):>12} | {hits / (k * len(qs)):>9.3f} | {_pct(times, 50):>7.2f} | "
+              f"{_pct(times, 99):>7.2f} | {scanned // len(qs)}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("-k", type=int, default=6)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--nlist", type=int, default=0, help="0 = ~sqrt(n)")
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--clusters", type=int, default=500)
+    args = ap.parse_args()
+    run(args.n, args.dim, args.k, args.queries, args.nlist, args.nprobe, args.clusters)
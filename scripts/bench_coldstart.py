@@ -0,0 +1,146 @@
+"""
+Cold start: import time of the API plus latency of the first questions, in fresh processes.
+
+    python -m scripts.bench_coldstart                       # 100k chunks, 3 runs per variant
+    python -m scripts.bench_coldstart --chunks 500000 --runs 5 --drop-caches   # root only
+
+Variants:
+  lazy     import src.app.main, then answer straight away (what PRELOAD_INDEX=false does):
+           the first question pays for the index load and paging in the vectors
+  preload  import, run rag.warm_up() (what the startup hook does before /ready turns 200),
+           then answer
+
+Runs on scripts/fake_gemini.py. The fake imports the google SDK itself, so that import is
+timed on its own ("sdk s"): with the real backend it lands on the first question (lazy)
+or inside warm-up (preload), and before this change it was part of every import.
+Without --drop-caches the index files are usually still in the OS page cache, which
+flatters the lazy variant; the numbers are a lower bound for a fresh machine.
+"""
+import os
+
+os.environ.setdefault("ANSWER_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("EMBED_CACHE_MAX_ENTRIES", "0")
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+QUESTIONS = ["What is the refund window?", "How long does shipping take?"]
+
+
+def _child(variant, embed_ms, gen_ms):
+    """Runs in a fresh interpreter (cwd = the index dir); prints one JSON line."""
+    t0 = time.perf_counter()
+    from src.app import main  # noqa: F401  (what uvicorn imports)
+    from src.core import rag
+    out = {"variant": variant, "import_s": time.perf_counter() - t0}
+
+    t0 = time.perf_counter()
+    from scripts import fake_gemini
+    out["sdk_s"] = time.perf_counter() - t0
+    fake_gemini.install(latency_ms=embed_ms, per_item_ms=0.0)
+    fake_gemini.install_model(gen_ms)
+
+    out["warm_s"] = rag.warm_up()["seconds"] if variant == "preload" else 0.0
+    for name, q in zip(("first_query_s", "second_query_s"), QUESTIONS):
+        t0 = time.perf_counter()
+        rag.answer_query(q, top_k=4)
+        out[name] = time.perf_counter() - t0
+    print("RESULT " + json.dumps(out), flush=True)
+
+
+def _build(workdir, chunks, dim):
+    code = f"""
+import os, numpy as np
+os.chdir({str(workdir)!r})
+from scripts import fake_gemini
+fake_gemini.install(latency_ms=0)
+from src.core.vectordb import add_vectors
+rng = np.random.default_rng(0)
+for i in range(0, {chunks}, 50000):
+    m = min(50000, {chunks} - i)
+    texts = [f"chunk {{i + j}}: refund shipping warranty policy details" for j in range(m)]
+    add_vectors(texts, [{{"source": f"doc{{(i + j) // 50}}.txt"}} for j in range(m)],
+                rng.standard_normal((m, {dim}), dtype=np.float32))
+"""
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, env=_env())
+
+
+def _env():
+    root = str(Path(__file__).resolve().parents[1])
+    return {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])),
+            "PYTHONWARNINGS": "ignore"}
+
+
+def _drop_caches():
+    try:
+        os.sync()
+        Path("/proc/sys/vm/drop_caches").write_text("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def _run_all(workdir, runs, embed_ms, gen_ms, drop_caches, results):
+    for variant in ("lazy", "preload"):
+        for _ in range(runs):
+            if drop_caches and not _drop_caches():
+                print("(could not drop the page cache; run as root for a truly cold disk)")
+                drop_caches = False
+            p = subprocess.run([sys.executable, "-m", "scripts.bench_coldstart", "--child", variant,
+                                "--embed-ms", str(embed_ms), "--gen-ms", str(gen_ms)],
+                               cwd=workdir, env=_env(), capture_output=True, text=True, check=True)
+            line = next(l for l in p.stdout.splitlines() if l.startswith("RESULT "))
+            results.append(json.loads(line[len("RESULT "):]))
+
+
+def main(chunks, dim, runs, embed_ms, gen_ms, drop_caches, out):
+    workdir = Path(tempfile.mkdtemp(prefix="rag-cold-"))
+    print(f"building a {chunks}-chunk index (dim {dim}) in {workdir} ...", flush=True)
+    _build(workdir, chunks, dim)
+
+    results = []
+    try:
+        _run_all(workdir, runs, embed_ms, gen_ms, drop_caches, results)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    cols = ("import_s", "sdk_s", "warm_s", "first_query_s", "second_query_s")
+    print(f"{'variant':>8} | " + " | ".join(f"{c[:-2].replace('_', ' ') + ' s':>14}" for c in cols))
+    print("-" * 90)
+    summary = {}
+    for variant in ("lazy", "preload"):
+        rs = [r for r in results if r["variant"] == variant]
+        summary[variant] = {c: statistics.median(r[c] for r in rs) for c in cols}
+        print(f"{variant:>8} | " + " | ".join(f"{summary[variant][c]:>14.3f}" for c in cols))
+
+    if out:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        Path(out).write_text(json.dumps({"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                         "config": {"chunks": chunks, "dim": dim, "runs": runs, "embed_ms": embed_ms,
+                                                    "gen_ms": gen_ms, "drop_caches": drop_caches},
+                                         "median": summary, "runs": results}, indent=2))
+        print(f"results -> {out}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=100000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--runs", type=int, default=3, help="fresh processes per variant (median reported)")
+    ap.add_argument("--embed-ms", type=float, default=60)
+    ap.add_argument("--gen-ms", type=float, default=400)
+    ap.add_argument("--drop-caches", action="store_true", help="drop the OS page cache before each run (root)")
+    ap.add_argument("--out", default=None, help="also write the results as JSON")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(args.child, args.embed_ms, args.gen_ms)
+    else:
+        main(args.chunks, args.dim, args.runs, args.embed_ms, args.gen_ms, args.drop_caches, args.out)
@@ -0,0 +1,41 @@
+"""
+Embedding throughput: one request per text (the old path) vs. batched + concurrent.
+
+    python -m scripts.bench_embed --texts 2000 --latency-ms 80 --error-rate 0.05
+
+Runs against scripts/fake_gemini.py, which simulates request latency and
+transient 503/429 errors, so no API key or network is needed.
+"""
+import argparse
+import time
+
+from scripts import fake_gemini
+from src.core.embeddings import _embed_all, _canon_model
+
+
+def run(n, latency_ms, per_item_ms, error_rate, configs):
+    texts = [f"support chunk {i} " * 20 for i in range(n)]
+    model = _canon_model("text-embedding-004")
+    print(f"texts={n} latency={latency_ms}ms(+{per_item_ms}ms/item) errors={error_rate:.0%}")
+    print(f"{'batch':>6} | {'conc':>4} | {'seconds':>8} | {'texts/s':>8} | calls | errors")
+    print("-" * 52)
+    for batch, conc in configs:
+        fake_gemini.install(latency_ms, per_item_ms, error_rate)
+        t0 = time.perf_counter()
+        vecs = _embed_all(texts, model, batch_size=batch, concurrency=conc, max_retries=8, backoff=0.01)
+        dt = time.perf_counter() - t0
+        assert len(vecs) == n and vecs[-1] == fake_gemini.fake_vector(texts[-1])
+        st = fake_gemini.stats()
+        print(f"{batch:>6} | {conc:>4} | {dt:>8.2f} | {n / dt:>8.0f} | {st['calls']:>5} | {st['errors']}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--texts", type=int, default=2000)
+    ap.add_argument("--latency-ms", type=float, default=80.0)
+    ap.add_argument("--per-item-ms", type=float, default=0.2)
+    ap.add_argument("--error-rate", type=float, default=0.05)
+    args = ap.parse_args()
+    # (batch size, concurrency); (1, 1) is the old serial per-text behaviour
+    configs = [(1, 1), (100, 1), (100, 4), (50, 8)]
+    run(args.texts, args.latency_ms, args.per_item_ms, args.error_rate, configs)
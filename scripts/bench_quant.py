@@ -0,0 +1,114 @@
+"""
+Quantized vector storage: memory, latency and recall@k of float16 / int8 against float32.
+
+    python -m scripts.bench_quant                          # 200k chunks, dim 768
+    python -m scripts.bench_quant --n 1000000 --rescore 0 2 4 8
+
+Builds one real index (synthetic clustered vectors, like scripts/bench_ann.py), then
+searches it in a fresh process per configuration (VECTOR_STORAGE x VECTOR_RESCORE),
+so resident memory is measured from scratch each time. Reports:
+  * MB/1M      bytes a search scans per million chunks (the part that must stay in RAM)
+  * RSS MB     resident memory of the process after the query run
+  * open s     time to open the index, including the one-off encoding of the quantized copy
+  * p50/p95    _search latency (query vector given, no embedding call)
+  * recall@k   overlap with the exact float32 top k
+"""
+import os
+
+os.environ.setdefault("INDEX_MAX_SEGMENTS", "1000")
+
+import argparse
+import multiprocessing as mp
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def _build(workdir, n, dim, clusters, seg_rows):
+    os.chdir(workdir)
+    from src.core.vectordb import add_vectors
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    for start in range(0, n, seg_rows):
+        m = min(seg_rows, n - start)
+        vecs = centers[rng.integers(0, clusters, m)] + 0.6 * rng.standard_normal((m, dim), dtype=np.float32)
+        add_vectors([f"chunk {start + i}" for i in range(m)], [{"source": "bench"}] * m, vecs)
+    queries = centers[rng.integers(0, clusters, 500)] + 0.6 * rng.standard_normal((500, dim), dtype=np.float32)
+    np.save("queries.npy", queries)
+
+
+def _run(workdir, storage, rescore, k, nq):
+    os.chdir(workdir)
+    os.environ["VECTOR_STORAGE"] = storage
+    os.environ["VECTOR_RESCORE"] = str(rescore)
+    from src.core import vectordb
+    from src.core.quant import bytes_per_row
+
+    t0 = time.perf_counter()
+    idx = vectordb._get_index()
+    open_s = time.perf_counter() - t0
+    queries = np.load("queries.npy")[:nq]
+    vectordb._search(idx, queries[0], k)  # warm-up
+    ids, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = vectordb._search(idx, q, k)
+        lat.append(time.perf_counter() - t0)
+        ids.append([(seg.name, row) for _, seg, row in hits])
+    ms = np.asarray(lat) * 1e3
+    return {"open_s": open_s, "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)),
+            "rss": _rss_mb(), "mb_per_m": bytes_per_row(storage, idx["dim"]) * 1e6 / 2**20, "ids": ids}
+
+
+def _in_child(fn, *args):
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def main(n, dim, k, nq, clusters, rescores, seg_rows):
+    workdir = tempfile.mkdtemp(prefix="rag-quant-")
+    try:
+        print(f"building {n} x {dim} ({clusters} clusters) in {workdir} ...", flush=True)
+        _in_child(_build, workdir, n, dim, clusters, seg_rows)
+        base = _in_child(_run, workdir, "float32", 0, k, nq)
+        truth = [set(i) for i in base["ids"]]
+        print(f"{'storage':>8} | {'rescore':>7} | {'MB/1M':>7} | {'RSS MB':>7} | {'open s':>8} | "
+              f"{'p50 ms':>7} | {'p95 ms':>7} | recall@{k}")
+        print("-" * 80)
+        rows = [("float32", 0, base)]
+        for storage in ("float16", "int8"):
+            for r in rescores:
+                rows.append((storage, r, _in_child(_run, workdir, storage, r, k, nq)))
+        for storage, r, res in rows:
+            recall = np.mean([len(set(i) & t) / len(t) for i, t in zip(res["ids"], truth)])
+            print(f"{storage:>8} | {r if storage != 'float32' else '-':>7} | {res['mb_per_m']:>7.0f} | "
+                  f"{res['rss'] or 0:>7.0f} | {res['open_s']:>8.2f} | {res['p50']:>7.2f} | {res['p95']:>7.2f} | "
+                  f"{recall:.4f}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--clusters", type=int, default=256)
+    ap.add_argument("--rescore", type=int, nargs="+", default=[0, 4], help="VECTOR_RESCORE values to try")
+    ap.add_argument("--segment-rows", type=int, default=100000)
+    args = ap.parse_args()
+    main(args.n, args.dim, args.k, args.queries, args.clusters, args.rescore, args.segment_rows)
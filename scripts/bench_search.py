@@ -0,0 +1,68 @@
+"""
+Microbenchmark: pure-Python `_cosine` scan vs. the vectorized NumPy search.
+
+    python -m scripts.bench_search                      # 10k, 100k, 1M chunks
+    python -m scripts.bench_search --sizes 10000 --dim 256
+
+Uses random vectors, so no GOOGLE_API_KEY / network calls are needed.
+The Python path is O(n * dim) in the interpreter and needs ~24 bytes per float,
+so above --python-sample rows it is timed on a sample and extrapolated linearly.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.core.vectordb import _cosine, _normalize, _rank
+
+
+def _python_search(qvec, vectors, k):
+    scores = [_cosine(qvec, v) for v in vectors]
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes, dim, k, repeat, python_sample):
+    rng = np.random.default_rng(0)
+    q = rng.standard_normal(dim).astype(np.float32).tolist()
+    print(f"{'chunks':>10} | {'python (ms)':>16} | {'numpy (ms)':>10} | speedup")
+    print("-" * 56)
+    for n in sizes:
+        raw = rng.standard_normal((n, dim), dtype=np.float32)
+
+        t0 = time.perf_counter()
+        matrix = _normalize(raw)
+        build = time.perf_counter() - t0
+        t_np = _time(lambda: _rank(q, matrix, k), repeat)
+
+        m = min(n, python_sample)
+        sample = raw[:m].tolist()
+        t_py = _time(lambda: _python_search(q, sample, k), 1) * (n / m)
+        label = f"{t_py * 1e3:.1f}" + (" (est)" if m < n else "")
+
+        # sanity: both paths agree on the sample
+        if m == n:
+            assert set(_python_search(q, sample, k)) == set(_rank(q, matrix, k)[0].tolist())
+
+        print(f"{n:>10} | {label:>16} | {t_np * 1e3:>10.2f} | {t_py / t_np:>6.0f}x"
+              f"   (normalize {build * 1e3:.0f} ms, once per load)")
+        del raw, matrix, sample
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("-k", type=int, default=6)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--python-sample", type=int, default=10_000)
+    args = ap.parse_args()
+    run(args.sizes, args.dim, args.k, args.repeat, args.python_sample)
@@ -0,0 +1,129 @@
+"""
+Sharded search: latency of one query and of a batch from 1 to N workers.
+
+    python -m scripts.bench_shards                              # 500k x 768, workers 1 2 4 ... cpu_count
+    python -m scripts.bench_shards --workers 1 2 4 8 16 --servers
+
+Builds one index (synthetic vectors), then measures each worker count in a fresh
+process with SEARCH_WORKERS=w (threads, one shard each). With --servers it also
+starts w local shard-server processes (scripts/shard_server.py) and measures the
+same search through SHARD_SERVERS. BLAS is pinned to one thread everywhere, so the
+only parallelism is the sharding. Results are checked against the 1-worker run.
+
+Speed-up tops out at the number of cores (and at memory bandwidth for float32
+scans; VECTOR_STORAGE=int8 moves that ceiling up).
+"""
+import os
+
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ[_var] = "1"
+os.environ.setdefault("INDEX_MAX_SEGMENTS", "1000")
+
+import argparse
+import multiprocessing as mp
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def _build(workdir, n, dim, seg_rows):
+    os.chdir(workdir)
+    from src.core.vectordb import add_vectors
+
+    rng = np.random.default_rng(0)
+    for start in range(0, n, seg_rows):
+        m = min(seg_rows, n - start)
+        add_vectors([f"chunk {start + i}" for i in range(m)], [{"source": f"doc{(start + i) // 100}"} for i in range(m)],
+                    rng.standard_normal((m, dim), dtype=np.float32))
+    np.save("queries.npy", rng.standard_normal((256, dim), dtype=np.float32))
+
+
+def _run(workdir, workers, servers, k, nq, batch):
+    os.chdir(workdir)
+    os.environ["SEARCH_WORKERS"] = str(workers)
+    os.environ["SHARD_SERVERS"] = ",".join(servers)
+    from src.core import vectordb
+
+    idx = vectordb._get_index()
+    queries = np.load("queries.npy")
+    vectordb._search(idx, queries[0], k)   # warm-up (pages in the vectors, starts the pool)
+    ids, lat = [], []
+    for q in queries[:nq]:
+        t0 = time.perf_counter()
+        hits = vectordb._search(idx, q, k)
+        lat.append(time.perf_counter() - t0)
+        ids.append([(seg.name, row) for _, seg, row in hits])
+    t0 = time.perf_counter()
+    vectordb._search_many(idx, queries[:batch], k)
+    batch_s = time.perf_counter() - t0
+    ms = np.asarray(lat) * 1e3
+    return {"p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)), "batch_s": batch_s, "ids": ids}
+
+
+def _in_child(fn, *args):
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def _start_servers(workdir, w, port):
+    root = str(Path(__file__).resolve().parents[1])
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])),
+           "PYTHONWARNINGS": "ignore", "SHARD_SERVERS": ""}
+    procs = [subprocess.Popen([sys.executable, "-m", "scripts.shard_server", "--shard", str(i), "--of", str(w),
+                               "--port", str(port + i)], cwd=workdir, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+             for i in range(w)]
+    for p in procs:   # ready once it says it is serving
+        for line in p.stdout:
+            if "serving shard" in line:
+                break
+    return procs, [f"127.0.0.1:{port + i}" for i in range(w)]
+
+
+def main(n, dim, k, nq, batch, workers, seg_rows, servers, port):
+    workdir = tempfile.mkdtemp(prefix="rag-shards-")
+    try:
+        print(f"building {n} x {dim} in {workdir} ...", flush=True)
+        _in_child(_build, workdir, n, dim, seg_rows)
+        variants = [("threads", w) for w in workers] + ([("servers", w) for w in workers] if servers else [])
+        print(f"{'mode':>8} | {'workers':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'speed-up':>8} | "
+              f"{f'batch {batch} s':>11} | {'speed-up':>8} | same")
+        print("-" * 88)
+        base = truth = None
+        for mode, w in variants:
+            procs, addrs = _start_servers(workdir, w, port) if mode == "servers" else ([], [])
+            try:
+                res = _in_child(_run, workdir, w, addrs, k, nq, batch)
+            finally:
+                for p in procs:
+                    p.terminate()
+                    p.wait()
+            base = base or res
+            truth = truth or res["ids"]
+            print(f"{mode:>8} | {w:>7} | {res['p50']:>8.2f} | {res['p95']:>8.2f} | {base['p50'] / res['p50']:>7.2f}x | "
+                  f"{res['batch_s']:>11.3f} | {base['batch_s'] / res['batch_s']:>7.2f}x | {res['ids'] == truth}",
+                  flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    cpus = os.cpu_count() or 1
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=500000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=100, help="single queries timed per run")
+    ap.add_argument("--batch", type=int, default=64, help="queries in the timed _search_many call")
+    ap.add_argument("--workers", type=int, nargs="+",
+                    default=sorted({1, *(2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus), cpus}))
+    ap.add_argument("--segment-rows", type=int, default=100000)
+    ap.add_argument("--servers", action="store_true", help="also measure local shard-server processes")
+    ap.add_argument("--port", type=int, default=7101, help="first shard-server port")
+    args = ap.parse_args()
+    main(args.n, args.dim, args.k, args.queries, args.batch, args.workers, args.segment_rows, args.servers, args.port)
@@ -0,0 +1,261 @@
+"""
+Reproducible end-to-end benchmark on the local fake Gemini (scripts/fake_gemini.py): no API key, no network.
+
+    python -m scripts.bench_suite                                   # 1k, 10k, 100k chunks
+    python -m scripts.bench_suite --sizes 1000000 --dim 768         # ~3 GB of vectors on disk
+    python -m scripts.bench_suite --baseline data/bench/bench-20261001-120000.json
+
+For every corpus size, in fresh processes (so nothing is warm that wouldn't be in production):
+  * ingest    the first --ingest-sample chunks go through add_texts (fake embedding calls with
+              --embed-ms latency, segment write, BM25 postings); the rest is bulk-loaded with
+              add_vectors from a synthetic clustered corpus. Both rates are reported.
+  * load      time for a new process to open the index (manifest + memmapped segments)
+  * search    p50/p95/p99 similarity_search latency per retrieval mode, query vector given
+              (embedding latency is the fake's, not worth measuring)
+  * memory    RSS after load and after the search run, peak RSS of the build, index size on disk
+
+Results go to a JSON file (--out, default data/bench/bench-<timestamp>.json) together with the
+environment and settings, so runs can be compared across releases; --baseline prints the change
+against an earlier file.
+"""
+import os
+
+os.environ.setdefault("EMBED_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("ANSWER_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("INDEX_MAX_SEGMENTS", "1000")   # bulk load shouldn't trigger compactions mid-run
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing as mp
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+VOCAB = 20000
+SUPPORT_WORDS = ["refund", "shipping", "warranty", "password", "invoice", "delivery", "account", "order"]
+
+
+def _rss_mb():
+    """Current resident set size in MB (None where /proc isn't available)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _texts(rng, n, words=60):
+    """Zipf-ish synthetic chunks with a sprinkle of support vocabulary (so BM25 has real work)."""
+    ids = np.minimum(rng.zipf(1.3, size=(n, words)), VOCAB) - 1
+    out = []
+    for i, row in enumerate(ids):
+        toks = [f"w{t}" for t in row]
+        toks[i % words] = SUPPORT_WORDS[i % len(SUPPORT_WORDS)]
+        out.append(f"chunk {i}: " + " ".join(toks))
+    return out
+
+
+def _vectors(rng, centers, n):
+    labels = rng.integers(0, len(centers), size=n)
+    return centers[labels] + 0.6 * rng.standard_normal((n, centers.shape[1]), dtype=np.float32)
+
+
+def _quiet():
+    """The index logs every search and write; keep the timing loops out of the terminal."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _build(workdir, n, dim, ingest_sample, embed_ms, seg_rows, seed):
+    os.chdir(workdir)
+    from scripts import fake_gemini
+
+    fake_gemini.install(latency_ms=embed_ms, per_item_ms=0.0)
+    from src.core.vectordb import add_texts, add_vectors
+
+    rng = np.random.default_rng(seed)
+    out = {}
+
+    sample = min(n, ingest_sample)
+    texts = _texts(rng, sample)
+    t0 = time.perf_counter()
+    with _quiet():
+        for i in range(0, sample, 256):
+            add_texts(texts[i:i + 256], [{"source": f"doc{j // 50}.txt"} for j in range(i, min(i + 256, sample))])
+    dt = time.perf_counter() - t0
+    out["ingest_chunks"] = sample
+    out["ingest_chunks_per_s"] = sample / dt if dt else None
+    out["embed_calls"] = fake_gemini.stats()["calls"]
+
+    centers = rng.standard_normal((max(8, int(np.sqrt(n))), dim), dtype=np.float32)
+    rest, t_bulk = n - sample, 0.0
+    for i in range(0, rest, seg_rows):
+        m = min(seg_rows, rest - i)
+        texts, vecs = _texts(rng, m), _vectors(rng, centers, m)
+        metas = [{"source": f"bulk{(sample + i + j) // 50}.txt"} for j in range(m)]
+        t0 = time.perf_counter()
+        with _quiet():
+            add_vectors(texts, metas, vecs)
+        t_bulk += time.perf_counter() - t0
+    out["bulk_chunks"] = rest
+    out["bulk_chunks_per_s"] = rest / t_bulk if rest and t_bulk else None
+    out["build_peak_rss_mb"] = _peak_rss_mb()
+    return out
+
+
+def _measure(workdir, queries, k, modes, seed):
+    os.chdir(workdir)
+    from scripts import fake_gemini
+
+    fake_gemini.install(latency_ms=0, per_item_ms=0.0)
+    from src.core import vectordb
+
+    out = {"rss_before_load_mb": _rss_mb()}
+    t0 = time.perf_counter()
+    with _quiet():
+        idx = vectordb._get_index()
+    out["load_s"] = time.perf_counter() - t0
+    out["rss_after_load_mb"] = _rss_mb()
+    out["segments"] = len(idx["segments"])
+    out["chunks"] = idx["count"]
+
+    rng = np.random.default_rng(seed + 1)
+    dim = idx["dim"]
+    qtexts = [" ".join([SUPPORT_WORDS[i % len(SUPPORT_WORDS)]] + [f"w{t}" for t in rng.integers(0, 200, 3)])
+              for i in range(queries)]
+    qvecs = rng.standard_normal((queries, dim), dtype=np.float32)
+    search = {}
+    for mode in modes:
+        lat = []
+        with _quiet():
+            vectordb.similarity_search(qtexts[0], k=k, qvec=qvecs[0], mode=mode)   # warm-up
+            for q, v in zip(qtexts, qvecs):
+                t0 = time.perf_counter()
+                vectordb.similarity_search(q, k=k, qvec=v, mode=mode)
+                lat.append(time.perf_counter() - t0)
+        ms = np.asarray(lat) * 1e3
+        search[mode] = {
+            "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)), "mean_ms": float(ms.mean()), "qps": float(1e3 / ms.mean()),
+        }
+    out["search"] = search
+    out["rss_after_search_mb"] = _rss_mb()
+    return out
+
+
+def _disk_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) / 2**20
+
+
+def _environment():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parents[1]).stdout.strip() or None
+    except OSError:
+        rev = None
+    from src.app.settings import get_settings
+
+    s = get_settings()
+    return {
+        "git_rev": rev, "python": platform.python_version(), "numpy": np.__version__,
+        "platform": platform.platform(), "cpus": os.cpu_count(),
+        "settings": {k: getattr(s, k) for k in ("VECTOR_INDEX", "IVF_NPROBE", "RETRIEVAL_MODE", "RRF_K",
+                                                "INGEST_BATCH_CHUNKS", "EMBED_BATCH_SIZE", "EMBED_CONCURRENCY")},
+    }
+
+
+def _run_in_child(fn, *args):
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def _compare(results, baseline_path):
+    base = {r["size"]: r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nvs. {baseline_path}:")
+    for r in results:
+        b = base.get(r["size"])
+        if not b:
+            continue
+        rows = [("load_s", r["load_s"], b["load_s"]),
+                ("ingest/s", r["ingest_chunks_per_s"], b["ingest_chunks_per_s"])]
+        for mode, st in r["search"].items():
+            if mode in b["search"]:
+                rows += [(f"{mode} p50", st["p50_ms"], b["search"][mode]["p50_ms"]),
+                         (f"{mode} p99", st["p99_ms"], b["search"][mode]["p99_ms"])]
+        changes = ", ".join(f"{name} {(new - old) / old:+.0%}" for name, new, old in rows if new and old)
+        print(f"  {r['size']:>8}: {changes}")
+
+
+def main(sizes, dim, k, queries, modes, ingest_sample, embed_ms, seg_rows, seed, out, baseline, keep):
+    from scripts.fake_gemini import DIM
+
+    # the fake's vectors are 768-d; with another --dim the bulk part is all there is.
+    # Checked here: a SystemExit inside a pool child would leave pool.apply waiting forever.
+    if dim != DIM and ingest_sample:
+        raise SystemExit(f"--dim {dim} needs --ingest-sample 0 (fake embeddings are {DIM}-d)")
+    results = []
+    print(f"{'chunks':>8} | {'ingest/s':>8} | {'bulk/s':>8} | {'load s':>7} | "
+          + " | ".join(f"{m[:6]:>6} p50/p95/p99 ms" for m in modes) + f" | {'RSS MB':>6} | {'disk MB':>7}")
+    for n in sizes:
+        workdir = tempfile.mkdtemp(prefix=f"rag-bench-{n}-")
+        try:
+            build = _run_in_child(_build, workdir, n, dim, ingest_sample, embed_ms, seg_rows, seed)
+            meas = _run_in_child(_measure, workdir, queries, k, modes, seed)
+            r = {"size": n, "dim": dim, "k": k, "queries": queries, **build, **meas,
+                 "index_disk_mb": _disk_mb(Path(workdir) / ".miniindex")}
+        finally:
+            if not keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+        results.append(r)
+        lat = " | ".join(f"{r['search'][m]['p50_ms']:>6.2f}/{r['search'][m]['p95_ms']:.2f}/{r['search'][m]['p99_ms']:.2f}"
+                         .rjust(22) for m in modes)
+        print(f"{n:>8} | {r['ingest_chunks_per_s'] or 0:>8.0f} | {r['bulk_chunks_per_s'] or 0:>8.0f} | "
+              f"{r['load_s']:>7.3f} | {lat} | {r['rss_after_search_mb'] or 0:>6.0f} | {r['index_disk_mb']:>7.1f}",
+              flush=True)
+
+    out = Path(out or f"data/bench/bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    config = {"sizes": sizes, "dim": dim, "k": k, "queries": queries, "modes": modes,
+              "ingest_sample": ingest_sample, "embed_ms": embed_ms, "segment_rows": seg_rows, "seed": seed}
+    out.write_text(json.dumps({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": _environment(),
+                               "config": config, "results": results}, indent=2))
+    print(f"results -> {out}")
+    if baseline:
+        _compare(results, baseline)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--queries", type=int, default=300, help="timed searches per mode")
+    ap.add_argument("--modes", nargs="+", default=["vector", "lexical", "hybrid"])
+    ap.add_argument("--ingest-sample", type=int, default=2000, help="chunks ingested end-to-end via add_texts")
+    ap.add_argument("--embed-ms", type=float, default=20, help="fake latency per embedding call")
+    ap.add_argument("--segment-rows", type=int, default=50000, help="rows per bulk-loaded segment")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="results JSON (default data/bench/bench-<timestamp>.json)")
+    ap.add_argument("--baseline", default=None, help="earlier results JSON to compare against")
+    ap.add_argument("--keep", action="store_true", help="keep the generated indexes")
+    args = ap.parse_args()
+    main(args.sizes, args.dim, args.k, args.queries, args.modes, args.ingest_sample, args.embed_ms,
+         args.segment_rows, args.seed, args.out, args.baseline, args.keep)
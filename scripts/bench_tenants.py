@@ -0,0 +1,107 @@
+"""
+Many small named indexes behind one process: latency and memory per RESIDENT_INDEX_MB.
+
+    python -m scripts.bench_tenants                          # 200 tenants x 1000 chunks
+    python -m scripts.bench_tenants --tenants 500 --budget-mb 0 64 256 2048
+
+Builds `--tenants` indexes (synthetic vectors), then replays `--requests` vector
+searches over them in a fresh process per budget. Tenants are picked with a Zipf
+distribution (a few busy tenants, a long tail), the way support traffic usually looks.
+Reports per budget:
+  * resident   indexes loaded at the end (the LRU)
+  * hit rate   requests served from a resident index (no load)
+  * warm/cold  p50 latency of a request without / with an index load
+  * p95        over all requests
+  * RSS MB     resident memory of the process at the end
+Budget 0 keeps only the last index loaded: close to loading on every request.
+"""
+import os
+
+os.environ.setdefault("ANSWER_CACHE_MAX_ENTRIES", "0")
+
+import argparse
+import multiprocessing as mp
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def _build(workdir, tenants, chunks, dim):
+    os.chdir(workdir)
+    from src.core.vectordb import add_vectors, use_index
+
+    rng = np.random.default_rng(0)
+    for t in range(tenants):
+        with use_index(f"tenant{t:04d}"):
+            add_vectors([f"tenant {t} chunk {i}" for i in range(chunks)],
+                        [{"source": f"doc{i // 20}.txt"} for i in range(chunks)],
+                        rng.standard_normal((chunks, dim), dtype=np.float32))
+
+
+def _run(workdir, budget_mb, tenants, dim, requests, zipf):
+    os.chdir(workdir)
+    os.environ["RESIDENT_INDEX_MB"] = str(budget_mb)
+    from src.core import metrics, vectordb
+
+    rng = np.random.default_rng(1)
+    picks = (rng.zipf(zipf, requests) - 1) % tenants
+    queries = rng.standard_normal((requests, dim), dtype=np.float32)
+    warm, cold, lat = [], [], []
+    for t, q in zip(picks.tolist(), queries):
+        loads = metrics.counters().get("index_loads_total", 0)
+        t0 = time.perf_counter()
+        with vectordb.use_index(f"tenant{t:04d}"):
+            vectordb.similarity_search("", k=6, qvec=q, mode="vector")
+        dt = (time.perf_counter() - t0) * 1e3
+        lat.append(dt)
+        (cold if metrics.counters().get("index_loads_total", 0) > loads else warm).append(dt)
+    pct = lambda xs, p: float(np.percentile(xs, p)) if xs else float("nan")
+    return {"resident": len(vectordb.resident_indexes()), "hit_rate": len(warm) / requests,
+            "warm_p50": pct(warm, 50), "cold_p50": pct(cold, 50), "p95": pct(lat, 95), "rss": _rss_mb()}
+
+
+def _in_child(fn, *args):
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def main(tenants, chunks, dim, requests, zipf, budgets):
+    workdir = tempfile.mkdtemp(prefix="rag-tenants-")
+    try:
+        mb = tenants * chunks * dim * 4 / 2**20
+        print(f"building {tenants} indexes x {chunks} chunks (dim {dim}, ~{mb:.0f} MB of vectors) in {workdir} ...",
+              flush=True)
+        _in_child(_build, workdir, tenants, chunks, dim)
+        print(f"{'budget MB':>9} | {'resident':>8} | {'hit rate':>8} | {'warm p50':>8} | {'cold p50':>8} | "
+              f"{'p95 ms':>7} | RSS MB")
+        print("-" * 72)
+        for budget in budgets:
+            r = _in_child(_run, workdir, budget, tenants, dim, requests, zipf)
+            print(f"{budget:>9} | {r['resident']:>8} | {r['hit_rate']:>8.1%} | {r['warm_p50']:>8.2f} | "
+                  f"{r['cold_p50']:>8.2f} | {r['p95']:>7.2f} | {r['rss'] or 0:.0f}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tenants", type=int, default=200)
+    ap.add_argument("--chunks", type=int, default=1000, help="chunks per tenant index")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--requests", type=int, default=3000)
+    ap.add_argument("--zipf", type=float, default=1.3, help="Zipf exponent of tenant popularity (> 1)")
+    ap.add_argument("--budget-mb", type=int, nargs="+", default=[0, 64, 256, 1024])
+    args = ap.parse_args()
+    main(args.tenants, args.chunks, args.dim, args.requests, args.zipf, args.budget_mb)
@@ -0,0 +1,106 @@
+"""
+Local stand-in for the Gemini API, for benchmarks (no network, no API key).
+
+    from scripts import fake_gemini
+    fake_gemini.install(latency_ms=80, error_rate=0.05)   # patches genai.embed_content
+    fake_gemini.install_model(gen_latency_ms=300)         # patches GenerativeModel / src.core.rag._model
+
+Each embedding call sleeps `latency_ms + per_item_ms * len(batch)` and fails with a 503 or 429
+at `error_rate`. Vectors are derived from a hash of the text, so repeated runs are stable.
+Generation sleeps `gen_latency_ms` and fails at its own `error_rate` (seeded too).
+Nothing here needs GOOGLE_API_KEY: install() before the first real call and no request leaves the process.
+"""
+import hashlib
+import random
+import threading
+import time
+
+import numpy as np
+import google.generativeai as genai
+from google.api_core import exceptions as gexc
+
+DIM = 768
+
+_state = {"latency_ms": 50.0, "per_item_ms": 0.2, "error_rate": 0.0, "calls": 0, "errors": 0}
+_lock = threading.Lock()
+_rng = random.Random(0)
+
+
+def fake_vector(text: str, dim: int = DIM):
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist()
+
+
+def embed_content(model=None, content=None, task_type=None, **kwargs):
+    batch = content if isinstance(content, list) else [content]
+    with _lock:
+        _state["calls"] += 1
+        fail = _rng.random() < _state["error_rate"]
+        code = _rng.choice([503, 429])
+        if fail:
+            _state["errors"] += 1
+    time.sleep((_state["latency_ms"] + _state["per_item_ms"] * len(batch)) / 1000.0)
+    if fail:
+        raise gexc.ServiceUnavailable("fake 503") if code == 503 else gexc.TooManyRequests("fake 429")
+    vecs = [fake_vector(t) for t in batch]
+    return {"embedding": vecs if isinstance(content, list) else vecs[0]}
+
+
+def install(latency_ms: float = 50.0, per_item_ms: float = 0.2, error_rate: float = 0.0, seed: int = 0):
+    """Patch google.generativeai in this process to use the fake."""
+    _state.update(latency_ms=latency_ms, per_item_ms=per_item_ms, error_rate=error_rate, calls=0, errors=0)
+    _rng.seed(seed)
+    genai.embed_content = embed_content
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Minimal GenerativeModel: sleeps `latency_ms`, then answers with a fixed template (or fails at `error_rate`)."""
+
+    def __init__(self, latency_ms: float = 300.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    ANSWER = "Refunds are accepted within 30 days of purchase. Sources: [1]"
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if fail:
+            time.sleep(self.latency_ms / 1000.0 / 4)
+            raise gexc.ServiceUnavailable("fake 503")
+        if stream:
+            return self._stream()
+        time.sleep(self.latency_ms / 1000.0)
+        return _Response(self.ANSWER)
+
+    def _stream(self):
+        words = self.ANSWER.split(" ")
+        for i, w in enumerate(words):
+            time.sleep(self.latency_ms / 1000.0 / len(words))
+            yield _Response(w if i == 0 else " " + w)
+
+
+def install_model(gen_latency_ms: float = 300.0, error_rate: float = 0.0, seed: int = 0) -> FakeModel:
+    """Swap the generation model used by src.core.rag (and any GenerativeModel built later)."""
+    from src.core import rag
+
+    model = FakeModel(gen_latency_ms, error_rate, seed)
+    genai.GenerativeModel = lambda *args, **kwargs: model
+    rag._model = model
+    return model
+
+
+def stats():
+    return {"calls": _state["calls"], "errors": _state["errors"]}
@@ -1,28 +1,34 @@
 from pathlib import Path
-from src.loaders.files import load_paths
-from src.core.chunking import simple_chunk
-from src.core.vectordb import add_texts
-from src.app.settings import get_settings
+from src.core.ingestion import sync_folder
 
-def run_ingest(path: str):
-    settings = get_settings()
+def run_ingest(path: str, workers: int = 0):
+    """Incremental: only new/changed files are embedded, removed files are dropped from the index."""
     print(f"[ingest] starting, path={path}")  # <-- add
-    root = Path(path)
-    docs = load_paths(root)
-    total_chunks = 0
-    for d in docs:
-        chunks = simple_chunk(d["text"], settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
-        metas = [{"source": d["meta"]["source"], "path": d["meta"]["path"]} for _ in chunks]
-        add_texts(chunks, metas)
-        total_chunks += len(chunks)
-    print(f"[ingest] done, docs={len(docs)}, chunks={total_chunks}")  # <-- add
+    r = sync_folder(Path(path), workers=workers or None)
+    print(
+        f"[ingest] done in {r['seconds']:.1f}s, added={r['added']} changed={r['changed']} "
+        f"removed={r['removed']} unchanged={r['unchanged']} failed={r['failed']} "
+        f"| chunks +{r['chunks_added']} -{r['chunks_deleted']}"
+    )
+    dups = r["exact_dups"] + r["near_dups"]
+    if r["chunks_seen"]:
+        print(
+            f"[ingest] dedup: {dups}/{r['chunks_seen']} chunks were duplicates "
+            f"({100.0 * dups / r['chunks_seen']:.1f}% not embedded/stored; exact={r['exact_dups']} near={r['near_dups']})"
+        )
+    for name, st in r["stages"].items():
+        secs = st["seconds"] or float("nan")
+        print(
+            f"[ingest]   {name:<8} docs={st['docs']:<6} chunks={st['chunks']:<7} busy={st['seconds']:.2f}s "
+            f"-> {st['docs'] / secs:.1f} docs/s, {st['chunks'] / secs:.1f} chunks/s"
+        )
 
 
 if __name__ == "__main__":
     import argparse
     ap = argparse.ArgumentParser()
     ap.add_argument("--path", default="data/raw")
+    ap.add_argument("--workers", type=int, default=0, help="extract/chunk processes (0 = INGEST_WORKERS)")
     args = ap.parse_args()
-    run_ingest(args.path)
+    run_ingest(args.path, args.workers)
     print("✅ Ingestion completed successfully!")
-
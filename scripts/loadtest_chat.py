@@ -0,0 +1,104 @@
+"""
+Load test for /chat against the local fake Gemini (scripts/fake_gemini.py).
+
+    python -m scripts.loadtest_chat --clients 50 200 --requests 400
+
+Compares the old sync endpoint (answer_query in Starlette's threadpool) with the
+async endpoint (answer_query_async: bounded model pool + single-flight coalescing).
+Clients draw from a small pool of questions, like a real burst of "where is my refund?".
+Answer and embedding caches are disabled so every request does real work.
+"""
+import os
+
+os.environ.setdefault("ANSWER_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("EMBED_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("INDEX_MAX_SEGMENTS", "1000")
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from scripts import fake_gemini
+
+QUESTIONS = [
+    "What is the refund window?",
+    "How long does shipping take?",
+    "How do I reset my password?",
+    "Do you ship internationally?",
+    "How can I contact support?",
+]
+
+
+def _baseline_app() -> FastAPI:
+    """The pre-async /chat: a sync endpoint running the whole pipeline in a worker thread."""
+    from src.app.main import ChatRequest, ChatResponse
+    from src.core.rag import answer_query
+
+    app = FastAPI()
+
+    @app.post("/chat", response_model=ChatResponse)
+    def chat(req: ChatRequest):
+        out = answer_query(req.query, top_k=req.top_k or 6)
+        return ChatResponse(answer=out["answer"], citations=out["citations"])
+
+    return app
+
+
+async def _run(app, clients, requests, distinct):
+    transport = httpx.ASGITransport(app=app)
+    rng = random.Random(0)
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(rng.choice(QUESTIONS[:distinct]))
+    latencies = []
+
+    async def client(c):
+        while not queue.empty():
+            q = queue.get_nowait()
+            t0 = time.perf_counter()
+            r = await c.post("/chat", json={"query": q, "top_k": 4})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=600) as c:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(c) for _ in range(clients)))
+        wall = time.perf_counter() - t0
+    latencies.sort()
+    return requests / wall, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main(clients_list, requests, embed_ms, gen_ms, distinct):
+    os.chdir(tempfile.mkdtemp(prefix="rag-load-"))
+    fake_gemini.install(latency_ms=embed_ms)
+    model = fake_gemini.install_model(gen_ms)
+
+    from src.app.main import app
+    from src.core.vectordb import add_texts
+
+    add_texts([f"FAQ entry {i}: refunds, shipping and accounts." for i in range(200)], [{"source": "faq"}] * 200)
+
+    print(f"embed={embed_ms}ms gen={gen_ms}ms requests={requests} distinct questions={distinct}")
+    print(f"{'clients':>7} | {'endpoint':>8} | {'req/s':>7} | {'p50 ms':>7} | {'p95 ms':>7} | LLM calls")
+    print("-" * 62)
+    for clients in clients_list:
+        for name, target in (("sync", _baseline_app()), ("async", app)):
+            model.calls = 0
+            rps, p50, p95 = asyncio.run(_run(target, clients, requests, distinct))
+            print(f"{clients:>7} | {name:>8} | {rps:>7.1f} | {p50 * 1e3:>7.0f} | {p95 * 1e3:>7.0f} | {model.calls}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, nargs="+", default=[50, 200])
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--embed-ms", type=float, default=60)
+    ap.add_argument("--gen-ms", type=float, default=400)
+    ap.add_argument("--distinct", type=int, default=5, help="how many different questions clients ask")
+    args = ap.parse_args()
+    main(args.clients, args.requests, args.embed_ms, args.gen_ms, args.distinct)
@@ -9,5 +9,6 @@ if __name__ == "__main__":
         print("No results found — check if ingestion ran successfully.")
     else:
         for i, h in enumerate(hits, 1):
-            print(f"[{i}] score={h['score']:.3f} source={h['meta'].get('source')}")
+            score = f"score={h['score']:.3f}" if h["score"] is not None else f"bm25={h['bm25']:.3f}"  # lexical mode
+            print(f"[{i}] {score} source={h['meta'].get('source')}")
             print(h['text'][:200].replace('\n', ' '), "\n")
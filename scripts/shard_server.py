@@ -0,0 +1,23 @@
+"""
+Serve one shard of the index in the working directory to the API (see src/core/shards.py).
+
+    python -m scripts.shard_server --shard 0 --of 4 --port 7101
+    python -m scripts.shard_server --shard 1 --of 4 --port 7102
+    ...
+    SHARD_SERVERS=127.0.0.1:7101,127.0.0.1:7102,... uvicorn src.app.main:app
+
+Every server must run on the same snapshot as the API (same .miniindex, shared or
+replicated); they pick up new snapshots on their own, like the API does.
+"""
+import argparse
+
+from src.core.shards import serve
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shard", type=int, required=True, help="which shard this process serves (0-based)")
+    ap.add_argument("--of", type=int, required=True, help="number of shard servers")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=7101)
+    args = ap.parse_args()
+    serve(args.shard, args.of, args.host, args.port)
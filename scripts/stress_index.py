@@ -0,0 +1,131 @@
+"""
+Concurrency stress test for the index: several processes (think uvicorn workers,
+or the API next to Streamlit) hammer one .miniindex/ with /ingest and /chat at once.
+
+    python -m scripts.stress_index --procs 4 --writers 3 --readers 4 --batches 15
+
+Runs on the local fake Gemini (scripts/fake_gemini.py). INDEX_MAX_SEGMENTS is set low
+so compactions (and snapshot garbage collection) happen in the middle of the traffic.
+Checks:
+  * no request fails (no torn reads, no missing segment files)
+  * every /sources response is one consistent snapshot (sum of per-source counts == total)
+  * at the end, every source holds exactly the chunks of its last ingest: no write was lost
+"""
+import os
+
+os.environ.setdefault("INDEX_MAX_SEGMENTS", "4")
+os.environ.setdefault("ANSWER_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("EMBED_CACHE_MAX_ENTRIES", "0")
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import random
+import tempfile
+import time
+
+
+def _worker(proc: int, workdir: str, writers: int, readers: int, batches: int):
+    """One 'API worker' process. Returns (expected chunks per source, errors, request counts)."""
+    os.chdir(workdir)
+    from scripts import fake_gemini
+
+    fake_gemini.install(latency_ms=5, per_item_ms=0.05)
+    fake_gemini.install_model(5)
+    import httpx
+    from src.app.main import app
+
+    expected, errors = {}, []
+    counts = {"ingest": 0, "chat": 0, "sources": 0}
+    done = asyncio.Event()
+
+    async def writer(c, w):
+        rng = random.Random(proc * 1000 + w)
+        for b in range(batches):
+            # every few batches re-ingest an earlier source (replaces its chunks)
+            source = f"p{proc}-w{w}-b{rng.randrange(b)}" if b > 2 and b % 4 == 0 else f"p{proc}-w{w}-b{b}"
+            n = rng.randint(1, 12)
+            texts = [f"{source} chunk {i}: refunds shipping warranty {rng.random()}" for i in range(n)]
+            r = await c.post("/ingest", json={"texts": texts, "metas": [{"source": source}] * n, "replace": True})
+            counts["ingest"] += 1
+            if r.status_code != 200:
+                errors.append(f"/ingest {r.status_code}: {r.text[:200]}")
+                continue
+            expected[source] = n
+
+    async def reader(c):
+        while not done.is_set():
+            r = await c.post("/chat", json={"query": "what about refunds?", "top_k": 4})
+            counts["chat"] += 1
+            if r.status_code != 200:
+                errors.append(f"/chat {r.status_code}: {r.text[:200]}")
+            r = await c.get("/sources")
+            counts["sources"] += 1
+            if r.status_code != 200:
+                errors.append(f"/sources {r.status_code}: {r.text[:200]}")
+            else:
+                s = r.json()
+                if sum(s["by_source"].values()) != s["total_chunks"]:
+                    errors.append(f"/sources inconsistent snapshot: {s['total_chunks']} != sum of sources")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=600) as c:
+            rs = [asyncio.create_task(reader(c)) for _ in range(readers)]
+            await asyncio.gather(*(writer(c, w) for w in range(writers)))
+            done.set()
+            await asyncio.gather(*rs)
+
+    asyncio.run(run())
+    return expected, errors, counts
+
+
+def main(procs: int, writers: int, readers: int, batches: int):
+    workdir = tempfile.mkdtemp(prefix="rag-stress-")
+    print(f"{procs} process(es) x ({writers} writers + {readers} readers), {batches} ingests per writer, in {workdir}")
+    t0 = time.perf_counter()
+    with mp.get_context("spawn").Pool(procs) as pool:
+        results = pool.starmap(_worker, [(p, workdir, writers, readers, batches) for p in range(procs)])
+    wall = time.perf_counter() - t0
+
+    expected, errors, counts = {}, [], {"ingest": 0, "chat": 0, "sources": 0}
+    for exp, errs, cnt in results:
+        expected.update(exp)
+        errors.extend(errs)
+        for k, v in cnt.items():
+            counts[k] += v
+
+    # fresh process view of the final snapshot
+    os.chdir(workdir)
+    from src.core.vectordb import index_summary, compact, similarity_search
+
+    summ = index_summary()
+    if summ["by_source"] != expected:
+        missing = {s: n for s, n in expected.items() if summ["by_source"].get(s) != n}
+        errors.append(f"lost/extra chunks for {len(missing)} source(s), e.g. {list(missing.items())[:3]}")
+    if summ["total_chunks"] != sum(expected.values()):
+        errors.append(f"total {summ['total_chunks']} != expected {sum(expected.values())}")
+    compact()
+    for source in list(expected)[:20]:
+        hits = similarity_search("refunds", k=50, mode="lexical", filter={"source": source})
+        if len(hits) != expected[source]:
+            errors.append(f"{source}: filtered search found {len(hits)} of {expected[source]} chunks")
+
+    print(f"requests: {counts} in {wall:.1f}s")
+    print(f"final index: {summ['total_chunks']} chunks in {len(summ['by_source'])} sources")
+    if errors:
+        print(f"FAILED: {len(errors)} problem(s)")
+        for e in errors[:20]:
+            print("  -", e)
+        raise SystemExit(1)
+    print("OK: no failed requests, consistent snapshots, no lost writes")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--writers", type=int, default=3, help="concurrent /ingest clients per process")
+    ap.add_argument("--readers", type=int, default=4, help="concurrent /chat + /sources clients per process")
+    ap.add_argument("--batches", type=int, default=15, help="/ingest calls per writer")
+    args = ap.parse_args()
+    main(args.procs, args.writers, args.readers, args.batches)
@@ -1,17 +1,51 @@
 # src/app/main.py
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
+import json, threading
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from src.core.rag import answer_query
-from src.core.vectordb import add_texts, index_count, reset_index
+from src.core.rag import answer_query_async, stream_answer, answer_batch, warm_up
+from src.core import logs, metrics
+from src.core.answercache import get_answer_cache
+from src.core.embcache import get_cache
+from src.app.settings import get_settings
+from src.core.vectordb import (
+    add_texts, upsert_texts, delete_source, index_count, index_summary, reset_index, index_resident,
+    index_dir, list_indexes, resident_indexes, use_index,
+)
+
+# ----------------------------------------------------
+# Startup: warm up in the background so the port opens (and /health answers)
+# right away; /ready turns 200 once the index is resident and warm.
+# ----------------------------------------------------
+_readiness: Dict[str, Any] = {"warming": False, "warm": None, "error": None}
+
+def _warm():
+    try:
+        _readiness["warm"] = warm_up()
+        w = _readiness["warm"]
+        logs.info("startup", f"index warm: {w['chunks']} chunk(s) in {w['segments']} segment(s), {w['seconds']:.2f}s")
+    except Exception as e:
+        _readiness["error"] = f"{type(e).__name__}: {e}"
+        logs.error("startup", f"warm-up failed: {_readiness['error']}")
+    finally:
+        _readiness["warming"] = False
+
+@asynccontextmanager
+async def _lifespan(app):
+    if get_settings().PRELOAD_INDEX:
+        _readiness["warming"] = True
+        threading.Thread(target=_warm, name="warm-up", daemon=True).start()
+    yield
 
 # ----------------------------------------------------
 # FastAPI app
 # ----------------------------------------------------
-app = FastAPI(title="RAG Support Bot (Gemini)")
+app = FastAPI(title="RAG Support Bot (Gemini)", lifespan=_lifespan)
 
 # --- CORS so Streamlit on another origin can call this API ---
 app.add_middleware(
@@ -30,6 +64,7 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     query: str
     top_k: Optional[int] = 6
+    index: Optional[str] = None     # named index to answer from (default: INDEX_NAME)
 
 
 class Citation(BaseModel):
@@ -37,59 +72,209 @@ class Citation(BaseModel):
     source: Optional[str] = None
     path: Optional[str] = None
     score: Optional[float] = None
+    also: Optional[List[str]] = None   # other files carrying the same (deduplicated) chunk
+
+
+class ContextStats(BaseModel):
+    chunks: int             # chunks picked (MMR within the token budget)
+    blocks: int             # after merging neighbouring chunks
+    tokens: int             # estimated prompt tokens of retrieved text
+    naive_tokens: int       # what pasting the plain top_k hits would have cost
+    saved_tokens: int
 
 
 class ChatResponse(BaseModel):
     answer: str
     citations: List[Citation]
+    context: Optional[ContextStats] = None
 
 class IngestRequest(BaseModel):
     texts: List[str]
     metas: List[Dict[str, Any]] = []
+    replace: bool = False   # True: drop chunks already stored for the same meta "source" first
+    index: Optional[str] = None     # named index to add to (created on first ingest)
 
 class IngestResponse(BaseModel):
     added: int
     total: int
+    replaced: int = 0
+
+# --------- Named indexes ----------
+
+def _index(name: Optional[str], create: bool = False) -> Optional[str]:
+    """Check a request's index name: 400 if malformed, 404 for a named index nothing was ever ingested into."""
+    if name is None:
+        return None
+    try:
+        path = index_dir(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not create and name != get_settings().INDEX_NAME and not path.exists():
+        raise HTTPException(status_code=404, detail=f"unknown index {name!r}")
+    return name
+
+def _in_index(name: Optional[str], events):
+    """
+    Iterate a sync generator with `name` selected for every step: StreamingResponse
+    pulls each item in a worker thread with a fresh copy of the context.
+    """
+    it = iter(events)
+    while True:
+        with use_index(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+@app.get("/indexes")
+def indexes():
+    """Indexes on disk, and the ones loaded in this worker (least recently used first)."""
+    return {"indexes": list_indexes(), "resident": resident_indexes()}
 
 # --------- Health ----------
 
 @app.get("/")
 def root():
-    return {"message": "RAG API is running", "endpoints": ["/health", "/chat", "/ingest"]}
+    return {"message": "RAG API is running", "endpoints": ["/health", "/chat", "/chat/stream", "/chat/batch", "/ingest", "/sources", "/indexes", "/metrics", "/ready"]}
 
 @app.get("/health")
 def health():
     """Health check used by you and Render."""
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe (unlike /health, which only says the process is up):
+    200 once the index is resident and, with PRELOAD_INDEX, warmed; 503 before that.
+    """
+    body = {"ready": index_resident() and not _readiness["warming"], **_readiness}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the answer cache and the embedding cache."""
+    answers, embeddings = get_answer_cache(), get_cache()
+    return {
+        "answers": answers.stats() if answers else None,
+        "embeddings": embeddings.stats() if embeddings else None,
+    }
+
+@app.get("/stats")
+def stats():
+    """Latency percentiles and counters recorded in this worker (e.g. ttft_seconds, embed_calls_total)."""
+    return {"latency": metrics.summary(), "counters": metrics.counters(), "resident_indexes": resident_indexes()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint (this worker only): per-stage latency summaries
+    (index_load, query_embed, search, prompt_build, generate, ttft, embed_request),
+    embedding/LLM call and retry counters, cache hit counters and index size gauges.
+    """
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # --------- Chat ----------
 
 # ----------------------------------------------------
 # Chat endpoint
 # ----------------------------------------------------
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    out = answer_query(req.query, top_k=req.top_k or 6)
-    return ChatResponse(answer=out["answer"], citations=out["citations"])
+async def chat(req: ChatRequest):
+    with use_index(_index(req.index)):
+        out = await answer_query_async(req.query, top_k=req.top_k or 6)
+    return ChatResponse(answer=out["answer"], citations=out["citations"], context=out.get("context"))
+
+def _sse(events):
+    """Format rag.stream_answer events as Server-Sent Events."""
+    for ev in events:
+        kind = ev.pop("type")
+        yield f"event: {kind}\ndata: {json.dumps(ev, ensure_ascii=False)}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+@app.post("/chat/stream")
+def chat_stream(req: ChatRequest):
+    """
+    Streams the answer as SSE: `token` events with {"text": ...} as Gemini
+    produces them, then one `citations` event, then `done`.
+    """
+    events = _in_index(_index(req.index), stream_answer(req.query, top_k=req.top_k or 6))
+    return StreamingResponse(
+        _sse(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request, top_k: int = 6, generate: bool = False, concurrency: int = 8,
+                     index: Optional[str] = None):
+    """
+    Batch retrieval (and optionally answers) for evaluation runs, against `index` (default: INDEX_NAME).
+    Body: JSONL, one {"query": ..., "id"?: ..., "top_k"?: ...} per line.
+    Response: JSONL streamed in input order (see rag.answer_batch for the record shape).
+    `concurrency` is capped at MODEL_CONCURRENCY.
+    """
+    items = []
+    for n, line in enumerate((await request.body()).decode("utf-8").splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"line {n}: {e}")
+        if not isinstance(item, dict) or not item.get("query"):
+            raise HTTPException(status_code=400, detail=f"line {n}: expected an object with a 'query'")
+        items.append(item)
+    concurrency = max(1, min(concurrency, get_settings().MODEL_CONCURRENCY))
+    name = _index(index)
+
+    def lines():
+        for rec in answer_batch(items, top_k=top_k, generate=generate, concurrency=concurrency):
+            yield json.dumps(rec, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_in_index(name, lines()), media_type="application/x-ndjson")
 
 # --------- Ingest (called from Streamlit) ----------
 
 @app.post("/ingest", response_model=IngestResponse)
 def ingest(req: IngestRequest):
     """
-    Add new texts + metadata to the vector index.
+    Add new texts + metadata to the vector index (`index`, default INDEX_NAME).
     This runs INSIDE the rag-api service, so the index file we update
     is the same one used by /chat.
     """
+    with use_index(_index(req.index, create=True)):
+        return _ingest(req)
+
+def _ingest(req: IngestRequest) -> IngestResponse:
     if not req.texts:
         return IngestResponse(added=0, total=index_count())
 
-    add_texts(req.texts, req.metas or [{} for _ in req.texts])
+    metas = req.metas or [{} for _ in req.texts]
+    if req.replace:
+        # re-ingesting a document swaps its chunks instead of duplicating them
+        r = upsert_texts(req.texts, metas)
+        return IngestResponse(added=r["added"], total=index_count(), replaced=r["replaced"])
+    add_texts(req.texts, metas)
     total = index_count()
     return IngestResponse(added=len(req.texts), total=total)
 
+@app.get("/sources")
+def sources(index: Optional[str] = None):
+    """Chunk counts per source (no index scan)."""
+    with use_index(_index(index)):
+        return index_summary()
+
+@app.delete("/sources/{name}")
+def remove_source(name: str, index: Optional[str] = None):
+    """Delete one source's chunks without rebuilding the index."""
+    with use_index(_index(index)):
+        return {"deleted": delete_source(name), "total": index_count()}
+
 # (optional) an endpoint to reset index from outside
 @app.post("/reset_index")
-def reset():
-    reset_index()
-    return {"status": "cleared", "total": index_count()}
+def reset(index: Optional[str] = None):
+    with use_index(_index(index)):
+        reset_index()
+        return {"status": "cleared", "total": index_count()}
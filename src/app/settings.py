@@ -9,10 +9,67 @@ class Settings(BaseSettings):
     VECTOR_DB: str = "chroma"
 
     # === RAG Configuration ===
-    INDEX_NAME: str = "support-knowledge"
+    INDEX_NAME: str = "support-knowledge"   # default index (.miniindex/); others live in .miniindexes/<name>/
+    RESIDENT_INDEX_MB: int = 4096           # memory budget of the loaded-index LRU (src/core/vectordb.py)
+    RESIDENT_INDEX_MAX: int = 256           # at most this many indexes loaded at once (the default one is never evicted)
     CHUNK_SIZE: int = 800
     CHUNK_OVERLAP: int = 120
     TOP_K: int = 6
+    INDEX_MAX_SEGMENTS: int = 32            # past this many segments, merge the smallest ones (in the background)
+    INDEX_MERGE_FACTOR: int = 4             # segments merged at once, and the size ratio allowed among them
+    VECTOR_INDEX: str = "flat"              # "flat" (exact) or "ivf" (approximate, for very large indexes)
+    IVF_NLIST: int = 0                      # inverted lists per segment; 0 = ~sqrt(rows)
+    IVF_NPROBE: int = 8                     # lists probed per query (default for similarity_search)
+    IVF_MIN_ROWS: int = 20000               # smaller segments are always searched exactly
+    VECTOR_STORAGE: str = "float32"         # "float16" / "int8": search a quantized copy (src/core/quant.py)
+    VECTOR_RESCORE: int = 4                 # with float16/int8: k * this candidates re-scored at float32; 0 = don't
+    SEARCH_WORKERS: int = 1                 # threads scoring index shards in parallel (src/core/shards.py); 1 = serial
+    SEARCH_SHARDS: int = 0                  # shards the index is cut into for search; 0 = one per worker
+    SHARD_SERVERS: str = ""                 # "host:port,..." shard-server processes to send vector scoring to
+    SHARD_AUTHKEY: str = ""                 # shared secret with the shard servers (required beyond localhost)
+    RETRIEVAL_MODE: str = "hybrid"          # "vector", "lexical" (BM25 only) or "hybrid" (both, fused with RRF)
+    RRF_K: int = 60                         # reciprocal rank fusion constant: score = sum 1 / (RRF_K + rank)
+
+    # === Ingestion pipeline (src/core/ingestion.py) ===
+    INGEST_WORKERS: int = 0                 # extract/chunk processes; 0 = cpu_count - 1, 1 = no pool
+    INGEST_BATCH_CHUNKS: int = 256          # chunks per embed call / per written segment
+    DEDUP_ENABLED: bool = True              # skip duplicate chunks (src/core/dedup.py)
+    DEDUP_NEAR: bool = False                # also chunks with the same words but other case/spacing/punctuation
+    DEDUP_THRESHOLD: float = 0.98           # estimated Jaccard similarity for a near-duplicate candidate
+
+    # === Embedding requests ===
+    EMBED_BATCH_SIZE: int = 100             # texts per embed_content call (Gemini caps a batch at 100)
+    EMBED_CONCURRENCY: int = 4              # batches in flight at once
+    EMBED_MAX_RETRIES: int = 3
+    EMBED_CACHE_PATH: str = "data/cache/embeddings.sqlite"
+    EMBED_CACHE_MAX_ENTRIES: int = 500000   # LRU bound; 0 disables the cache
+    EMBED_QUERY_TIMEOUT_S: float = 5.0      # chat falls back to lexical-only retrieval past this (or on error)
+
+    # === Prompt context (src/core/context.py) ===
+    CONTEXT_MAX_TOKENS: int = 3000          # estimated tokens of retrieved text per prompt
+    CONTEXT_POOL: int = 3                   # candidates retrieved per top_k slot, reranked with MMR
+    MMR_LAMBDA: float = 0.7                 # 1.0 = pure relevance, lower = more diverse
+
+    # === Outbound model calls ===
+    MODEL_CONCURRENCY: int = 32             # max concurrent Gemini calls per process (/chat, streams, batches)
+
+    # === API startup (src/app/main.py) ===
+    PRELOAD_INDEX: bool = True              # load + warm the index and model client at startup; /ready tells when done
+
+    # === Answer cache (src/core/answercache.py) ===
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000    # 0 disables
+    ANSWER_CACHE_TTL_S: int = 3600
+    ANSWER_CACHE_THRESHOLD: float = 0.95    # cosine between query embeddings for a near-duplicate hit
+
+    # === Chat history (src/core/history.py) ===
+    HISTORY_DB_PATH: str = "data/history/history.sqlite"
+    HISTORY_LOAD_RECENT: int = 50           # messages shown when a session opens
+    HISTORY_MAX_AGE_DAYS: float = 365       # rotation: drop older messages; 0 = keep forever
+    HISTORY_MAX_MESSAGES: int = 1000000     # rotation: keep at most this many (oldest go first); 0 = no cap
+
+    # === Logging / metrics (src/core/logs.py, src/core/metrics.py) ===
+    LOG_LEVEL: str = "info"                 # "debug" also prints per-request lines (retrievals, embed calls)
+    LOG_RATE_S: float = 10.0                # repeated warnings/errors: at most one line per this many seconds
 
     # === Model Names ===
     GEMINI_MODEL: str = "gemini-2.5-flash"
@@ -0,0 +1,87 @@
+# src/core/ann.py
+"""
+IVF-flat approximate nearest-neighbour index, NumPy only.
+
+A spherical k-means coarse quantizer splits the (unit-length) rows into
+`nlist` inverted lists. A query scores the centroids, probes the `nprobe`
+closest lists and scores only the rows in them exactly. nprobe == nlist
+gives the same result as brute force; smaller values trade recall for speed
+(see scripts/bench_ann.py to pick an operating point).
+"""
+from typing import Dict, Optional
+from pathlib import Path
+
+import numpy as np
+
+_ASSIGN_BATCH = 65536  # rows scored against the centroids at once while assigning
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], _ASSIGN_BATCH):
+        block = np.asarray(matrix[start:start + _ASSIGN_BATCH], dtype=np.float32)
+        out[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def _unit_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+def default_nlist(n: int) -> int:
+    """Rule of thumb: about sqrt(n) lists, at least 1."""
+    return max(1, int(np.sqrt(n)))
+
+
+def build_ivf(matrix: np.ndarray, nlist: Optional[int] = None, iters: int = 10,
+              sample: int = 256, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Train centroids on a sample (`sample` rows per list) and bucket every row.
+    Returns {"centroids": (nlist, dim), "order": row ids grouped by list, "bounds": (nlist + 1,)}.
+    """
+    n = matrix.shape[0]
+    nlist = min(nlist or default_nlist(n), n)
+    rng = np.random.default_rng(seed)
+    train_ids = rng.choice(n, size=min(n, nlist * sample), replace=False)
+    train = np.asarray(matrix[np.sort(train_ids)], dtype=np.float32)
+
+    centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # re-seed dead lists from random training rows
+            sums[empty] = train[rng.choice(train.shape[0], size=int(empty.sum()))]
+        centroids = _unit_rows(sums)
+
+    labels = _assign(matrix, centroids)
+    order = np.argsort(labels, kind="stable").astype(np.int64)
+    bounds = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nlist), out=bounds[1:])
+    return {"centroids": centroids, "order": order, "bounds": bounds}
+
+
+def ivf_candidates(ivf: Dict[str, np.ndarray], q: np.ndarray, nprobe: int) -> np.ndarray:
+    """Row ids stored in the nprobe lists whose centroids are closest to q."""
+    cs = ivf["centroids"] @ q
+    nprobe = min(max(1, nprobe), cs.shape[0])
+    lists = np.argpartition(-cs, nprobe - 1)[:nprobe]
+    bounds, order = ivf["bounds"], ivf["order"]
+    return np.concatenate([order[bounds[c]:bounds[c + 1]] for c in lists])
+
+
+def save_ivf(path: Path, ivf: Dict[str, np.ndarray]):
+    with open(path, "wb") as f:
+        np.savez(f, **ivf)
+
+
+def load_ivf(path: Path) -> Optional[Dict[str, np.ndarray]]:
+    if not path.exists():
+        return None
+    with np.load(path) as z:
+        return {k: z[k] for k in z.files}
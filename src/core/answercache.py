@@ -0,0 +1,145 @@
+# src/core/answercache.py
+"""
+Answer cache in front of answer_query.
+
+1) exact hit on the normalized question (no embedding call at all)
+2) near-duplicate hit: cosine(query embedding, cached query embedding) >= ANSWER_CACHE_THRESHOLD
+
+Entries expire after ANSWER_CACHE_TTL_S and the whole cache is dropped whenever
+the vector index generation changes (add_texts / reset_index / reload from disk).
+Each named index has its own cache (the most recently used RESIDENT_INDEX_MAX of them).
+"""
+from typing import Dict, Optional
+from collections import OrderedDict
+import re, threading, time
+
+import numpy as np
+
+from src.app.settings import get_settings
+from src.core.vectordb import index_generation, index_name
+from src.core import metrics
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(q: str) -> str:
+    return _WS.sub(" ", q.strip().lower()).rstrip(" ?!.")
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int, ttl_s: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Dict]" = OrderedDict()  # (norm query, top_k) -> entry
+        self._generation = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_generation(self):
+        gen = index_generation(check_disk=True)
+        if gen != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = gen
+
+    def _alive(self, e: Dict) -> bool:
+        return time.time() - e["ts"] < self.ttl_s
+
+    def get_exact(self, query: str, top_k: int) -> Optional[Dict]:
+        key = (normalize_query(query), top_k)
+        with self._lock:
+            self._check_generation()
+            e = self._entries.get(key)
+            if e is not None and self._alive(e):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return e["result"]
+        return None
+
+    def get_similar(self, qvec, top_k: int) -> Optional[Dict]:
+        """Best live entry with the same top_k whose query embedding is close enough. Counts a miss otherwise."""
+        q = np.asarray(qvec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            live = [(k, e) for k, e in self._entries.items() if k[1] == top_k and self._alive(e)]
+            if live:
+                sims = np.stack([e["qvec"] for _, e in live]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    key = live[best][0]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return live[best][1]["result"]
+            self.misses += 1
+        return None
+
+    def put(self, query: str, top_k: int, qvec, result: Dict, generation: int):
+        q = np.asarray(qvec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            self._check_generation()
+            if generation != self._generation:
+                return  # index changed while we were answering
+            key = (normalize_query(query), top_k)
+            self._entries[key] = {"qvec": q, "result": result, "ts": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def stats(self) -> Dict:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": ((self.exact_hits + self.semantic_hits) / total) if total else 0.0,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+        }
+
+
+_caches: "OrderedDict[str, AnswerCache]" = OrderedDict()   # index name -> cache, oldest first
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Cache of the current index (vectordb.use_index), or None when ANSWER_CACHE_MAX_ENTRIES is 0."""
+    s = get_settings()
+    if s.ANSWER_CACHE_MAX_ENTRIES <= 0:
+        return None
+    name = index_name()
+    with _cache_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = AnswerCache(s.ANSWER_CACHE_MAX_ENTRIES, s.ANSWER_CACHE_TTL_S,
+                                                s.ANSWER_CACHE_THRESHOLD)
+            while len(_caches) > max(1, s.RESIDENT_INDEX_MAX):
+                _caches.popitem(last=False)
+        _caches.move_to_end(name)
+        return cache
+
+
+def _cache_metrics():
+    with _cache_lock:
+        caches = list(_caches.values())
+    if not caches:
+        return []
+    stats = [c.stats() for c in caches]
+    return [
+        ("answer_cache_exact_hits_total", "counter", sum(st["exact_hits"] for st in stats)),
+        ("answer_cache_semantic_hits_total", "counter", sum(st["semantic_hits"] for st in stats)),
+        ("answer_cache_misses_total", "counter", sum(st["misses"] for st in stats)),
+        ("answer_cache_entries", "gauge", sum(st["entries"] for st in stats)),
+    ]
+
+metrics.register(_cache_metrics)
@@ -0,0 +1,176 @@
+# src/core/bm25.py
+"""
+Array-backed BM25 inverted index, one per segment (built when the segment is written).
+
+Terms are stored as 64-bit hashes, so a segment's postings are four flat arrays:
+    terms  uint64 (nterms,)       sorted term hashes
+    ptr    int64  (nterms + 1,)   postings of terms[i] are rows[ptr[i]:ptr[i+1]]
+    rows   int32  (npostings,)    local row ids
+    tfs    uint16 (npostings,)    term frequency in that row
+plus dl uint32 (count,) = token count per row. Each is saved as its own .npy
+and opened with mmap, like the vectors.
+"""
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from pathlib import Path
+import hashlib, re
+
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+_ARRAYS = ("terms", "ptr", "rows", "tfs", "dl")
+_MERGE_POSTINGS = 1 << 22   # postings handled per step by merge()
+# words, plus codes such as "AB-1234" / "v2.1" kept whole (their parts are indexed too)
+_TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+_STOP = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or our so "
+    "that the this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    out = []
+    for tok in _TOKEN.findall(text.lower()):
+        if tok in _STOP:
+            continue
+        out.append(tok)
+        if not tok.isalnum():
+            out.extend(p for p in re.split(r"[-./]", tok) if p)
+    return out
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build(texts: List[str]) -> Dict[str, np.ndarray]:
+    postings: Dict[int, List[Tuple[int, int]]] = {}
+    dl = np.zeros(len(texts), dtype=np.uint32)
+    for row, text in enumerate(texts):
+        toks = tokenize(text)
+        dl[row] = len(toks)
+        for term, tf in Counter(toks).items():
+            postings.setdefault(term_hash(term), []).append((row, min(tf, 65535)))
+    terms = np.array(sorted(postings), dtype=np.uint64)
+    ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    rows = np.empty(sum(len(v) for v in postings.values()), dtype=np.int32)
+    tfs = np.empty(len(rows), dtype=np.uint16)
+    pos = 0
+    for i, t in enumerate(terms.tolist()):
+        plist = postings[t]
+        rows[pos:pos + len(plist)] = [r for r, _ in plist]
+        tfs[pos:pos + len(plist)] = [f for _, f in plist]
+        pos += len(plist)
+        ptr[i + 1] = pos
+    return {"terms": terms, "ptr": ptr, "rows": rows, "tfs": tfs, "dl": dl}
+
+
+def save(root: Path, name: str, arrays: Dict[str, np.ndarray]):
+    for key in _ARRAYS:
+        np.save(root / f"{name}.bm25.{key}.npy", arrays[key])
+
+
+def merge(root: Path, name: str, parts: List[Tuple["Postings", np.ndarray]]):
+    """
+    Save the postings of several segments as those of one merged segment, without
+    re-tokenizing. `parts` is [(postings, row map)], the map sending each old row to
+    its row in the merged segment (-1 = dropped); parts come in merged-row order.
+    Streams over ranges of terms of about _MERGE_POSTINGS postings each.
+    """
+    n = sum(int((m >= 0).sum()) for _, m in parts)
+    dl = np.zeros(n, dtype=np.uint32)
+    for p, m in parts:
+        keep = m >= 0
+        dl[m[keep]] = np.asarray(p.dl)[keep]
+    terms = np.unique(np.concatenate([np.asarray(p.terms) for p, _ in parts] + [np.zeros(0, dtype=np.uint64)]))
+    sizes = np.zeros(len(terms), dtype=np.int64)   # postings per term before dropping rows: cuts the steps
+    for p, _ in parts:
+        sizes[np.searchsorted(terms, p.terms)] += np.diff(p.ptr)
+    total = 0
+    for p, m in parts:
+        for a in range(0, len(p.rows), _MERGE_POSTINGS):
+            total += int(np.count_nonzero(m[p.rows[a:a + _MERGE_POSTINGS]] >= 0))
+    rows_out = np.lib.format.open_memmap(root / f"{name}.bm25.rows.npy", mode="w+", dtype=np.int32, shape=(total,))
+    tfs_out = np.lib.format.open_memmap(root / f"{name}.bm25.tfs.npy", mode="w+", dtype=np.uint16, shape=(total,))
+    df = np.zeros(len(terms), dtype=np.int64)
+    ends = np.cumsum(sizes)
+    t0 = pos = 0
+    while t0 < len(terms):
+        done = int(ends[t0 - 1]) if t0 else 0
+        t1 = min(len(terms), max(t0 + 1, int(np.searchsorted(ends, done + _MERGE_POSTINGS, side="right"))))
+        lo, hi = terms[t0], terms[t1 - 1]
+        rows, tfs, tix = [], [], []
+        for p, m in parts:
+            a, b = int(np.searchsorted(p.terms, lo)), int(np.searchsorted(p.terms, hi, side="right"))
+            if a == b:
+                continue
+            pa, pb = int(p.ptr[a]), int(p.ptr[b])
+            r = m[np.asarray(p.rows[pa:pb])]
+            keep = r >= 0
+            rows.append(r[keep])
+            tfs.append(np.asarray(p.tfs[pa:pb])[keep])
+            tix.append(np.repeat(np.searchsorted(terms, p.terms[a:b]), np.diff(p.ptr[a:b + 1]))[keep])
+        if rows:
+            tix = np.concatenate(tix)
+            order = np.argsort(tix, kind="stable")   # parts are in row order, so each term's rows stay sorted
+            rows_out[pos:pos + len(order)] = np.concatenate(rows)[order]
+            tfs_out[pos:pos + len(order)] = np.concatenate(tfs)[order]
+            df[t0:t1] = np.bincount(tix - t0, minlength=t1 - t0)
+            pos += len(order)
+        t0 = t1
+    rows_out.flush()
+    tfs_out.flush()
+    del rows_out, tfs_out
+    used = df > 0
+    np.save(root / f"{name}.bm25.terms.npy", terms[used])
+    np.save(root / f"{name}.bm25.ptr.npy", np.concatenate([[0], np.cumsum(df[used])]).astype(np.int64))
+    np.save(root / f"{name}.bm25.dl.npy", dl)
+
+
+class Postings:
+    """Read-only view over a segment's BM25 arrays."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.terms, self.ptr, self.rows, self.tfs, self.dl = (arrays[k] for k in _ARRAYS)
+        self.total_len = int(np.asarray(self.dl, dtype=np.int64).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(a.nbytes) for a in (self.terms, self.ptr, self.rows, self.tfs, self.dl))
+
+    def _slot(self, h: int) -> int:
+        i = int(np.searchsorted(self.terms, np.uint64(h)))
+        return i if i < len(self.terms) and int(self.terms[i]) == h else -1
+
+    def df(self, h: int) -> int:
+        i = self._slot(h)
+        return int(self.ptr[i + 1] - self.ptr[i]) if i >= 0 else 0
+
+    def score(self, hashes: List[int], idfs: List[float], avgdl: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Sparse BM25: (rows, scores) for every row containing at least one query term."""
+        all_rows, all_scores = [], []
+        for h, idf in zip(hashes, idfs):
+            i = self._slot(h)
+            if i < 0:
+                continue
+            rows = np.asarray(self.rows[self.ptr[i]:self.ptr[i + 1]])
+            tf = np.asarray(self.tfs[self.ptr[i]:self.ptr[i + 1]], dtype=np.float32)
+            norm = K1 * (1.0 - B + B * np.asarray(self.dl[rows], dtype=np.float32) / avgdl)
+            all_rows.append(rows)
+            all_scores.append(idf * tf * (K1 + 1.0) / (tf + norm))
+        if not all_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows = np.concatenate(all_rows)
+        uniq, inv = np.unique(rows, return_inverse=True)
+        return uniq.astype(np.int64), np.bincount(inv, weights=np.concatenate(all_scores)).astype(np.float32)
+
+
+def load(root: Path, name: str) -> Optional[Postings]:
+    if not (root / f"{name}.bm25.dl.npy").exists():
+        return None
+    return Postings({k: np.load(root / f"{name}.bm25.{k}.npy", mmap_mode="r") for k in _ARRAYS})
+
+
+def idf(n_docs: int, df: int) -> float:
+    return float(np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)))
@@ -0,0 +1,120 @@
+# src/core/context.py
+"""
+Context packing for the prompt.
+
+Instead of pasting the top_k hits as-is:
+  1) take a larger candidate pool (CONTEXT_POOL x top_k)
+  2) pick chunks by maximal marginal relevance on the stored vectors
+     (relevant to the query, but not redundant with what's already picked),
+     until top_k chunks or CONTEXT_MAX_TOKENS is reached; relevance is the
+     retrieval's own (cosine, fused RRF score or BM25 order, per mode)
+  3) stitch chunks that were neighbours in the same document back together,
+     dropping the CHUNK_OVERLAP characters they share
+
+Tokens are estimated at ~4 characters each (a network count_tokens call per
+request would cost more than it saves).
+"""
+from typing import Dict, List, Optional, Tuple
+import math
+
+import numpy as np
+
+from src.app.settings import get_settings
+
+_NEAR_DUP = 0.97   # cosine above which a candidate adds nothing new
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+def _overlap(a: str, b: str, hint: int) -> int:
+    """Length of the longest suffix of a that is a prefix of b (tries the chunker's overlap first)."""
+    if hint and len(a) >= hint and len(b) >= hint and a.endswith(b[:hint]):
+        return hint
+    for k in range(min(len(a), len(b), 2 * hint or 400), 15, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _mmr(qvec, hits: List[Dict], k: int, lam: float, budget: int) -> List[int]:
+    """Indices into hits, in pick order."""
+    vecs = np.stack([np.asarray(h["vector"], dtype=np.float32) for h in hits])
+    if "rrf" in hits[0]:
+        # hybrid: the fused score, so an exact keyword / code match BM25 ranked first
+        # stays as relevant as retrieval said, whatever its cosine
+        rrf = np.asarray([h["rrf"] for h in hits], dtype=np.float32)
+        rel = rrf / (rrf.max() or 1.0)
+    elif qvec is not None and "bm25" not in hits[0]:
+        q = np.asarray(qvec, dtype=np.float32)
+        rel = vecs @ (q / (np.linalg.norm(q) or 1.0))
+    else:  # lexical: trust the retrieval order
+        rel = 1.0 - np.arange(len(hits)) / len(hits)
+    sim = vecs @ vecs.T
+    picked: List[int] = []
+    used = 0
+    left = set(range(len(hits)))
+    while left and len(picked) < k:
+        best, best_score = None, -np.inf
+        for i in left:
+            red = max((sim[i, j] for j in picked), default=0.0)
+            score = lam * rel[i] - (1.0 - lam) * red
+            if score > best_score:
+                best, best_score = i, score
+        left.discard(best)
+        if picked and max(sim[best, j] for j in picked) >= _NEAR_DUP:
+            continue
+        cost = estimate_tokens(hits[best]["text"])
+        if picked and used + cost > budget:
+            continue  # a shorter candidate may still fit
+        picked.append(best)
+        used += cost
+    return picked
+
+
+def pack_context(qvec, hits: List[Dict], top_k: int,
+                 budget: Optional[int] = None, lam: Optional[float] = None) -> Tuple[List[Dict], Dict]:
+    """
+    (blocks, stats). Blocks look like hits ({"id", "text", "meta", "score"}) and are what
+    goes into the prompt and the citations; merged blocks also carry "ids".
+    Hits must come from similarity_search(..., with_vectors=True).
+    stats: {"chunks", "blocks", "tokens", "naive_tokens", "saved_tokens"}, where naive_tokens
+    is what pasting the plain top_k hits would have cost.
+    """
+    s = get_settings()
+    budget = budget or s.CONTEXT_MAX_TOKENS
+    lam = s.MMR_LAMBDA if lam is None else lam
+    naive = sum(estimate_tokens(h["text"]) for h in hits[:top_k])
+    if not hits:
+        return [], {"chunks": 0, "blocks": 0, "tokens": 0, "naive_tokens": 0, "saved_tokens": 0}
+
+    picked = _mmr(qvec, hits, top_k, lam, budget)
+    rank = {i: r for r, i in enumerate(picked)}
+
+    # neighbours: same segment + same source + consecutive rows = consecutive chunks of one document
+    order = sorted(picked, key=lambda i: hits[i]["pos"])
+    blocks: List[Dict] = []
+    for i in order:
+        h = hits[i]
+        prev = blocks[-1] if blocks else None
+        if (prev is not None and prev["_seg"] == h["pos"][0] and prev["_row"] + 1 == h["pos"][1]
+                and prev["meta"].get("source") == h["meta"].get("source")):
+            cut = _overlap(prev["text"], h["text"], s.CHUNK_OVERLAP)
+            prev["text"] += h["text"][cut:]
+            prev["ids"].append(h["id"])
+            prev["_row"] = h["pos"][1]
+            prev["_rank"] = min(prev["_rank"], rank[i])
+            if h.get("score") is not None and (prev.get("score") is None or h["score"] < prev["score"]):
+                prev["score"] = h["score"]
+            continue
+        blocks.append({"id": h["id"], "ids": [h["id"]], "text": h["text"], "meta": h["meta"],
+                       "score": h.get("score"), "_seg": h["pos"][0], "_row": h["pos"][1], "_rank": rank[i]})
+    blocks.sort(key=lambda b: b["_rank"])  # most relevant first, as before
+    for b in blocks:
+        del b["_seg"], b["_row"], b["_rank"]
+
+    tokens = sum(estimate_tokens(b["text"]) for b in blocks)
+    stats = {"chunks": len(picked), "blocks": len(blocks), "tokens": tokens,
+             "naive_tokens": naive, "saved_tokens": max(0, naive - tokens)}
+    return blocks, stats
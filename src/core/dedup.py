@@ -0,0 +1,238 @@
+# src/core/dedup.py
+"""
+Duplicate / near-duplicate chunk detection for ingestion.
+
+Each chunk gets an exact hash (of whitespace/case-normalized text), a hash of
+its word sequence and a MinHash signature over word 3-shingles. By default
+only exact duplicates are collapsed. With DEDUP_NEAR, signatures are split
+into LSH bands so candidates are found with a few indexed lookups; a
+candidate whose signature agrees on >= DEDUP_THRESHOLD of positions (an
+estimate of Jaccard similarity) only counts as a near duplicate if it has
+the very same words, so text that differs in one fact ("2 years" / "5 years")
+is always stored on its own: every file a chunk lists as a source contains
+its wording.
+
+A duplicate is not embedded or stored again: the file's manifest entry points
+at the existing chunk id, and `refs` records which files use each chunk, so a
+chunk is only deleted from the vector index once no file references it. The
+stored chunk lists all of those files as its sources (vectordb.set_sources).
+
+State lives in dedup.sqlite in the index directory; chunks registered during a run are
+kept in memory until the write stage has stored them (`commit`).
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from pathlib import Path
+import hashlib, re, sqlite3, threading
+
+import numpy as np
+
+DEDUP_FILE = "dedup.sqlite"
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 3
+
+_PRIME = np.uint64(4294967311)  # > 2**32
+_rng = np.random.default_rng(1234)
+_A = _rng.integers(1, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_WS = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def _norm(text: str) -> str:
+    return _WS.sub(" ", text.strip().lower())
+
+
+def exact_hash(text: str) -> str:
+    return hashlib.sha1(_norm(text).encode("utf-8")).hexdigest()
+
+
+def minhash(text: str) -> np.ndarray:
+    """uint32 MinHash signature (NUM_PERM values) of the text's word shingles."""
+    words = _WORD.findall(text.lower())
+    grams = {" ".join(words[i:i + SHINGLE]) for i in range(max(1, len(words) - SHINGLE + 1))}
+    x = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+        dtype=np.uint64, count=len(grams),
+    )
+    # universal hashing (a*x + b) mod p; a, x < 2**32 so the product fits in uint64
+    h = (np.outer(x, _A) + _B) % _PRIME
+    return h.min(axis=0).astype(np.uint32)
+
+
+def token_hash(text: str) -> str:
+    """Hash of the word sequence: equal for texts that differ only in case, spacing or punctuation."""
+    return hashlib.sha1(" ".join(_WORD.findall(text.lower())).encode("utf-8")).hexdigest()
+
+
+def fingerprints(chunks: List[str]) -> Tuple[List[str], np.ndarray, List[str]]:
+    """Exact hashes, a (n, NUM_PERM) signature matrix and token hashes; cheap enough to run in the extract workers."""
+    sigs = np.zeros((len(chunks), NUM_PERM), dtype=np.uint32)
+    for i, c in enumerate(chunks):
+        sigs[i] = minhash(c)
+    return [exact_hash(c) for c in chunks], sigs, [token_hash(c) for c in chunks]
+
+
+def _band_keys(sig: np.ndarray) -> List[int]:
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([b]) + sig[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8).digest(),
+                       "little", signed=True)
+        for b in range(BANDS)
+    ]
+
+
+class DedupIndex:
+    def __init__(self, path: Path, threshold: float, near: bool = False):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.near = near
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS exact (h TEXT PRIMARY KEY, chunk_id TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS sigs  (chunk_id TEXT PRIMARY KEY, h TEXT NOT NULL, sig BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, chunk_id TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS bands_key ON bands(key);
+            CREATE INDEX IF NOT EXISTS bands_chunk ON bands(chunk_id);
+            CREATE TABLE IF NOT EXISTS refs  (chunk_id TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (chunk_id, path));
+            """
+        )
+        if "tok" not in [r[1] for r in self._db.execute("PRAGMA table_info(sigs)")]:
+            # stores from before token hashes: their chunks are never confirmed as near duplicates
+            self._db.execute("ALTER TABLE sigs ADD COLUMN tok TEXT")
+        self._db.commit()
+        # registered this run, not yet committed: chunk_id -> (exact hash, signature, token hash)
+        self._pending: Dict[str, Tuple[str, np.ndarray, Optional[str]]] = {}
+        self._pending_exact: Dict[str, str] = {}
+        self._pending_bands: Dict[int, List[str]] = {}
+        # duplicates resolved to a chunk whose referencing doc isn't written yet;
+        # such chunks must not be deleted in the meantime
+        self._claims: Dict[str, int] = {}
+
+    # ---- lookup / register (ingest producer side) ----
+
+    def find(self, h: str, sig: np.ndarray, tok: Optional[str] = None) -> Tuple[Optional[str], str]:
+        """
+        (existing chunk id, "exact" | "near") for a duplicate, or (None, "") if the chunk is new.
+        Near duplicates need `near` and the same token hash (`tok`) as the stored chunk.
+        """
+        with self._lock:
+            cid = self._pending_exact.get(h)
+            if cid is None:
+                row = self._db.execute("SELECT chunk_id FROM exact WHERE h=?", (h,)).fetchone()
+                cid = row[0] if row else None
+            if cid is not None:
+                self._claims[cid] = self._claims.get(cid, 0) + 1
+                return cid, "exact"
+            if not self.near or tok is None:
+                return None, ""
+            keys = _band_keys(sig)
+            cands: Set[str] = set()
+            for k in keys:
+                cands.update(self._pending_bands.get(k, ()))
+            marks = ",".join("?" * len(keys))
+            for (c,) in self._db.execute(f"SELECT DISTINCT chunk_id FROM bands WHERE key IN ({marks})", keys):
+                cands.add(c)
+            best, best_sim = None, self.threshold
+            for c in cands:
+                other, other_tok = self._signature(c)
+                if other is None or other_tok != tok:
+                    continue   # similar, but not the same words: not a copy of this text
+                sim = float(np.mean(other == sig))
+                if sim >= best_sim:
+                    best, best_sim = c, sim
+            if best is None:
+                return None, ""
+            self._claims[best] = self._claims.get(best, 0) + 1
+            return best, "near"
+
+    def _signature(self, cid: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        """(signature, token hash) of a registered chunk."""
+        if cid in self._pending:
+            return self._pending[cid][1:]
+        row = self._db.execute("SELECT sig, tok FROM sigs WHERE chunk_id=?", (cid,)).fetchone()
+        return (np.frombuffer(row[0], dtype=np.uint32), row[1]) if row else (None, None)
+
+    def register(self, cid: str, h: str, sig: np.ndarray, tok: Optional[str] = None):
+        """Make a new (not yet stored) chunk findable for the rest of this run."""
+        with self._lock:
+            self._pending[cid] = (h, sig, tok)
+            self._pending_exact.setdefault(h, cid)
+            for k in _band_keys(sig):
+                self._pending_bands.setdefault(k, []).append(cid)
+
+    def _unpend(self, cid: str, h: str, sig: np.ndarray):
+        if self._pending_exact.get(h) == cid:
+            del self._pending_exact[h]
+        for k in _band_keys(sig):
+            lst = self._pending_bands.get(k)
+            if lst and cid in lst:
+                lst.remove(cid)
+                if not lst:
+                    del self._pending_bands[k]
+
+    # ---- write side ----
+
+    def commit(self, cids: Iterable[str]):
+        """Persist registrations for chunks that are now in the vector index."""
+        with self._lock:
+            for cid in cids:
+                h, sig, tok = self._pending.pop(cid)
+                self._unpend(cid, h, sig)
+                self._db.execute("INSERT OR IGNORE INTO exact(h, chunk_id) VALUES (?, ?)", (h, cid))
+                self._db.execute("INSERT OR REPLACE INTO sigs(chunk_id, h, sig, tok) VALUES (?, ?, ?, ?)",
+                                 (cid, h, sig.tobytes(), tok))
+                self._db.executemany("INSERT INTO bands(key, chunk_id) VALUES (?, ?)", [(k, cid) for k in _band_keys(sig)])
+            self._db.commit()
+
+    def add_refs(self, path: str, cids: Iterable[str], claimed: Iterable[str] = ()):
+        """Record that `path` uses these chunks; `claimed` are the ids find() handed out for it."""
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO refs(chunk_id, path) VALUES (?, ?)", [(c, path) for c in set(cids)])
+            self._db.commit()
+            for c in claimed:
+                n = self._claims.get(c, 0) - 1
+                if n > 0:
+                    self._claims[c] = n
+                else:
+                    self._claims.pop(c, None)
+
+    def release(self, path: str, cids: Iterable[str]):
+        """Drop `path`'s references to these chunks."""
+        with self._lock:
+            self._db.executemany("DELETE FROM refs WHERE chunk_id=? AND path=?", [(c, path) for c in set(cids)])
+            self._db.commit()
+
+    def unreferenced(self, cids: Iterable[str]) -> List[str]:
+        with self._lock:
+            return [c for c in set(cids) if c not in self._claims
+                    and self._db.execute("SELECT 1 FROM refs WHERE chunk_id=? LIMIT 1", (c,)).fetchone() is None]
+
+    def forget(self, cids: Iterable[str]):
+        """Remove deleted chunks so nothing new is deduplicated against them."""
+        with self._lock:
+            for c in set(cids):
+                self._db.execute("DELETE FROM exact WHERE chunk_id=?", (c,))
+                self._db.execute("DELETE FROM sigs WHERE chunk_id=?", (c,))
+                self._db.execute("DELETE FROM bands WHERE chunk_id=?", (c,))
+            self._db.commit()
+
+    def paths(self, cids: Iterable[str]) -> Dict[str, List[str]]:
+        """Files that use each chunk, in the order they started to; chunks no file uses are left out."""
+        cids = list(set(cids))
+        out: Dict[str, List[str]] = {}
+        with self._lock:
+            for start in range(0, len(cids), 500):
+                part = cids[start:start + 500]
+                marks = ",".join("?" * len(part))
+                for c, p in self._db.execute(
+                        f"SELECT chunk_id, path FROM refs WHERE chunk_id IN ({marks}) ORDER BY rowid", part):
+                    out.setdefault(c, []).append(p)
+        return out
+
+    def close(self):
+        self._db.close()
+
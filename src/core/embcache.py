@@ -0,0 +1,127 @@
+# src/core/embcache.py
+"""
+Persistent embedding cache (SQLite, WAL mode) so rebuilds and repeated
+queries don't pay a Gemini round trip for text we've already embedded.
+
+Key = sha256(model | task_type | text). Vectors are stored as raw float32 bytes.
+The cache is bounded by EMBED_CACHE_MAX_ENTRIES and evicts least-recently-used rows.
+"""
+from typing import Dict, List, Optional
+from pathlib import Path
+import hashlib, sqlite3, threading, time
+
+import numpy as np
+
+from src.app.settings import get_settings
+from src.core import metrics
+
+
+def cache_key(model: str, task_type: str, text: str) -> bytes:
+    h = hashlib.sha256()
+    h.update(f"{model}\x00{task_type}\x00".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: Path, max_entries: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS emb (key BLOB PRIMARY KEY, vec BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS emb_last_used ON emb(last_used)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Cached vectors for whichever keys are present (and mark them recently used)."""
+        found: Dict[bytes, List[float]] = {}
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(uniq), 500):  # stay under SQLite's bound-parameter limit
+                part = uniq[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._db.execute(f"SELECT key, vec FROM emb WHERE key IN ({marks})", part).fetchall()
+                for k, v in rows:
+                    found[k] = np.frombuffer(v, dtype=np.float32).tolist()
+                if rows:
+                    now = time.time_ns()
+                    self._db.executemany("UPDATE emb SET last_used=? WHERE key=?", [(now, k) for k, _ in rows])
+            self._db.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items: Dict[bytes, List[float]]):
+        if not items:
+            return
+        now = time.time_ns()
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO emb(key, vec, last_used) VALUES (?, ?, ?)", rows)
+            self._count += self._db.total_changes - before
+            excess = self._count - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM emb WHERE key IN (SELECT key FROM emb ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._count -= excess
+                self.evictions += excess
+            self._db.commit()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM emb")
+            self._db.commit()
+            self._count = 0
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache, or None when EMBED_CACHE_MAX_ENTRIES is 0."""
+    global _cache
+    s = get_settings()
+    if s.EMBED_CACHE_MAX_ENTRIES <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(Path(s.EMBED_CACHE_PATH), s.EMBED_CACHE_MAX_ENTRIES)
+        return _cache
+
+
+def _cache_metrics():
+    if _cache is None:
+        return []
+    st = _cache.stats()
+    return [
+        ("embed_cache_hits_total", "counter", st["hits"]),
+        ("embed_cache_misses_total", "counter", st["misses"]),
+        ("embed_cache_evictions_total", "counter", st["evictions"]),
+        ("embed_cache_entries", "gauge", st["entries"]),
+    ]
+
+metrics.register(_cache_metrics)
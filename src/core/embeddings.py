@@ -1,20 +1,38 @@
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
 import random
 
-import google.generativeai as genai
-
 from src.app.settings import get_settings
+from src.core.embcache import get_cache, cache_key
+from src.core import logs, metrics
 import sys
 
 # ------------------------------------------------------------------
-# Configure Gemini
+# Configure Gemini (on first use: the SDK import alone costs about a second,
+# which every process would otherwise pay at startup)
 # ------------------------------------------------------------------
 _settings = get_settings()
-if not _settings.GOOGLE_API_KEY:
-    raise RuntimeError("GOOGLE_API_KEY is missing in .env")
+_genai_lock = threading.Lock()
+_genai_module = None
+
 
-genai.configure(api_key=_settings.GOOGLE_API_KEY)
+def _genai():
+    """The google.generativeai module, imported and configured once."""
+    global _genai_module
+    if _genai_module is None:
+        with _genai_lock:
+            if _genai_module is None:
+                import google.generativeai as genai
+
+                if _settings.GOOGLE_API_KEY:
+                    genai.configure(api_key=_settings.GOOGLE_API_KEY)
+                else:
+                    # benchmarks patch in scripts/fake_gemini.py; real calls will fail
+                    logs.warning("embed", "GOOGLE_API_KEY is missing in .env; embedding calls will fail")
+                _genai_module = genai
+    return _genai_module
 
 
 def _canon_model(name: str) -> str:
@@ -27,57 +45,99 @@ def _canon_model(name: str) -> str:
     return name if name.startswith(("models/", "tunedModels/")) else f"models/{name}"
 
 
-def _embed_one(text: str, model: str, attempt: int = 1, max_retries: int = 3) -> List[float]:
+def _embed_batch(batch: List[str], model: str, max_retries: int = 3, backoff: float = 1.5,
+                 task_type: str = "retrieval_document") -> List[List[float]]:
     """
-    Call Gemini once for a single text with simple retry logic.
-    This helps with transient 5xx errors from the API.
+    One Gemini request for a whole batch, with simple retry logic.
+    A failed batch is retried as a unit (5xx / 429 are usually transient).
     """
-    try:
-        resp = genai.embed_content(
-            model=model,
-            content=text,
-            task_type="retrieval_document",
-        )
-        return resp["embedding"]
-    except Exception as e:
-        if attempt >= max_retries:
-            # Final failure – surface a clear error up to the caller
-            print(f"[embed] FAILED after {attempt} attempts: {e}", flush=True)
-            raise RuntimeError(f"Gemini embedding failed after {attempt} attempts: {e}") from e
-
-        # Exponential-ish backoff with a bit of jitter
-        sleep_for = 1.5 * attempt + random.random()
-        print(
-            f"[embed] Error on attempt {attempt}: {e} -> retrying in {sleep_for:.1f}s",
-            flush=True,
-        )
-        time.sleep(sleep_for)
-        return _embed_one(text, model, attempt + 1, max_retries=max_retries)
-
-
-def embed_texts(texts: List[str]) -> List[List[float]]:
+    for attempt in range(1, max_retries + 1):
+        metrics.inc("embed_calls_total")
+        try:
+            with metrics.span("embed_request"):
+                resp = _genai().embed_content(
+                    model=model,
+                    content=batch,
+                    task_type=task_type,
+                )
+            vecs = resp["embedding"]
+            if len(vecs) != len(batch):
+                raise RuntimeError(f"expected {len(batch)} embeddings, got {len(vecs)}")
+            metrics.inc("embed_texts_total", len(batch))
+            return vecs
+        except Exception as e:
+            if attempt >= max_retries:
+                # Final failure – surface a clear error up to the caller
+                metrics.inc("embed_failures_total")
+                logs.error("embed", f"FAILED after {attempt} attempts: {e}", every=_settings.LOG_RATE_S, key="failed")
+                raise RuntimeError(f"Gemini embedding failed after {attempt} attempts: {e}") from e
+
+            # Exponential-ish backoff with a bit of jitter
+            sleep_for = backoff * attempt + random.random() * backoff / 1.5
+            metrics.inc("embed_retries_total")
+            logs.warning(
+                "embed",
+                f"Error on attempt {attempt} (batch of {len(batch)}): {e} -> retrying in {sleep_for:.1f}s",
+                every=_settings.LOG_RATE_S, key="retry",
+            )
+            time.sleep(sleep_for)
+
+
+def _embed_all(texts: List[str], model: str, batch_size: int, concurrency: int,
+               max_retries: int = 3, backoff: float = 1.5,
+               task_type: str = "retrieval_document") -> List[List[float]]:
     """
-    Embed a list of texts using Gemini.
-
-    - Logs progress to stdout (visible in Render logs).
-    - Retries transient API errors instead of failing ingestion immediately.
+    Split texts into batches and keep up to `concurrency` requests in flight.
+    pool.map yields results in submission order, so vectors line up with texts.
     """
-    model_name = getattr(_settings, "GEMINI_EMBED_MODEL", None)
-    model = _canon_model(model_name)
+    batch_size = max(1, batch_size)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    def run(b):
+        return _embed_batch(b, model, max_retries, backoff, task_type)
 
-    print(f"[embed] Model: {model} | texts={len(texts)}", flush=True)
+    if len(batches) <= 1 or concurrency <= 1:
+        results = [run(b) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            results = list(pool.map(run, batches))
+    return [v for batch in results for v in batch]
 
-    vectors: List[List[float]] = []
-    total = len(texts)
 
-    for i, t in enumerate(texts, 1):
-        preview = (t[:60] + "…") if len(t) > 60 else t
-        print(f"[embed] {i}/{total} -> “{preview}”", flush=True)
-
-        emb = _embed_one(t, model)
-        vectors.append(emb)
+def embed_texts(texts: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
+    """
+    Embed a list of texts using Gemini.
 
-        print(f"[embed] done {i}, dim={len(emb)}", flush=True)
+    - Texts already in the embedding cache (src/core/embcache.py) skip the network.
+    - Sends EMBED_BATCH_SIZE texts per request, EMBED_CONCURRENCY requests in flight.
+    - Retries transient API errors per batch instead of failing ingestion immediately.
+    """
+    if not texts:
+        return []
+    model_name = getattr(_settings, "GEMINI_EMBED_MODEL", None)
+    model = _canon_model(model_name)
 
-    print("[embed] all done", flush=True)
-    return vectors
+    cache = get_cache()
+    keys = [cache_key(model, task_type, t) for t in texts] if cache else []
+    found = cache.get_many(keys) if cache else {}
+    # embed each distinct uncached text once
+    todo = {}
+    for i, t in enumerate(texts):
+        if not cache or keys[i] not in found:
+            todo.setdefault(keys[i] if cache else i, t)
+    if not todo:
+        return [found[k] for k in keys]
+
+    t0 = time.perf_counter()
+    fresh = dict(zip(todo.keys(), _embed_all(
+        list(todo.values()), model,
+        batch_size=_settings.EMBED_BATCH_SIZE,
+        concurrency=_settings.EMBED_CONCURRENCY,
+        max_retries=_settings.EMBED_MAX_RETRIES,
+        task_type=task_type,
+    )))
+    logs.debug("embed", f"{model} | texts={len(texts)} embedded={len(todo)} in {time.perf_counter() - t0:.1f}s")
+    if not cache:
+        return [fresh[i] for i in range(len(texts))]
+    cache.put_many(fresh)
+    found.update(fresh)
+    return [found[k] for k in keys]
@@ -1,36 +1,265 @@
 # src/core/history.py
+"""
+Chat history, stored in SQLite (WAL mode) and partitioned by session.
+
+    messages(id, session_id, ts, role, content, citations)   index (session_id, id), index (ts)
+
+Reads touch only one session's tail (load_recent) or one page (load_page), so a
+new session doesn't pay for months of other people's chats. Old messages are
+rotated out by age / total count (HISTORY_MAX_AGE_DAYS / HISTORY_MAX_MESSAGES),
+and export streams rows to a JSONL file instead of loading them all.
+The old single data/history/chat_history.jsonl (every past visitor's chats) is imported
+once, into a session of its own with a random id (legacy_session()) that no ?sid= can
+guess: only the admin export reaches it, see import_legacy().
+"""
 from pathlib import Path
-import json, time
-from typing import List, Dict, Optional
+import hashlib, json, os, secrets, sqlite3, threading, time, uuid
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.app.settings import get_settings
+from src.core import logs
 
 HIST_DIR = Path("data/history")
 HIST_DIR.mkdir(parents=True, exist_ok=True)
-HIST_FILE = HIST_DIR / "chat_history.jsonl"
+HIST_FILE = HIST_DIR / "chat_history.jsonl"   # legacy format, migrated on first open
+LEGACY_SESSION_FILE = HIST_DIR / "legacy_session"   # id of the session HIST_FILE went into
+EXPORT_DIR = HIST_DIR / "exports"
+DEFAULT_SESSION = "default"
+_ROTATE_EVERY = 500   # appends between automatic rotations
 
-def load_history() -> List[Dict]:
-    """Load all messages from disk (JSONL)."""
-    if not HIST_FILE.exists():
-        return []
-    out = []
-    with open(HIST_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                out.append(json.loads(line))
-    return out
-
-def append_message(role: str, content: str, citations: Optional[List[Dict]] = None):
+
+def _row(r) -> Dict:
+    rec = {"id": r[0], "session_id": r[1], "ts": r[2], "role": r[3], "content": r[4]}
+    if r[5]:
+        rec["citations"] = json.loads(r[5])
+    return rec
+
+
+class HistoryStore:
+    def __init__(self, path: Path, max_age_days: float, max_messages: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age_days = max_age_days
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._since_rotate = 0
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                ts REAL NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                citations TEXT
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+            CREATE INDEX IF NOT EXISTS messages_ts ON messages(ts);
+            """
+        )
+        self._db.commit()
+
+    def import_legacy(self, session_id: str) -> int:
+        """Move the legacy JSONL history into `session_id`, once (whoever renames it first). Returns messages imported."""
+        work = HIST_FILE.with_suffix(f".jsonl.{uuid.uuid4().hex[:8]}.importing")
+        try:
+            os.replace(HIST_FILE, work)
+        except FileNotFoundError:
+            return 0
+        with open(work, "r", encoding="utf-8") as f:
+            recs = (json.loads(line) for line in f if line.strip())
+            n = self.append_many(recs, session_id)
+        work.replace(HIST_FILE.with_suffix(".jsonl.migrated"))
+        logs.info("history", f"imported {n} message(s) from {HIST_FILE} into session {session_id}")
+        return n
+
+    # ---- writes ----
+
+    def append_many(self, records: Iterable[Dict], session_id: str = DEFAULT_SESSION) -> int:
+        """Append {"role", "content", "citations"?, "ts"?} records in one transaction."""
+        now = time.time()
+        rows = [
+            (session_id, r.get("ts", now), r["role"], r["content"],
+             json.dumps(r["citations"], ensure_ascii=False) if r.get("citations") else None)
+            for r in records
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO messages(session_id, ts, role, content, citations) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+            self._since_rotate += len(rows)
+            due = self._since_rotate >= _ROTATE_EVERY
+        if due:
+            self.rotate()
+        return len(rows)
+
+    def rotate(self, max_age_days: Optional[float] = None, max_messages: Optional[int] = None) -> int:
+        """Delete messages older than max_age_days, then the oldest beyond max_messages. Returns rows deleted."""
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        max_messages = self.max_messages if max_messages is None else max_messages
+        with self._lock:
+            before = self._db.total_changes
+            if max_age_days > 0:
+                self._db.execute("DELETE FROM messages WHERE ts < ?", (time.time() - max_age_days * 86400,))
+            if max_messages > 0:
+                # ids grow with time, so the cutoff is the max_messages-th newest id
+                row = self._db.execute(
+                    "SELECT id FROM messages ORDER BY id DESC LIMIT 1 OFFSET ?", (max_messages,)
+                ).fetchone()
+                if row:
+                    self._db.execute("DELETE FROM messages WHERE id <= ?", (row[0],))
+            self._db.commit()
+            self._since_rotate = 0
+            return self._db.total_changes - before
+
+    def clear(self, session_id: Optional[str] = None):
+        """Delete one session's messages, or everything when session_id is None."""
+        with self._lock:
+            if session_id is None:
+                self._db.execute("DELETE FROM messages")
+            else:
+                self._db.execute("DELETE FROM messages WHERE session_id=?", (session_id,))
+            self._db.commit()
+
+    # ---- reads ----
+
+    def load_recent(self, session_id: str, n: int) -> List[Dict]:
+        """Last n messages of a session, oldest first (reads n rows through the index)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, session_id, ts, role, content, citations FROM messages "
+                "WHERE session_id=? ORDER BY id DESC LIMIT ?", (session_id, n),
+            ).fetchall()
+        return [_row(r) for r in reversed(rows)]
+
+    def load_page(self, session_id: str, before_id: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict], Optional[int]]:
+        """
+        One page of a session, walking backwards in time (keyset pagination).
+        Returns (messages oldest first, cursor for the next older page or None).
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, session_id, ts, role, content, citations FROM messages "
+                "WHERE session_id=? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before_id if before_id is not None else 2**63 - 1, limit + 1),
+            ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return [_row(r) for r in reversed(rows)], (rows[-1][0] if more else None)
+
+    def sessions(self, limit: int = 100) -> List[Dict]:
+        """Most recently active sessions: {"session_id", "messages", "last_ts"}."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT session_id, COUNT(*), MAX(ts) FROM messages GROUP BY session_id "
+                "ORDER BY MAX(ts) DESC LIMIT ?", (limit,),
+            ).fetchall()
+        return [{"session_id": s, "messages": n, "last_ts": ts} for s, n, ts in rows]
+
+    def iter_messages(self, session_id: Optional[str] = None, batch: int = 1000) -> Iterator[Dict]:
+        """Every message (of one session or all), oldest first, fetched `batch` rows at a time."""
+        last = 0
+        while True:
+            with self._lock:
+                if session_id is None:
+                    rows = self._db.execute(
+                        "SELECT id, session_id, ts, role, content, citations FROM messages "
+                        "WHERE id > ? ORDER BY id LIMIT ?", (last, batch),
+                    ).fetchall()
+                else:
+                    rows = self._db.execute(
+                        "SELECT id, session_id, ts, role, content, citations FROM messages "
+                        "WHERE session_id=? AND id > ? ORDER BY id LIMIT ?", (session_id, last, batch),
+                    ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield _row(r)
+            last = rows[-1][0]
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> HistoryStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            s = get_settings()
+            _store = HistoryStore(Path(s.HISTORY_DB_PATH), s.HISTORY_MAX_AGE_DAYS, s.HISTORY_MAX_MESSAGES)
+        return _store
+
+
+# ---- module-level helpers (what the Streamlit app uses) ----
+
+def load_recent(session_id: str = DEFAULT_SESSION, n: Optional[int] = None) -> List[Dict]:
+    return get_store().load_recent(session_id, n or get_settings().HISTORY_LOAD_RECENT)
+
+def load_page(session_id: str = DEFAULT_SESSION, before_id: Optional[int] = None, limit: int = 50):
+    return get_store().load_page(session_id, before_id, limit)
+
+def load_history(session_id: str = DEFAULT_SESSION) -> List[Dict]:
+    """Recent messages of a session (HISTORY_LOAD_RECENT of them, not the whole history)."""
+    return load_recent(session_id)
+
+def append_message(role: str, content: str, citations: Optional[List[Dict]] = None,
+                   session_id: str = DEFAULT_SESSION):
     """Append a single message to history."""
-    rec = {"ts": int(time.time()), "role": role, "content": content}
-    if citations:
-        rec["citations"] = citations
-    with open(HIST_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-
-def clear_history():
-    """Delete the history file."""
-    if HIST_FILE.exists():
-        HIST_FILE.unlink()
-
-def export_path() -> str:
-    return str(HIST_FILE)
+    get_store().append_many([{"role": role, "content": content, "citations": citations}], session_id)
+
+def append_messages(records: List[Dict], session_id: str = DEFAULT_SESSION) -> int:
+    """Append several messages in one transaction."""
+    return get_store().append_many(records, session_id)
+
+def legacy_session(create: bool = False) -> Optional[str]:
+    """
+    Id of the session holding the imported legacy history ("legacy-" + 32 random hex
+    digits, kept in LEGACY_SESSION_FILE), or None if there is none yet and not `create`.
+    """
+    try:
+        return LEGACY_SESSION_FILE.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        if not create:
+            return None
+    tmp = LEGACY_SESSION_FILE.with_name(f"legacy_session.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(f"legacy-{secrets.token_hex(16)}", encoding="utf-8")
+    try:
+        os.link(tmp, LEGACY_SESSION_FILE)   # first writer wins, and never shows a half-written id
+    except FileExistsError:
+        pass
+    finally:
+        tmp.unlink()
+    return LEGACY_SESSION_FILE.read_text(encoding="utf-8").strip()
+
+def import_legacy() -> int:
+    """Import the pre-SQLite chat_history.jsonl into the legacy session if nobody has yet."""
+    if not HIST_FILE.exists():
+        return 0
+    return get_store().import_legacy(legacy_session(create=True))
+
+def clear_history(session_id: Optional[str] = None):
+    """Delete one session's history (or all of it)."""
+    get_store().clear(session_id)
+
+def export_jsonl(session_id: Optional[str] = None) -> Iterator[str]:
+    """History as JSONL lines, streamed from the database."""
+    for rec in get_store().iter_messages(session_id):
+        yield json.dumps(rec, ensure_ascii=False) + "\n"
+
+def export_path(session_id: Optional[str] = None) -> str:
+    """
+    Write an export file (streamed, constant memory) and return its path. Each session
+    gets its own file (named by a hash of the id), written via a private temp file.
+    """
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    name = hashlib.sha1((session_id or "").encode("utf-8")).hexdigest()[:16] if session_id else "all"
+    out = EXPORT_DIR / f"export-{name}.jsonl"
+    tmp = out.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(export_jsonl(session_id))
+    tmp.replace(out)
+    return str(out)
@@ -0,0 +1,355 @@
+# src/core/ingestion.py
+"""
+Incremental, streaming folder sync for the vector index.
+
+A file manifest (files.json in the index directory, vectordb.index_dir()) records,
+per ingested file:
+    {"size", "mtime_ns", "sha256", "chunk_ids": [...]}
+On each run only new or changed files are chunked and embedded; chunks of
+changed or removed files are deleted by id. With DEDUP_ENABLED, chunks that
+(nearly) duplicate one already stored are not embedded again; the file just
+references the existing chunk id (see src/core/dedup.py), and the chunk lists
+every file that uses it as a source (vectordb.set_sources).
+
+Pipeline (bounded at every step, so memory stays flat for any folder size):
+
+    discover (stat vs. manifest)
+      -> extract + hash + chunk   process pool, at most 2 * workers files in flight
+         (+ MinHash fingerprints)
+      -> dedup                    exact hash / LSH lookup, assigns chunk ids
+      -> embed                    thread, batches of ~INGEST_BATCH_CHUNKS new chunks
+      -> write                    thread, one segment + one manifest save per batch
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import contextvars, json, os, queue, threading, time, uuid
+
+from src.app.settings import get_settings
+from src.core import logs
+from src.core.embeddings import embed_texts
+from src.core.dedup import DEDUP_FILE, DedupIndex
+from src.core.segments import file_lock, new_ids
+from src.core.vectordb import index_dir, add_vectors, delete_ids, set_sources, compact_if_needed
+from src.loaders.files import discover, extract_and_chunk
+
+# per index, in its directory (the one selected with vectordb.use_index)
+FILES_MANIFEST = "files.json"
+FORGOTTEN = "forgotten.txt"   # chunk ids deleted behind the sync's back (forget_chunks)
+SYNC_LOCK = "sync.lock"
+
+_DONE = object()
+
+
+def _load_manifest() -> Dict:
+    try:
+        with open(index_dir() / FILES_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+
+def _save_manifest(manifest: Dict):
+    path = index_dir() / FILES_MANIFEST
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"files.json.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def _default_workers() -> int:
+    n = get_settings().INGEST_WORKERS
+    return n if n > 0 else max(1, (os.cpu_count() or 2) - 1)
+
+
+def sync_folder(root: Path, workers: Optional[int] = None,
+                progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Bring the index in line with the files under `root`.
+
+    Returns file counts (added / changed / removed / unchanged / failed), chunks_added,
+    chunks_deleted, dedup counts (chunks_seen, exact_dups, near_dups), wall seconds
+    and per-stage {"docs", "chunks", "seconds"}.
+    `workers` <= 1 extracts in this process (no pool). `progress`, if given, is
+    called with the running report after each written batch.
+    Syncs are serialized across processes (sync.lock); index writes from elsewhere
+    (/ingest, uploads) keep going in between our batches.
+    """
+    with file_lock(index_dir() / SYNC_LOCK):
+        return _sync_folder(root, workers, progress)
+
+
+def _sync_folder(root: Path, workers: Optional[int], progress: Optional[Callable[[Dict], None]]) -> Dict:
+    settings = get_settings()
+    workers = workers or _default_workers()
+    batch_chunks = settings.INGEST_BATCH_CHUNKS
+    manifest = _load_manifest()
+    files: Dict[str, Dict] = manifest["files"]
+    mlock = threading.Lock()  # guards `files`, `report` and manifest saves
+    report = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0, "failed": 0,
+              "chunks_added": 0, "chunks_deleted": 0, "chunks_seen": 0, "exact_dups": 0, "near_dups": 0}
+    stages = {name: {"docs": 0, "chunks": 0, "seconds": 0.0} for name in ("extract", "embed", "write")}
+    dedup = DedupIndex(index_dir() / DEDUP_FILE, settings.DEDUP_THRESHOLD, settings.DEDUP_NEAR) \
+        if settings.DEDUP_ENABLED else None
+    _apply_forgotten(manifest, dedup)
+    errors: List[BaseException] = []
+    embed_q: "queue.Queue" = queue.Queue(maxsize=2)
+    write_q: "queue.Queue" = queue.Queue(maxsize=2)
+    t_start = time.perf_counter()
+
+    def embed_stage():
+        while True:
+            batch = embed_q.get()
+            if batch is _DONE:
+                write_q.put(_DONE)
+                return
+            if errors:
+                continue  # keep draining so the producer never blocks
+            try:
+                t0 = time.perf_counter()
+                vecs = embed_texts([c for d in batch for _, c in d["new"]])
+                st = stages["embed"]
+                st["seconds"] += time.perf_counter() - t0
+                st["docs"] += len(batch)
+                st["chunks"] += len(vecs)
+                write_q.put((batch, vecs))
+            except BaseException as e:
+                errors.append(e)
+
+    def write_stage():
+        while True:
+            item = write_q.get()
+            if item is _DONE:
+                return
+            if errors:
+                continue
+            try:
+                t0 = time.perf_counter()
+                batch, vecs = item
+                texts = [c for d in batch for _, c in d["new"]]
+                metas = [{"source": Path(d["path"]).name, "path": d["path"]} for d in batch for _ in d["new"]]
+                new = [cid for d in batch for cid, _ in d["new"]]
+                add_vectors(texts, metas, vecs, ids=new)
+                if dedup:
+                    dedup.commit(new)
+                with mlock:
+                    shared = set()   # chunks whose set of files changed
+                    for d in batch:
+                        old = files.get(d["path"])
+                        dead = old["chunk_ids"] if old else []
+                        if dedup:
+                            # chunks shared with other files (or kept by the new version) survive
+                            if old:
+                                dedup.release(d["path"], old["chunk_ids"])
+                            dedup.add_refs(d["path"], d["chunk_ids"], claimed=d["claimed"])
+                            dead = dedup.unreferenced(dead)
+                            shared.update(d["claimed"], set(old["chunk_ids"] if old else ()) - set(dead))
+                        if dead:
+                            report["chunks_deleted"] += delete_ids(dead)
+                            if dedup:
+                                dedup.forget(dead)
+                        files[d["path"]] = {"size": d["size"], "mtime_ns": d["mtime_ns"],
+                                            "sha256": d["sha256"], "chunk_ids": d["chunk_ids"]}
+                        report["changed" if old else "added"] += 1
+                        report["chunks_added"] += len(d["new"])
+                    _sync_sources(dedup, shared)
+                    # one manifest save per batch; an interrupted run never forgets chunks it added
+                    _save_manifest(manifest)
+                st = stages["write"]
+                st["seconds"] += time.perf_counter() - t0
+                st["docs"] += len(batch)
+                st["chunks"] += len(texts)
+                if progress:
+                    progress(dict(report))
+            except BaseException as e:
+                errors.append(e)
+
+    # each stage runs in a copy of our context, so it writes to the same index (vectordb.use_index)
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(stage,), daemon=True)
+               for stage in (embed_stage, write_stage)]
+    for t in threads:
+        t.start()
+
+    batch: List[Dict] = []
+    seen = set()
+
+    def handle(res: Dict, st: os.stat_result):
+        nonlocal batch
+        stages["extract"]["docs"] += 1
+        stages["extract"]["chunks"] += len(res["chunks"])
+        stages["extract"]["seconds"] += res["seconds"]
+        rec = files.get(res["path"])
+        if rec and rec["sha256"] == res["sha256"]:
+            # touched but identical: just remember the new stat
+            with mlock:
+                rec.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                report["unchanged"] += 1
+            return
+        doc = {"path": res["path"], "sha256": res["sha256"], "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+               "chunk_ids": [], "new": [], "claimed": []}
+        ids = new_ids(len(res["chunks"]))
+        for i, chunk in enumerate(res["chunks"]):
+            cid, kind = dedup.find(res["hashes"][i], res["sigs"][i], res["tokens"][i]) if dedup else (None, "")
+            if cid:
+                doc["claimed"].append(cid)
+                report[f"{kind}_dups"] += 1
+            else:
+                cid = ids[i]
+                if dedup:
+                    dedup.register(cid, res["hashes"][i], res["sigs"][i], res["tokens"][i])
+                doc["new"].append((cid, chunk))
+            doc["chunk_ids"].append(cid)
+        report["chunks_seen"] += len(res["chunks"])
+        batch.append(doc)
+        if sum(len(d["new"]) for d in batch) >= batch_chunks:
+            embed_q.put(batch)  # blocks when the embedder is behind (backpressure)
+            batch = []
+
+    def todo():
+        """Files whose size/mtime differ from the manifest."""
+        for p in discover(root):
+            key = str(p)
+            seen.add(key)
+            st = p.stat()
+            rec = files.get(key)
+            if rec and rec["size"] == st.st_size and rec["mtime_ns"] == st.st_mtime_ns:
+                with mlock:
+                    report["unchanged"] += 1
+                continue
+            yield key, st
+
+    def failed(key: str, e: Exception):
+        # one unreadable file (e.g. a broken PDF) shouldn't abort the whole sync
+        logs.warning("ingest", f"skipping {key}: {e}")
+        with mlock:
+            report["failed"] += 1
+
+    try:
+        if workers <= 1:
+            for key, st in todo():
+                if errors:
+                    break
+                try:
+                    res = extract_and_chunk(key, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, bool(dedup))
+                except Exception as e:
+                    failed(key, e)
+                    continue
+                handle(res, st)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = {}  # future -> (path, stat)
+
+                def collect(fut):
+                    key, st = pending.pop(fut)
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        failed(key, e)
+                        return
+                    handle(res, st)
+
+                for key, st in todo():
+                    if errors:
+                        break
+                    fut = pool.submit(extract_and_chunk, key, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, bool(dedup))
+                    pending[fut] = (key, st)
+                    if len(pending) >= 2 * workers:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            collect(fut)
+                for fut in list(pending):
+                    collect(fut)
+        if batch:
+            embed_q.put(batch)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        embed_q.put(_DONE)
+        for t in threads:
+            t.join()
+    if errors:
+        if dedup:
+            dedup.close()
+        raise errors[0]
+
+    with mlock:
+        for key in [k for k in files if k not in seen]:
+            used = files.pop(key)["chunk_ids"]
+            dead = used
+            if dedup:
+                dedup.release(key, used)
+                dead = dedup.unreferenced(used)
+                _sync_sources(dedup, set(used) - set(dead))
+            report["chunks_deleted"] += delete_ids(dead)
+            if dedup:
+                dedup.forget(dead)
+            report["removed"] += 1
+        _save_manifest(manifest)
+    if dedup:
+        dedup.close()
+
+    compact_if_needed()
+    report["seconds"] = time.perf_counter() - t_start
+    report["stages"] = stages
+    return report
+
+
+def _sync_sources(dedup: Optional[DedupIndex], cids):
+    """Give these (deduplicated) chunks every file that now uses them as a source."""
+    if not dedup or not cids:
+        return
+    set_sources({cid: [{"source": Path(p).name, "path": p} for p in paths]
+                 for cid, paths in dedup.paths(cids).items()})
+
+
+def forget_chunks(cids: List[str], detached: List[Tuple[str, str]] = ()):
+    """
+    Note chunks that were deleted outside a sync (vectordb.delete_source), and
+    (chunk id, path) pairs of shared chunks that lost one of their files. The next
+    sync drops the manifest entries of files that used any of them, as if those files
+    had been removed, and so re-adds whichever of them are still on disk.
+    Only appends to a log, so it is safe to call while holding the index writer lock.
+    """
+    if not cids and not detached:
+        return
+    path = index_dir() / FORGOTTEN
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(c + "\n" for c in cids) + "".join(f"{c}\t{p}\n" for c, p in detached))
+
+
+def _apply_forgotten(manifest: Dict, dedup: Optional[DedupIndex]) -> int:
+    """Replay forget_chunks() notes against the file manifest (and save it). Returns files dropped."""
+    path = index_dir() / FORGOTTEN
+    work = path.with_name(f"forgotten.{uuid.uuid4().hex[:8]}.applying")
+    try:
+        os.replace(path, work)  # notes appended from now on wait for the next sync
+    except FileNotFoundError:
+        return 0
+    gone, detached = set(), set()
+    for line in work.read_text(encoding="utf-8").splitlines():
+        cid, _, p = line.partition("\t")
+        if p:
+            detached.add(p)
+        elif cid:
+            gone.add(cid)
+    files: Dict[str, Dict] = manifest["files"]
+    hit = [key for key, rec in files.items() if key in detached or gone.intersection(rec["chunk_ids"])]
+    if dedup:
+        dedup.forget(gone)
+    for key in hit:
+        used = files.pop(key)["chunk_ids"]
+        dead = [c for c in used if c not in gone]
+        if dedup:
+            dedup.release(key, used)
+            dead = dedup.unreferenced(dead)
+            _sync_sources(dedup, set(used) - gone - set(dead))
+        delete_ids(dead)
+        if dedup:
+            dedup.forget(dead)
+    _save_manifest(manifest)
+    work.unlink()
+    if hit:
+        logs.info("ingest", f"{len(hit)} file(s) lost chunks to delete_source; re-adding them")
+    return len(hit)
@@ -0,0 +1,155 @@
+# src/core/jobs.py
+"""
+Background ingestion jobs for uploaded files (what the Streamlit sidebar uses).
+
+    job = submit_upload("faq.pdf", data)   # returns at once
+    get_job(job["id"])                     # {"status", "progress", "chunks", "done_chunks", ...}
+
+Jobs are keyed by target index and the sha256 of the file content, so a Streamlit
+rerun (or uploading the same file again) never embeds anything twice:
+  * a queued / running / finished job for the same bytes is returned as-is
+  * content already in the index (recorded in uploads.json in the index directory,
+    dropped by reset_index) finishes at once with status "skipped"
+A re-upload with new content under the same name replaces the old chunks (upsert).
+
+One worker thread runs the jobs in order, so the UI thread never embeds; embedding
+inside a job is still batched and concurrent (embed_texts). Progress moves per batch
+of INGEST_BATCH_CHUNKS chunks.
+status: "queued" -> "running" -> "done" | "skipped" | "failed"
+"""
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib, json, os, threading, time, uuid
+
+from src.app.settings import get_settings
+from src.core import logs
+from src.core.chunking import simple_chunk
+from src.core.embeddings import embed_texts
+from src.core.segments import file_lock
+from src.core.vectordb import index_dir, index_name, source_count, upsert_vectors, use_index
+from src.loaders.files import extract_bytes
+
+UPLOADS = "uploads.json"        # per index: {"by_hash": {sha: {"name", "chunks", "ts"}}, "by_name": {name: sha}}
+UPLOADS_LOCK = "uploads.lock"
+KEEP_JOBS = 200                             # finished jobs remembered for the UI
+
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, Dict]" = OrderedDict()   # job id -> job
+_by_hash: Dict[tuple, str] = {}                    # (index, content sha256) -> job id
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-job")
+
+
+def _load_uploads() -> Dict:
+    try:
+        with open(index_dir() / UPLOADS, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"by_hash": {}, "by_name": {}}
+
+
+def _remember(sha: str, name: str, chunks: int):
+    path = index_dir() / UPLOADS
+    with file_lock(index_dir() / UPLOADS_LOCK):
+        uploads = _load_uploads()
+        old = uploads["by_name"].get(name)
+        if old and old != sha:
+            uploads["by_hash"].pop(old, None)   # its chunks were just replaced
+        uploads["by_hash"][sha] = {"name": name, "chunks": chunks, "ts": time.time()}
+        uploads["by_name"][name] = sha
+        tmp = path.with_name(f"uploads.json.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(uploads, f)
+        os.replace(tmp, path)
+
+
+def _already_indexed(sha: str) -> Optional[Dict]:
+    """The upload record for this content, if its chunks are still the current ones for that name."""
+    uploads = _load_uploads()
+    rec = uploads["by_hash"].get(sha)
+    if rec and uploads["by_name"].get(rec["name"]) == sha and source_count(rec["name"]):
+        return rec
+    return None
+
+
+def _new_job(name: str, sha: str, size: int) -> Dict:
+    return {"id": uuid.uuid4().hex[:12], "index": index_name(), "name": name, "sha256": sha, "bytes": size,
+            "status": "queued",
+            "progress": 0.0, "chunks": 0, "done_chunks": 0, "replaced": 0, "error": None,
+            "submitted": time.time(), "started": None, "finished": None}
+
+
+def _trim():
+    finished = [j for j in _jobs.values() if j["finished"]]
+    for job in finished[:max(0, len(finished) - KEEP_JOBS)]:
+        _jobs.pop(job["id"], None)
+        if _by_hash.get((job["index"], job["sha256"])) == job["id"]:
+            _by_hash.pop((job["index"], job["sha256"]), None)
+
+
+def submit_upload(name: str, data: bytes) -> Dict:
+    """Queue an uploaded file for ingestion into the current index (or return the job that already covers these bytes)."""
+    key = (index_name(), hashlib.sha256(data).hexdigest())
+    with _lock:
+        jid = _by_hash.get(key)
+        if jid in _jobs and _jobs[jid]["status"] != "failed":
+            return dict(_jobs[jid])
+        job = _new_job(name, key[1], len(data))
+        _jobs[job["id"]] = job
+        _by_hash[key] = job["id"]
+        _trim()
+    _pool.submit(_run, job, data)
+    return dict(job)
+
+
+def _run(job: Dict, data: bytes):
+    with use_index(job["index"]):
+        _ingest(job, data)
+
+
+def _ingest(job: Dict, data: bytes):
+    s = get_settings()
+    job.update(status="running", started=time.time())
+    try:
+        rec = _already_indexed(job["sha256"])
+        if rec:
+            job.update(status="skipped", progress=1.0, chunks=rec["chunks"], done_chunks=rec["chunks"],
+                       error=None if rec["name"] == job["name"] else f"same content as {rec['name']}")
+            return
+        chunks = simple_chunk(extract_bytes(job["name"], data), chunk_size=s.CHUNK_SIZE, overlap=s.CHUNK_OVERLAP)
+        chunks = [c for c in chunks if c.strip()]
+        if not chunks:
+            raise ValueError("no extractable text")
+        job["chunks"] = len(chunks)
+        vectors: List[List[float]] = []
+        step = max(1, s.INGEST_BATCH_CHUNKS)
+        for i in range(0, len(chunks), step):
+            vectors.extend(embed_texts(chunks[i:i + step]))
+            job.update(done_chunks=len(vectors), progress=0.95 * len(vectors) / len(chunks))
+        metas = [{"source": job["name"], "path": f"uploaded://{job['name']}"} for _ in chunks]
+        job["replaced"] = upsert_vectors(chunks, metas, vectors)["replaced"]
+        _remember(job["sha256"], job["name"], len(chunks))
+        job.update(status="done", progress=1.0)
+        logs.info("ingest", f"upload {job['name']}: {len(chunks)} chunk(s), replaced {job['replaced']}")
+    except Exception as e:
+        job.update(status="failed", error=f"{type(e).__name__}: {e}")
+        logs.error("ingest", f"upload {job['name']} failed: {job['error']}")
+    finally:
+        job["finished"] = time.time()
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def list_jobs(limit: int = 20) -> List[Dict]:
+    """Most recent jobs first."""
+    with _lock:
+        return [dict(j) for j in list(_jobs.values())[-limit:][::-1]]
+
+
+def active_jobs() -> int:
+    with _lock:
+        return sum(j["status"] in ("queued", "running") for j in _jobs.values())
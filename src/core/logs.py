@@ -0,0 +1,59 @@
+# src/core/logs.py
+"""
+Leveled, rate-limited console logging, in the same "[tag] message" format as before.
+
+    logs.info("mini-vs", f"compacted {n} segment(s) -> 1")
+    logs.debug("mini-vs", f"retrieved {n} result(s)")        # per request: only with LOG_LEVEL=debug
+    logs.warning("chat", f"LLM error: {e}", every=10)       # at most one line per 10 s per (tag, key)
+
+LOG_LEVEL picks the threshold (debug / info / warning / error). A rate-limited line that
+follows suppressed ones says how many were dropped, so an outage still shows up as one
+line with a count instead of a wall of identical errors.
+"""
+from typing import Dict, Optional, Tuple
+import threading
+import time
+
+from src.app.settings import get_settings
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+_lock = threading.Lock()
+_last: Dict[Tuple[str, str], Tuple[float, int]] = {}   # (tag, key) -> (last emit time, suppressed since)
+_threshold: Optional[int] = None
+
+
+def enabled(level: str) -> bool:
+    global _threshold
+    if _threshold is None:
+        _threshold = LEVELS.get(get_settings().LOG_LEVEL.lower(), LEVELS["info"])
+    return LEVELS[level] >= _threshold
+
+
+def log(level: str, tag: str, msg: str, every: float = 0.0, key: str = ""):
+    if not enabled(level):
+        return
+    if every > 0:
+        now = time.monotonic()
+        with _lock:
+            last, dropped = _last.get((tag, key), (-every, 0))
+            if now - last < every:
+                _last[(tag, key)] = (last, dropped + 1)
+                return
+            _last[(tag, key)] = (now, 0)
+        if dropped:
+            msg += f" (+{dropped} similar in the last {every:g}s)"
+    print(f"[{tag}] {msg}", flush=True)
+
+
+def debug(tag: str, msg: str, **kw):
+    log("debug", tag, msg, **kw)
+
+def info(tag: str, msg: str, **kw):
+    log("info", tag, msg, **kw)
+
+def warning(tag: str, msg: str, **kw):
+    log("warning", tag, msg, **kw)
+
+def error(tag: str, msg: str, **kw):
+    log("error", tag, msg, **kw)
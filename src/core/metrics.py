@@ -0,0 +1,108 @@
+# src/core/metrics.py
+"""
+Tiny in-process metrics: latency samples, counters, and a Prometheus text view of both.
+
+    metrics.observe("ttft_seconds", 0.42)
+    with metrics.span("generate"):        # observes "generate_seconds"
+        ...
+    metrics.inc("embed_calls_total")
+    metrics.summary()  # {"ttft_seconds": {"count": 1, "p50": 0.42, "p95": 0.42, "p99": 0.42}}
+    metrics.render_prometheus()           # what GET /metrics returns
+
+Keeps the last RESERVOIR samples per name, which is plenty for percentiles on one worker.
+Values that live elsewhere (index size, cache hit counters) are read at scrape time
+from functions passed to register().
+"""
+from typing import Callable, Dict, Iterable, List, Tuple
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
+
+from src.core import logs
+
+RESERVOIR = 2048
+PREFIX = "rag_"
+
+_lock = threading.Lock()
+_samples: Dict[str, deque] = {}
+_counts: Dict[str, int] = {}
+_sums: Dict[str, float] = {}
+_counters: Dict[str, float] = {}
+# each collector returns (name, "counter" | "gauge", value) tuples
+_collectors: List[Callable[[], Iterable[Tuple[str, str, float]]]] = []
+
+
+def observe(name: str, seconds: float):
+    with _lock:
+        _samples.setdefault(name, deque(maxlen=RESERVOIR)).append(seconds)
+        _counts[name] = _counts.get(name, 0) + 1
+        _sums[name] = _sums.get(name, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage into "<stage>_seconds" (recorded even if the block raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f"{stage}_seconds", time.perf_counter() - t0)
+
+
+def inc(name: str, n: float = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def counters() -> Dict[str, float]:
+    with _lock:
+        return dict(_counters)
+
+
+def register(collector: Callable[[], Iterable[Tuple[str, str, float]]]):
+    _collectors.append(collector)
+
+
+def _pct(sorted_vals, p: float) -> float:
+    i = min(len(sorted_vals) - 1, int(round(p / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+def summary() -> Dict[str, Dict]:
+    with _lock:
+        snap = {k: sorted(v) for k, v in _samples.items()}
+        counts = dict(_counts)
+    return {
+        k: {"count": counts[k], "p50": _pct(v, 50), "p95": _pct(v, 95), "p99": _pct(v, 99)}
+        for k, v in snap.items() if v
+    }
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition format (0.0.4): latencies as summaries, the rest as counters/gauges."""
+    with _lock:
+        snap = {k: sorted(v) for k, v in _samples.items()}
+        counts, sums, ctrs = dict(_counts), dict(_sums), dict(_counters)
+    lines: List[str] = []
+    for name in sorted(snap):
+        vals, full = snap[name], PREFIX + name
+        lines.append(f"# TYPE {full} summary")
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'{full}{{quantile="{q}"}} {_pct(vals, q * 100) if vals else float("nan")}')
+        lines.append(f"{full}_sum {sums[name]}")
+        lines.append(f"{full}_count {counts[name]}")
+    for name in sorted(ctrs):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name} {ctrs[name]}")
+    for collect in list(_collectors):
+        try:
+            rows = list(collect())
+        except Exception as e:  # a broken collector must not take /metrics down
+            rows = []
+            name = str(getattr(collect, "__name__", collect))
+            logs.error("metrics", f"collector {name} failed: {e}", every=60, key=name)
+        for name, kind, value in rows:
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            lines.append(f"{PREFIX}{name} {float(value)}")
+    return "\n".join(lines) + "\n"
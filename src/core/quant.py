@@ -0,0 +1,169 @@
+# src/core/quant.py
+"""
+Scalar-quantized copies of the segment vectors, NumPy only.
+
+    float16   2 bytes/dim: a plain cast
+    int8      1 byte/dim: per-dimension affine code, x[d] ~ offset[d] + scale[d] * (code[d] + 128)
+
+Search scans the compressed copy (half / a quarter of the bytes of float32, so
+proportionally fewer pages to keep in RAM and to stream through the CPU) and
+re-scores the best candidates against the float32 rows, which stay on disk and
+are only touched for those few rows (see vectordb._score_segment).
+
+For int8, q . x ~ (q * scale) . code + q . offset + 128 * (q . scale): one dot
+product with a rescaled query plus a per-query constant, so scores of different
+segments stay comparable.
+
+int8 is the one to use: its scan runs at float32 speed. NumPy has no fast float16
+matmul, so float16 saves the same memory per byte but scans several times slower.
+
+    seg-<id>.f16.npy             # float16 (count, dim)
+    seg-<id>.i8.npy              # int8 (count, dim)
+    seg-<id>.i8q.npz             # float32 scale[dim], offset[dim]
+"""
+from typing import Optional
+from pathlib import Path
+import os, threading, uuid
+
+import numpy as np
+
+KINDS = ("float16", "int8")
+_BLOCK = 256             # rows widened to float32 at once while scoring (small enough to stay in cache)
+_ENCODE_BLOCK = 16384    # rows per step while encoding (~48 MB of float32 at dim 768)
+
+
+class Quantized:
+    """Read-only view over one segment's compressed vectors."""
+
+    def __init__(self, kind: str, codes: np.ndarray, scale: Optional[np.ndarray] = None,
+                 offset: Optional[np.ndarray] = None):
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+        self.offset = offset
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes) + (int(self.scale.nbytes + self.offset.nbytes) if self.scale is not None else 0)
+
+    def _prep(self, Q: np.ndarray):
+        """(query matrix to multiply the codes with, per-query constant) for (dim,) or (dim, m) queries."""
+        if self.kind == "float16":
+            return Q, 0.0
+        qs = Q * (self.scale if Q.ndim == 1 else self.scale[:, None])
+        return qs.astype(np.float32), self.offset @ Q + 128.0 * (self.scale @ Q)
+
+    def scores(self, Q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate dot products of the rows (all, or `rows`) with Q: a (dim,) query
+        gives (n,) scores, a (dim, m) block of queries gives (n, m).
+        """
+        codes = self.codes if rows is None else self.codes[rows]
+        qq, const = self._prep(Q)
+        out = np.empty((codes.shape[0],) + Q.shape[1:], dtype=np.float32)
+        buf = np.empty((_BLOCK, codes.shape[1]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _BLOCK):
+            block = codes[start:start + _BLOCK]
+            wide = buf[:len(block)]
+            wide[...] = block
+            out[start:start + _BLOCK] = wide @ qq
+        out += const
+        return out
+
+
+def _paths(root: Path, name: str, kind: str):
+    if kind == "float16":
+        return root / f"{name}.f16.npy", None
+    return root / f"{name}.i8.npy", root / f"{name}.i8q.npz"
+
+
+def _tmp(path: Path) -> Path:
+    # np.save appends ".npy"/".npz" unless the name already ends with it
+    return path.with_name(f"{path.stem}.{uuid.uuid4().hex[:8]}.tmp{path.suffix}")
+
+
+def build(root: Path, name: str, vectors: np.ndarray, kind: str):
+    """Write the compressed copy of `vectors` (may be a memmap; encoded block by block)."""
+    codes_path, params_path = _paths(root, name, kind)
+    n, dim = vectors.shape
+    tmp = _tmp(codes_path)
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float16 if kind == "float16" else np.int8,
+                                    shape=(n, dim))
+    if kind == "float16":
+        for start in range(0, n, _ENCODE_BLOCK):
+            out[start:start + _ENCODE_BLOCK] = vectors[start:start + _ENCODE_BLOCK]
+    else:
+        lo = np.full(dim, np.inf, dtype=np.float32)
+        hi = np.full(dim, -np.inf, dtype=np.float32)
+        for start in range(0, n, _ENCODE_BLOCK):
+            block = np.asarray(vectors[start:start + _ENCODE_BLOCK], dtype=np.float32)
+            lo = np.minimum(lo, block.min(axis=0))
+            hi = np.maximum(hi, block.max(axis=0))
+        if n == 0:
+            lo, hi = np.zeros(dim, np.float32), np.zeros(dim, np.float32)
+        scale = np.where(hi > lo, (hi - lo) / 255.0, 1.0).astype(np.float32)
+        for start in range(0, n, _ENCODE_BLOCK):
+            block = np.asarray(vectors[start:start + _ENCODE_BLOCK], dtype=np.float32)
+            out[start:start + _ENCODE_BLOCK] = (np.clip(np.rint((block - lo) / scale), 0, 255) - 128).astype(np.int8)
+        ptmp = _tmp(params_path)
+        np.savez(ptmp, scale=scale, offset=lo.astype(np.float32))
+        os.replace(ptmp, params_path)   # params first: codes without params never look complete
+    out.flush()
+    del out
+    os.replace(tmp, codes_path)
+
+
+def load(root: Path, name: str, kind: str) -> Optional[Quantized]:
+    codes_path, params_path = _paths(root, name, kind)
+    if not codes_path.exists():
+        return None
+    codes = np.load(codes_path, mmap_mode="r")
+    if kind == "float16":
+        return Quantized(kind, codes)
+    with np.load(params_path) as z:
+        return Quantized(kind, codes, z["scale"], z["offset"])
+
+
+def open_or_build(root: Path, name: str, vectors: np.ndarray, kind: str) -> Quantized:
+    """The segment's compressed copy, encoding it first if this segment has none yet."""
+    if kind not in KINDS:
+        raise ValueError(f"unknown VECTOR_STORAGE {kind!r} (float32, {', '.join(KINDS)})")
+    q = load(root, name, kind)
+    if q is None:
+        build(root, name, vectors, kind)
+        q = load(root, name, kind)
+    return q
+
+
+_seek_lock = threading.Lock()   # seek + read where there is no os.pread (Windows)
+
+
+def _pread(f, n: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(f.fileno(), n, offset)
+    with _seek_lock:
+        f.seek(offset)
+        return f.read(n)
+
+
+def read_rows(vectors: np.ndarray, rows: np.ndarray, f=None) -> np.ndarray:
+    """
+    Rows of a memmapped float32 (n, dim) array, read with plain reads on `f` (the same
+    file, kept open by its Segment) instead of through the mapping: faulting a row in
+    maps a whole readahead window / page-cache folio of its neighbours into the process,
+    which for re-scoring would slowly pull the float32 file back into RSS. `f` is never
+    reopened by name, so a reader of an old snapshot still reads it after garbage
+    collection unlinked the file. Without `f`, rows are read through the mapping.
+    """
+    if f is None:
+        return np.asarray(vectors[rows], dtype=np.float32)
+    row_bytes = vectors.shape[1] * vectors.itemsize
+    out = np.empty((len(rows), vectors.shape[1]), dtype=np.float32)
+    for i, r in enumerate(rows.tolist()):
+        out[i] = np.frombuffer(_pread(f, row_bytes, vectors.offset + r * row_bytes), dtype=vectors.dtype)
+    return out
+
+
+def bytes_per_row(kind: str, dim: int) -> int:
+    """Bytes a search scans per chunk for a storage kind."""
+    return dim * {"float32": 4, "float16": 2, "int8": 1}[kind]
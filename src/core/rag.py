@@ -1,20 +1,22 @@
-from typing import Dict, List
-import google.generativeai as genai
-from src.core.vectordb import similarity_search
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, threading, time
+from src.core.vectordb import similarity_search, batch_search, warm_index, index_name
+from src.core.embeddings import embed_texts, _genai
+from src.core.answercache import get_answer_cache, normalize_query
+from src.core.context import pack_context
+from src.core import logs, metrics
 from src.app.settings import get_settings
 
 settings = get_settings()
 
-# --- Configure Gemini once ---
-if not settings.GOOGLE_API_KEY:
-    raise RuntimeError("GOOGLE_API_KEY is missing in .env")
-genai.configure(api_key=settings.GOOGLE_API_KEY)
-
 def _build_model():
     """
     Try the name as-is (preferred), then fall back to 'models/<name>' if needed.
     This handles SDK differences gracefully.
     """
+    genai = _genai()
     name = settings.GEMINI_MODEL or "gemini-1.5-flash"
     try:
         return genai.GenerativeModel(name)
@@ -22,17 +24,33 @@ def _build_model():
         alt = name if name.startswith(("models/", "tunedModels/")) else f"models/{name}"
         return genai.GenerativeModel(alt)
 
-_model = _build_model()
+# built on first use (or by warm_up()); scripts/fake_gemini.py may set it directly
+_model = None
+_model_lock = threading.Lock()
 
-def answer_query(query: str, top_k: int = 6) -> Dict:
-    # 1) retrieve
-    hits = similarity_search(query, k=top_k)
-    if not hits:
-        return {"answer": "I don’t know based on our docs.", "citations": []}
+def _get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = _build_model()
+    return _model
 
-    # 2) build prompt
+def warm_up() -> Dict:
+    """
+    Everything the first request would otherwise pay for: the SDK import + model client,
+    and the index load with its pages faulted in. Returns vectordb.warm_index() stats plus
+    the total "seconds".
+    """
+    t0 = time.perf_counter()
+    _get_model()
+    stats = warm_index()
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+def _build_prompt(query: str, hits: List[Dict]) -> str:
     context = "\n\n---\n\n".join([h["text"] for h in hits])
-    prompt = f"""
+    return f"""
 You are a precise support assistant. Answer ONLY using the CONTEXT below.
 If the answer is not in the context, say: "I don't know based on our docs."
 
@@ -47,24 +65,286 @@ RESPONSE RULES:
 - At the end, add 'Sources:' and list [1], [2], ... based on the order of retrieved chunks.
 """
 
-    # 3) generate (catch and surface any LLM errors so we don't 500)
+def _generate(prompt: str) -> Tuple[str, bool]:
+    """Call the LLM. Returns (answer, failed); errors become a friendly message instead of a 500."""
+    metrics.inc("llm_calls_total")
     try:
-        resp = _model.generate_content(prompt)
+        with _model_slots, metrics.span("generate"):
+            resp = _get_model().generate_content(prompt)
         answer = resp.text.strip() if hasattr(resp, "text") else ""
-        if not answer:
-            answer = "I don’t know based on our docs."
+        return (answer or "I don’t know based on our docs."), False
     except Exception as e:
         # Log to console and return a friendly message instead of 500
-        print(f"[chat] LLM error: {e}", flush=True)
-        answer = f"Sorry — the LLM call failed: {e}"
+        metrics.inc("llm_errors_total")
+        logs.error("chat", f"LLM error: {e}", every=settings.LOG_RATE_S, key="llm")
+        return f"Sorry — the LLM call failed: {e}", True
 
-    # 4) citations
+def _citations(hits: List[Dict]) -> List[Dict]:
     citations: List[Dict] = []
     for i, h in enumerate(hits, 1):
-        citations.append({
+        c = {
             "index": i,
             "source": h["meta"].get("source"),
             "path": h["meta"].get("path"),
             "score": h.get("score"),
-        })
-    return {"answer": answer, "citations": citations}
+        }
+        also = [p for p in h["meta"].get("paths", []) if p != c["path"]]  # deduplicated copies of this chunk
+        if also:
+            c["also"] = also
+        citations.append(c)
+    return citations
+
+NO_ANSWER = {"answer": "I don’t know based on our docs.", "citations": []}
+
+_model_pool = ThreadPoolExecutor(max_workers=settings.MODEL_CONCURRENCY, thread_name_prefix="model")
+# every outbound model call holds a slot, whichever path makes it (pool, stream, batch):
+# MODEL_CONCURRENCY is the cap for the whole process
+_model_slots = threading.BoundedSemaphore(settings.MODEL_CONCURRENCY)
+
+def _query_vector(query: str) -> List[float]:
+    with _model_slots, metrics.span("query_embed"):
+        return embed_texts([query])[0]
+
+def _lexical_fallback(e: Exception):
+    metrics.inc("query_embed_fallbacks_total")
+    logs.warning("chat", f"embedding unavailable ({type(e).__name__}: {e}); using lexical retrieval",
+                 every=settings.LOG_RATE_S, key="fallback")
+
+def _embed_query(query: str) -> Optional[List[float]]:
+    """
+    Query embedding, or None when the call fails or takes longer than EMBED_QUERY_TIMEOUT_S;
+    callers then retrieve with BM25 only (the late result still lands in the embedding cache).
+    """
+    try:
+        return _model_pool.submit(_query_vector, query).result(timeout=settings.EMBED_QUERY_TIMEOUT_S)
+    except Exception as e:
+        _lexical_fallback(e)
+        return None
+
+def _retrieve(query: str, top_k: int, qvec) -> Tuple[List[Dict], Dict]:
+    """Packed context blocks (MMR + token budget + merged neighbours) and their token stats."""
+    pool = top_k * max(1, settings.CONTEXT_POOL)
+    if qvec is None:
+        hits = similarity_search(query, k=pool, mode="lexical", with_vectors=True)
+    else:
+        hits = similarity_search(query, k=pool, qvec=qvec, with_vectors=True)
+    with metrics.span("prompt_build"):  # MMR, budget, neighbour merging: the real work behind the prompt
+        blocks, ctx = pack_context(qvec, hits, top_k)
+    if blocks:
+        logs.debug("chat", f"context: {ctx['chunks']} chunk(s) in {ctx['blocks']} block(s), "
+                           f"~{ctx['tokens']} tokens (saved ~{ctx['saved_tokens']})")
+    return blocks, ctx
+
+def answer_query(query: str, top_k: int = 6) -> Dict:
+    # 0) answer cache: exact normalized question, then near-duplicate by embedding
+    cache = get_answer_cache()
+    if cache:
+        cached = cache.get_exact(query, top_k)
+        if cached is not None:
+            return cached
+        generation = cache.generation
+    qvec = _embed_query(query)
+    if cache and qvec is not None:
+        cached = cache.get_similar(qvec, top_k)
+        if cached is not None:
+            return cached
+
+    # 1) retrieve (BM25 only if the embedding call failed or timed out)
+    hits, ctx = _retrieve(query, top_k, qvec)
+    if not hits:
+        return dict(NO_ANSWER)
+
+    # 2) build prompt, 3) generate
+    answer, failed = _generate(_build_prompt(query, hits))
+
+    # 4) citations
+    result = {"answer": answer, "citations": _citations(hits), "context": ctx}
+    if cache and not failed and qvec is not None:
+        cache.put(query, top_k, qvec, result, generation)
+    return result
+
+def stream_answer(query: str, top_k: int = 6) -> Iterator[Dict]:
+    """
+    Same pipeline as answer_query, but yields events as the model produces them:
+        {"type": "token", "text": ...}            (many)
+        {"type": "error", "message": ...}         (only if the LLM call fails)
+        {"type": "citations", "citations": [...], "context": {...}} (last; context = token stats)
+    Time-to-first-token is recorded as the "ttft_seconds" metric.
+    """
+    t0 = time.perf_counter()
+    cache = get_answer_cache()
+    cached = None
+    if cache:
+        cached = cache.get_exact(query, top_k)
+        generation = cache.generation
+    if cached is None:
+        qvec = _embed_query(query)
+        if cache and qvec is not None:
+            cached = cache.get_similar(qvec, top_k)
+    if cached is not None:
+        metrics.observe("ttft_seconds", time.perf_counter() - t0)
+        yield {"type": "token", "text": cached["answer"]}
+        yield {"type": "citations", "citations": cached["citations"], "context": cached.get("context")}
+        return
+
+    hits, ctx = _retrieve(query, top_k, qvec)
+    if not hits:
+        metrics.observe("ttft_seconds", time.perf_counter() - t0)
+        yield {"type": "token", "text": NO_ANSWER["answer"]}
+        yield {"type": "citations", "citations": []}
+        return
+
+    parts: List[str] = []
+    failed = False
+    metrics.inc("llm_calls_total")
+    t_gen = time.perf_counter()
+    try:
+        with _model_slots:   # held until the stream ends (or the client goes away and closes us)
+            for chunk in _get_model().generate_content(_build_prompt(query, hits), stream=True):
+                text = chunk.text if hasattr(chunk, "text") else ""
+                if not text:
+                    continue
+                if not parts:
+                    metrics.observe("ttft_seconds", time.perf_counter() - t0)
+                parts.append(text)
+                yield {"type": "token", "text": text}
+    except Exception as e:
+        metrics.inc("llm_errors_total")
+        logs.error("chat", f"LLM stream error: {e}", every=settings.LOG_RATE_S, key="llm")
+        failed = True
+        yield {"type": "error", "message": f"Sorry — the LLM call failed: {e}"}
+    metrics.observe("generate_seconds", time.perf_counter() - t_gen)
+    if not parts and not failed:
+        metrics.observe("ttft_seconds", time.perf_counter() - t0)
+        parts.append(NO_ANSWER["answer"])
+        yield {"type": "token", "text": parts[0]}
+
+    citations = _citations(hits)
+    yield {"type": "citations", "citations": citations, "context": ctx}
+    if cache and not failed and qvec is not None:
+        cache.put(query, top_k, qvec, {"answer": "".join(parts).strip(), "citations": citations, "context": ctx},
+                  generation)
+
+def _batches(items: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch: List[Dict] = []
+    for it in items:
+        batch.append(it)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _generate_each(prompts: List[Optional[str]], concurrency: int) -> Iterator[Tuple[str, bool]]:
+    """_generate() results in order, on the shared model pool, at most `concurrency` in flight."""
+    window: "deque" = deque()   # futures (None: no context, nothing to generate)
+
+    def _next():
+        f = window.popleft()
+        return f.result() if f else (NO_ANSWER["answer"], False)
+
+    try:
+        for p in prompts:
+            window.append(_model_pool.submit(_generate, p) if p else None)
+            if len(window) >= concurrency:
+                yield _next()
+        while window:
+            yield _next()
+    finally:
+        for f in window:
+            if f:
+                f.cancel()
+
+def answer_batch(items: Iterable[Dict], top_k: int = 6, generate: bool = False,
+                 concurrency: int = 8, batch_size: int = 256) -> Iterator[Dict]:
+    """
+    Replay many questions (e.g. an evaluation set). `items`: {"query", "id"?, "top_k"?} dicts,
+    consumed lazily. Yields one record per item, in input order:
+        {"id", "query", "hits": [{"id", "source", "path", "score", ...}], "context": {...},
+         "answer", "citations"}   (the last two only with generate=True)
+    Each batch of `batch_size` queries costs one embedding pass and one matrix-matrix
+    product per segment; generation runs at most `concurrency` model calls at once, on the
+    shared model pool (so within MODEL_CONCURRENCY across all callers).
+    The answer cache is bypassed, so every run measures the current index.
+    """
+    for batch in _batches(items, batch_size):
+        texts = [it["query"] for it in batch]
+        ks = [int(it.get("top_k") or top_k) for it in batch]
+        try:
+            with metrics.span("query_embed_batch"):
+                qvecs = embed_texts(texts)
+        except Exception as e:
+            _lexical_fallback(e)
+            qvecs = None
+        pool_k = max(ks) * max(1, settings.CONTEXT_POOL)
+        found = batch_search(texts, k=pool_k, qvecs=qvecs, mode=None if qvecs else "lexical", with_vectors=True)
+        packed = [pack_context(qvecs[i] if qvecs else None, found[i], ks[i]) for i in range(len(batch))]
+        answers = None
+        if generate:
+            prompts = [_build_prompt(q, blocks) if blocks else None for q, (blocks, _) in zip(texts, packed)]
+            answers = _generate_each(prompts, max(1, concurrency))
+        for i, it in enumerate(batch):
+            blocks, ctx = packed[i]
+            rec = {
+                "id": it.get("id"),
+                "query": texts[i],
+                "hits": [{"id": h["id"], "source": h["meta"].get("source"), "path": h["meta"].get("path"),
+                          "score": h.get("score"), **({"bm25": h["bm25"]} if "bm25" in h else {})}
+                         for h in found[i][:ks[i]]],
+                "context": ctx,
+            }
+            if answers is not None:
+                rec["answer"], _ = next(answers)
+                rec["citations"] = _citations(blocks)
+            yield rec
+
+# ------------------------------------------------------------------
+# Async path (used by /chat). Blocking SDK calls run on a dedicated pool of
+# MODEL_CONCURRENCY threads (and, like every model call, hold a _model_slots slot);
+# identical in-flight questions share one retrieval + generation.
+# ------------------------------------------------------------------
+_inflight: Dict[Tuple[str, str, int], "asyncio.Future"] = {}
+
+async def _call_model(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_model_pool, fn, *args)
+
+async def _answer_query_async(query: str, top_k: int) -> Dict:
+    # cache lookups check the index generation on disk (and may load the index):
+    # they run in threads, never on the event loop
+    cache = get_answer_cache()
+    if cache:
+        cached = await asyncio.to_thread(cache.get_exact, query, top_k)
+        if cached is not None:
+            return cached
+        generation = cache.generation
+    try:
+        qvec = await asyncio.wait_for(_call_model(_query_vector, query), settings.EMBED_QUERY_TIMEOUT_S)
+    except Exception as e:
+        _lexical_fallback(e)
+        qvec = None
+    if cache and qvec is not None:
+        cached = await asyncio.to_thread(cache.get_similar, qvec, top_k)
+        if cached is not None:
+            return cached
+
+    # scoring is NumPy work; keep it off the event loop
+    hits, ctx = await asyncio.to_thread(_retrieve, query, top_k, qvec)
+    if not hits:
+        return dict(NO_ANSWER)
+    answer, failed = await _call_model(_generate, _build_prompt(query, hits))
+
+    result = {"answer": answer, "citations": _citations(hits), "context": ctx}
+    if cache and not failed and qvec is not None:
+        await asyncio.to_thread(cache.put, query, top_k, qvec, result, generation)
+    return result
+
+async def answer_query_async(query: str, top_k: int = 6) -> Dict:
+    """Async answer_query with single-flight coalescing on (index, normalized query, top_k)."""
+    key = (index_name(), normalize_query(query), top_k)
+    fut = _inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_answer_query_async(query, top_k))
+        _inflight[key] = fut
+        fut.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: one client disconnecting must not cancel the work others are waiting on
+    return await asyncio.shield(fut)
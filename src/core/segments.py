@@ -0,0 +1,449 @@
+# src/core/segments.py
+"""
+On-disk layout for the mini vector index.
+
+    .miniindex/
+        CURRENT                  # version pointer: the number of the live manifest
+        manifest.<v>.json        # snapshot v: {"dim": 768, "segments": [{"name", "count", "sources", "deleted", "refs"}, ...]}
+        write.lock               # cross-process writer lock
+        seg-<id>.vec.npy         # float32 (count, dim), unit-length rows, opened with mmap
+        seg-<id>.docs.jsonl      # one {"text", "meta"} JSON line per row
+        seg-<id>.off.npy         # int64 byte offsets into docs.jsonl (count + 1 entries)
+        seg-<id>.ids.npy         # chunk ids (32-char hex), stable across compaction
+        seg-<id>.ivf.npz         # optional IVF lists for approximate search (src/core/ann.py)
+        seg-<id>.bm25.*.npy      # BM25 postings for lexical search (src/core/bm25.py)
+        seg-<id>.src.npz         # source names + per-row source code (source -> rows postings)
+        seg-<id>.f16.npy / .i8*  # optional quantized copy of the vectors (src/core/quant.py)
+
+    .miniindexes/<name>/         # same layout, one directory per named index (vectordb.use_index)
+
+Segments are immutable once written: an append writes a new segment, then a
+new manifest snapshot, then swaps CURRENT atomically (publish). Deletes are
+tombstones (local row numbers under "deleted" in the manifest entry) until a
+merge rewrites the survivors; merges are written in a merge-<id>.tmp/ staging
+directory without the writer lock and moved in when they are published. A chunk
+shared by several files (deduplicated at ingestion) lists all of them under
+"refs" (local row -> [[source, path], ...]), which overrides its meta source.
+Vectors are memory-mapped read-only, so several uvicorn workers share the same
+pages through the OS page cache.
+
+Concurrency: writers (any process) serialize on write.lock and always build on
+the latest snapshot; readers take no lock, they just follow CURRENT. The last
+KEEP_VERSIONS snapshots (and their segment files) survive garbage collection,
+so a reader that is still opening an older snapshot finds its files.
+"""
+from typing import List, Dict, Iterator, Optional, Tuple
+from collections import Counter
+from pathlib import Path
+from contextlib import contextmanager
+import copy, os, json, mmap, shutil, time, uuid
+
+import numpy as np
+
+from src.core import bm25
+from src.core.ann import load_ivf
+
+MANIFEST = "manifest.json"   # pre-versioning single manifest, still read if there is no CURRENT
+CURRENT = "CURRENT"
+WRITE_LOCK = "write.lock"
+KEEP_VERSIONS = 3
+STAGING = "merge-"          # merge-<id>.tmp/: a segment being merged, moved in when it is published
+STALE_STAGING_S = 86400     # staging directories this old belong to a merge that died; collected
+_MERGE_ROWS = 65536         # rows copied per step by merge_segments (bounds its memory)
+
+
+class Segment:
+    """Read-only view over one segment's files."""
+
+    def __init__(self, root: Path, entry: Dict):
+        self.name = entry["name"]
+        self.count = int(entry["count"])
+        self.sources = dict(entry.get("sources", {}))
+        self.vectors = np.load(root / f"{self.name}.vec.npy", mmap_mode="r")
+        # the same file for quant.read_rows, open for the segment's lifetime (shared by its copies):
+        # like the mappings, it stays readable after garbage collection unlinks the path
+        self.vectors_file = open(root / f"{self.name}.vec.npy", "rb", buffering=0)
+        self.offsets = np.load(root / f"{self.name}.off.npy")
+        ids_file = root / f"{self.name}.ids.npy"
+        self.ids = np.load(ids_file) if ids_file.exists() else None
+        with open(root / f"{self.name}.docs.jsonl", "rb") as f:
+            self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.ivf = load_ivf(ivf_path(root, self.name))
+        self.quant = None   # float16/int8 copy (src/core/quant.py), attached by vectordb per VECTOR_STORAGE
+        self.lex = bm25.load(root, self.name)
+        if self.lex is None:
+            # segment written before lexical search existed: index it once
+            bm25.save(root, self.name, bm25.build([self.doc(i)["text"] for i in range(self.count)]))
+            self.lex = bm25.load(root, self.name)
+        src_file = root / f"{self.name}.src.npz"
+        if not src_file.exists():
+            _save_sources(root, self.name, [self.doc(i)["meta"] for i in range(self.count)])
+        with np.load(src_file) as z:
+            self.source_names = z["names"].tolist()
+            self.source_codes = z["codes"]
+        # postings: rows of source c are _src_order[_src_ptr[c]:_src_ptr[c + 1]]
+        self._src_index = {n: c for c, n in enumerate(self.source_names)}
+        self._src_order = np.argsort(self.source_codes, kind="stable")
+        self._src_ptr = np.searchsorted(self.source_codes[self._src_order], np.arange(len(self.source_names) + 1))
+        self._set_refs(entry.get("refs", {}))
+        self._set_deleted(entry.get("deleted", []))
+
+    def _set_refs(self, refs: Dict):
+        """Rows with their own source list (shared chunks): row -> [[source, path], ...], first = the one hits show."""
+        self.refs = {int(r): [list(x) for x in lst] for r, lst in refs.items()}
+        self._refs_entry = {str(r): lst for r, lst in sorted(self.refs.items())}
+        by_source: Dict[str, List[int]] = {}
+        for r, lst in self.refs.items():
+            for src in dict.fromkeys(x[0] for x in lst):
+                by_source.setdefault(src, []).append(r)
+        self._ref_rows = {src: np.array(sorted(rows), dtype=np.int64) for src, rows in by_source.items()}
+        self._ref_all = np.array(sorted(self.refs), dtype=np.int64)
+
+    def _set_deleted(self, rows):
+        self.deleted = sorted(int(r) for r in rows)
+        self.alive: Optional[np.ndarray] = None  # None = every row is live
+        if self.deleted:
+            self.alive = np.ones(self.count, dtype=bool)
+            self.alive[self.deleted] = False
+
+    @property
+    def live_count(self) -> int:
+        return self.count - len(self.deleted)
+
+    @property
+    def nbytes(self) -> int:
+        """Rough footprint once searched: the scanned vectors, BM25 postings and row tables."""
+        vectors = self.quant.nbytes if self.quant is not None else self.vectors.nbytes
+        lex = self.lex.nbytes if self.lex is not None else 0
+        ids = self.ids.nbytes if self.ids is not None else 0
+        return int(vectors + lex + ids + self.offsets.nbytes + self.source_codes.nbytes + self._src_order.nbytes)
+
+    def entry(self) -> Dict:
+        e = {"name": self.name, "count": self.count, "sources": self.sources}
+        if self.deleted:
+            e["deleted"] = self.deleted
+        if self.refs:
+            e["refs"] = self._refs_entry
+        return e
+
+    def find(self, ids: np.ndarray) -> np.ndarray:
+        """Local rows (live only) whose chunk id is in `ids`."""
+        if self.ids is None or not len(ids):
+            return np.zeros(0, dtype=np.int64)
+        mask = np.isin(self.ids, ids)
+        if self.alive is not None:
+            mask &= self.alive
+        return np.flatnonzero(mask)
+
+    def with_entry(self, entry: Dict) -> "Segment":
+        """This segment as described by another snapshot's entry (only tombstones/sources/refs can differ)."""
+        if entry.get("deleted", []) == self.deleted and entry.get("refs", {}) == self._refs_entry:
+            return self
+        seg = copy.copy(self)
+        seg.sources = dict(entry.get("sources", {}))
+        seg._set_refs(entry.get("refs", {}))
+        seg._set_deleted(entry.get("deleted", []))
+        return seg
+
+    def row_sources(self, i: int) -> List[str]:
+        """Sources of local row i: its refs if it has them, else its meta source."""
+        lst = self.refs.get(i)
+        return [self.source_names[self.source_codes[i]]] if lst is None else list(dict.fromkeys(x[0] for x in lst))
+
+    def source_rows(self, names: List[str]) -> np.ndarray:
+        """Sorted local rows (including tombstoned ones) that belong to one of the sources `names`."""
+        parts = [self._src_order[self._src_ptr[c]:self._src_ptr[c + 1]]
+                 for c in (self._src_index.get(n) for n in names) if c is not None]
+        if self.refs:
+            # rows with refs belong to their refs' sources, whatever their meta says
+            parts = [p[~np.isin(p, self._ref_all)] for p in parts]
+            parts += [self._ref_rows[n] for n in names if n in self._ref_rows]
+            return np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def with_deleted(self, rows) -> "Segment":
+        """A copy of this segment with extra tombstones (shares the mapped files)."""
+        seg = copy.copy(self)
+        sources = Counter(seg.sources)
+        new = set(int(r) for r in rows) - set(self.deleted)
+        for r in new:
+            sources.subtract(self.row_sources(r))
+        seg.sources = {k: v for k, v in sources.items() if v > 0}
+        seg._set_deleted(set(self.deleted) | new)
+        return seg
+
+    def with_refs(self, changes: Dict[int, Optional[List]]) -> "Segment":
+        """A copy of this segment with new refs for some rows (None = back to the meta source)."""
+        seg = copy.copy(self)
+        refs = dict(self.refs)
+        for r, lst in changes.items():
+            if lst is None:
+                refs.pop(int(r), None)
+            else:
+                refs[int(r)] = lst
+        seg._set_refs(refs)
+        sources = Counter(seg.sources)
+        for r in changes:
+            if self.alive is None or self.alive[r]:
+                sources.subtract(self.row_sources(r))
+                sources.update(seg.row_sources(r))
+        seg.sources = {k: v for k, v in sources.items() if v > 0}
+        return seg
+
+    def raw_doc(self, i: int) -> bytes:
+        return self._docs[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def doc(self, i: int) -> Dict:
+        """{"text": ..., "meta": ...} for local row i (reads only that line)."""
+        return json.loads(self.raw_doc(i))
+
+    def iter_docs(self) -> Iterator[Dict]:
+        for i in self.live_rows():
+            yield self.doc(i)
+
+    def live_rows(self) -> List[int]:
+        if self.alive is None:
+            return list(range(self.count))
+        return np.flatnonzero(self.alive).tolist()
+
+
+def ivf_path(root: Path, name: str) -> Path:
+    return root / f"{name}.ivf.npz"
+
+
+def _new_name() -> str:
+    return f"seg-{time.time_ns():x}-{uuid.uuid4().hex[:6]}"
+
+
+def new_ids(n: int) -> List[str]:
+    return [uuid.uuid4().hex for _ in range(n)]
+
+
+def _write_docs(path: Path, lines: List[bytes]) -> np.ndarray:
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    pos = 0
+    with open(path, "wb") as f:
+        for i, line in enumerate(lines):
+            f.write(line)
+            pos += len(line)
+            offsets[i + 1] = pos
+    return offsets
+
+
+def _save_sources(root: Path, name: str, metas: List[Dict]):
+    names = sorted({str(m.get("source", "?")) for m in metas})
+    code = {n: i for i, n in enumerate(names)}
+    codes = np.array([code[str(m.get("source", "?"))] for m in metas], dtype=np.int32)
+    np.savez(root / f"{name}.src.npz", names=np.array(names, dtype=str), codes=codes)
+
+
+def _finish_segment(root: Path, name: str, matrix: np.ndarray, lines: List[bytes], sources: Counter,
+                    ids, texts: List[str], metas: List[Dict]) -> Dict:
+    np.save(root / f"{name}.vec.npy", np.ascontiguousarray(matrix, dtype=np.float32))
+    offsets = _write_docs(root / f"{name}.docs.jsonl", lines)
+    np.save(root / f"{name}.off.npy", offsets)
+    np.save(root / f"{name}.ids.npy", np.asarray(ids, dtype="S32"))
+    bm25.save(root, name, bm25.build(texts))
+    _save_sources(root, name, metas)
+    return {"name": name, "count": len(lines), "sources": dict(sources)}
+
+
+def write_segment(root: Path, texts: List[str], metas: List[Dict], matrix: np.ndarray, ids: List[str]) -> Dict:
+    """Write a new immutable segment and return its manifest entry (manifest itself is untouched)."""
+    root.mkdir(parents=True, exist_ok=True)
+    lines = [
+        (json.dumps({"text": t, "meta": m}, ensure_ascii=False) + "\n").encode("utf-8")
+        for t, m in zip(texts, metas)
+    ]
+    sources = Counter(m.get("source", "?") for m in metas)
+    return _finish_segment(root, _new_name(), matrix, lines, sources, ids, texts, metas)
+
+
+def _row_maps(segments: List[Segment]) -> List[np.ndarray]:
+    """Per segment: old local row -> row in the concatenation of all live rows (-1 = tombstoned)."""
+    maps, base = [], 0
+    for s in segments:
+        live = np.arange(s.count) if s.alive is None else np.flatnonzero(s.alive)
+        m = np.full(s.count, -1, dtype=np.int64)
+        m[live] = base + np.arange(len(live))
+        maps.append(m)
+        base += len(live)
+    return maps
+
+
+def merge_segments(root: Path, segments: List[Segment]) -> Tuple[Dict, List[np.ndarray]]:
+    """
+    Concatenate the live rows of several segments into one new segment under `root`.
+    Streamed, _MERGE_ROWS rows at a time: vectors go into a memmapped .npy, docs are
+    copied as raw bytes, and the source table and BM25 postings are merged as arrays
+    (nothing is parsed or re-tokenized). Returns (manifest entry, per input segment
+    the map old row -> new row, -1 for the tombstoned rows that were dropped).
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    name = _new_name()
+    maps = _row_maps(segments)
+    n = sum(s.live_count for s in segments)
+    dim = segments[0].vectors.shape[1] if segments else 0
+    vec = np.lib.format.open_memmap(root / f"{name}.vec.npy", mode="w+", dtype=np.float32, shape=(n, dim))
+    ids = np.lib.format.open_memmap(root / f"{name}.ids.npy", mode="w+", dtype="S32", shape=(n,))
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    names = sorted({src for s in segments for src in s.source_names})
+    code = {src: c for c, src in enumerate(names)}
+    codes = np.zeros(n, dtype=np.int32)
+    sources = Counter()
+    with open(root / f"{name}.docs.jsonl", "wb") as docs:
+        for s, m in zip(segments, maps):
+            sources.update(s.sources)
+            recode = np.array([code[src] for src in s.source_names], dtype=np.int32)
+            for r0 in range(0, s.count, _MERGE_ROWS):
+                r1 = min(s.count, r0 + _MERGE_ROWS)
+                keep = m[r0:r1] >= 0
+                rows = np.flatnonzero(keep) + r0
+                if not len(rows):
+                    continue
+                lo, hi = int(m[rows[0]]), int(m[rows[-1]]) + 1   # live rows land on consecutive new rows
+                vec[lo:hi] = np.asarray(s.vectors[r0:r1])[keep]
+                ids[lo:hi] = s.ids[rows] if s.ids is not None else np.asarray(new_ids(len(rows)), dtype="S32")
+                codes[lo:hi] = recode[s.source_codes[rows]]
+                starts, ends = s.offsets[rows], s.offsets[rows + 1]
+                offsets[lo + 1:hi + 1] = offsets[lo] + np.cumsum(ends - starts)
+                if keep.all():
+                    docs.write(s._docs[int(starts[0]):int(ends[-1])])
+                else:
+                    for a, b in zip(starts.tolist(), ends.tolist()):
+                        docs.write(s._docs[a:b])
+    vec.flush()
+    ids.flush()
+    del vec, ids
+    np.save(root / f"{name}.off.npy", offsets)
+    np.savez(root / f"{name}.src.npz", names=np.array(names, dtype=str), codes=codes)
+    bm25.merge(root, name, [(s.lex, m) for s, m in zip(segments, maps)])
+    entry = {"name": name, "count": n, "sources": dict(sources)}
+    refs = {int(m[r]): lst for s, m in zip(segments, maps) for r, lst in s.refs.items() if m[r] >= 0}
+    if refs:
+        entry["refs"] = {str(r): lst for r, lst in sorted(refs.items())}
+    return entry, maps
+
+
+def staging_dir(root: Path) -> Path:
+    """A private directory under `root` to write a segment in without holding the writer lock."""
+    path = root / f"{STAGING}{uuid.uuid4().hex[:12]}.tmp"
+    path.mkdir(parents=True)
+    return path
+
+
+def adopt_segment(stage: Path, root: Path, name: str):
+    """Move a segment written in a staging directory into the store (writer lock held, before publishing it)."""
+    for p in stage.glob(f"{name}.*"):
+        os.replace(p, root / p.name)
+
+
+def _manifest_path(root: Path, version: int) -> Path:
+    return root / f"manifest.{version:08d}.json"
+
+
+def _write_atomic(path: Path, data: str):
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    for attempt in range(50):
+        try:
+            os.replace(tmp, path)
+            return
+        except PermissionError:  # Windows: a reader has the target open for a moment
+            time.sleep(0.01 * (attempt + 1))
+    os.replace(tmp, path)
+
+
+def current_version(root: Path) -> int:
+    """Version CURRENT points at; 0 for a legacy/missing index (cheap: one tiny read)."""
+    try:
+        with open(root / CURRENT, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def read_manifest(root: Path, version: Optional[int] = None) -> Dict:
+    """Manifest of `version` (default: current). May raise FileNotFoundError if it was just collected."""
+    version = current_version(root) if version is None else version
+    path = _manifest_path(root, version) if version else root / MANIFEST
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        if version:
+            raise
+        return {"dim": 0, "segments": []}
+
+
+def publish(root: Path, manifest: Dict) -> int:
+    """
+    Write the manifest as a new immutable snapshot, then point CURRENT at it.
+    Readers see either the old or the new version, never a partial one.
+    Call with the writer lock held. Returns the new version.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    version = current_version(root) + 1
+    _write_atomic(_manifest_path(root, version), json.dumps(manifest))
+    _write_atomic(root / CURRENT, str(version))
+    return version
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive lock on `path` shared by every process on this machine (blocks until acquired)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10s, so loop
+                    break
+                except OSError:
+                    pass
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def collect_garbage(root: Path, keep: int = KEEP_VERSIONS):
+    """
+    Drop snapshots older than the newest `keep` and segment files none of the kept
+    snapshots point at. Call with the writer lock held (so no segment is half-written).
+    Best effort: on Windows a file that is still mapped can't be removed; it is retried next time.
+    """
+    versions = sorted(int(p.name.split(".")[1]) for p in root.glob("manifest.*.json"))
+    live = set()
+    for v in versions[-keep:]:
+        try:
+            live.update(s["name"] for s in read_manifest(root, v)["segments"])
+        except FileNotFoundError:
+            pass
+    doomed = [_manifest_path(root, v) for v in versions[:-keep]] + [root / MANIFEST]
+    doomed += [p for p in root.glob("seg-*") if p.name.split(".", 1)[0] not in live]
+    for p in doomed:
+        try:
+            p.unlink()
+        except OSError:
+            pass
+    for p in root.glob(f"{STAGING}*.tmp"):
+        try:
+            if time.time() - p.stat().st_mtime > STALE_STAGING_S:
+                shutil.rmtree(p, ignore_errors=True)
+        except OSError:
+            pass
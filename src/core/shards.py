@@ -0,0 +1,172 @@
+# src/core/shards.py
+"""
+Scatter-gather vector search over shards of the resident index.
+
+A shard is a list of (segment, first row, end row) pieces: plan() cuts the index
+into shards of about the same number of rows (big segments are split, small ones
+grouped). Each shard yields its own top k, and vectordb merges those into the
+global top k. The result is the same as scanning everything in one go.
+
+Where the shards are scored:
+  * SEARCH_WORKERS > 1: a thread pool in this process. NumPy releases the GIL inside
+    the matrix products, casts and partitions that make up the work, so the threads
+    run on separate cores without copying the query or the index anywhere.
+  * SHARD_SERVERS="host:port,...": shard-server processes, each serving one shard of
+    the same index (the same .miniindex, on a shared or replicated disk):
+
+        python -m scripts.shard_server --shard 0 --of 4 --port 7101
+
+    A server answers with (score, segment name, row) triples. This process still
+    holds the index for reading chunk texts, so only the scoring moves out.
+    Messages are pickles over multiprocessing.connection, so the servers only accept
+    clients that know SHARD_AUTHKEY (required unless bound to localhost).
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+import threading
+
+import numpy as np
+
+from src.app.settings import get_settings
+from src.core import logs, metrics
+
+MIN_SHARD_ROWS = 20000          # smaller shards cost more in hand-off than they save
+_LOCAL_KEY = b"rag-shards-localhost"
+
+_settings = get_settings()
+_pool_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_conn_lock = threading.Lock()
+_idle: Dict[str, List[Connection]] = {}   # "host:port" -> open connections nobody is using
+
+
+def plan(segments, n: int) -> List[List[Tuple[object, int, int]]]:
+    """Cut the segments into (at most) n shards of about the same number of rows."""
+    total = sum(s.count for s in segments)
+    n = max(1, min(n, -(-total // MIN_SHARD_ROWS)))
+    if n == 1:
+        return [[(s, 0, s.count) for s in segments]]
+    per = -(-total // n)
+    shards, cur, room = [], [], per
+    for seg in segments:
+        lo = 0
+        while lo < seg.count:
+            hi = min(seg.count, lo + room)
+            cur.append((seg, lo, hi))
+            room -= hi - lo
+            lo = hi
+            if room == 0:
+                shards.append(cur)
+                cur, room = [], per
+    if cur:
+        shards.append(cur)
+    return shards
+
+
+def shard_count() -> int:
+    return max(1, _settings.SEARCH_SHARDS or _settings.SEARCH_WORKERS)
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = max(_settings.SEARCH_WORKERS, len(servers()), 1)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+    return _pool
+
+
+def scatter(fn: Callable, shards: List, *args) -> List:
+    """[fn(*args, shard) for each shard], on the worker pool when there is more than one shard."""
+    if len(shards) <= 1 or _settings.SEARCH_WORKERS <= 1:
+        return [fn(*args, shard) for shard in shards]
+    return list(_executor().map(lambda shard: fn(*args, shard), shards))
+
+
+# ------------------------------------------------------------------
+# Shard servers
+# ------------------------------------------------------------------
+def servers() -> List[str]:
+    return [a.strip() for a in _settings.SHARD_SERVERS.split(",") if a.strip()]
+
+
+def _authkey() -> bytes:
+    return _settings.SHARD_AUTHKEY.encode() or _LOCAL_KEY
+
+
+def _call(addr: str, msg):
+    with _conn_lock:
+        conns = _idle.get(addr)
+        conn = conns.pop() if conns else None
+    try:
+        if conn is None:
+            host, port = addr.rsplit(":", 1)
+            conn = Client((host, int(port)), authkey=_authkey())
+        conn.send(msg)
+        reply = conn.recv()
+    except (OSError, EOFError) as e:
+        if conn is not None:
+            conn.close()
+        metrics.inc("shard_server_errors_total")
+        logs.error("shards", f"shard server {addr}: {type(e).__name__}: {e}", every=10, key=addr)
+        raise RuntimeError(f"shard server {addr} unavailable") from e
+    with _conn_lock:
+        _idle.setdefault(addr, []).append(conn)
+    if isinstance(reply, Exception):
+        raise reply
+    return reply
+
+
+def remote_search(index: str, Q: np.ndarray, k: int, nprobe: int, sources: Optional[List[str]]) -> List[List[Tuple]]:
+    """
+    Top k per query (rows of unit-length Q) of one named index from every shard server:
+    [[(score, segment name, row)]].
+    """
+    per_query = [[] for _ in range(len(Q))]
+    msg = ("search", index, Q, k, nprobe, sources)
+    for reply in _executor().map(lambda addr: _call(addr, msg), servers()):
+        for cands, more in zip(per_query, reply):
+            cands.extend(more)
+    return per_query
+
+
+def serve(shard: int, of: int, host: str = "127.0.0.1", port: int = 7101):
+    """Answer search requests for shard `shard` of `of` of the indexes in the working directory (blocks)."""
+    from src.core import vectordb   # vectordb imports this module
+
+    if not _settings.SHARD_AUTHKEY and host not in ("127.0.0.1", "localhost", "::1"):
+        raise SystemExit("set SHARD_AUTHKEY before serving shards beyond localhost")
+    if not 0 <= shard < of:
+        raise SystemExit(f"--shard must be in [0, {of})")
+
+    def handle(conn: Connection):
+        with conn:
+            while True:
+                try:
+                    op, index, Q, k, nprobe, sources = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    with vectordb.use_index(index):
+                        idx = vectordb._get_index()
+                        shards = plan(idx["segments"], of)
+                        pieces = shards[shard] if shard < len(shards) else []
+                        reply = vectordb.shard_search(pieces, Q, k, nprobe, sources)
+                    reply = [[(s, seg.name, row) for s, seg, row in cands] for cands in reply]
+                except Exception as e:   # goes back to the caller, the server keeps running
+                    logs.error("shards", f"search failed: {type(e).__name__}: {e}", every=10)
+                    reply = RuntimeError(f"shard {shard}/{of}: {type(e).__name__}: {e}")
+                conn.send(reply)
+
+    vectordb.warm_index()
+    with Listener((host, port), authkey=_authkey()) as listener:
+        logs.info("shards", f"serving shard {shard} of {of} on {host}:{port}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:   # failed handshake (wrong key) and the like
+                logs.warning("shards", f"rejected a connection: {type(e).__name__}: {e}", every=10)
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True, name="shard-conn").start()
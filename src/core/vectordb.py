@@ -1,94 +1,963 @@
 # src/core/vectordb.py
-from typing import List, Dict
-import os, uuid, pickle, math
+from typing import List, Dict, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+import re, pickle, math, shutil, threading, time
+from collections import Counter, OrderedDict
 from pathlib import Path
+import numpy as np
 from src.core.embeddings import embed_texts
+from src.core.segments import (
+    MANIFEST, WRITE_LOCK, Segment, write_segment, merge_segments, read_manifest, current_version,
+    publish, collect_garbage, file_lock, ivf_path, new_ids, staging_dir, adopt_segment,
+)
+from src.core.ann import build_ivf, ivf_candidates, save_ivf
+from src.core import bm25, logs, metrics, quant, shards
 from src.app.settings import get_settings
 
 _settings = get_settings()
-INDEX_PATH = Path(".miniindex.pkl")
+INDEX_DIR = Path(".miniindex")               # segment store of the default index (INDEX_NAME), see src/core/segments.py
+INDEXES_DIR = Path(".miniindexes")           # other named indexes, one segment store each: .miniindexes/<name>/
+LEGACY_INDEX_PATH = Path(".miniindex.pkl")   # old single-pickle format, migrated on first load (default index)
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
 
-def _load_index():
-    if INDEX_PATH.exists():
-        with open(INDEX_PATH, "rb") as f:
-            return pickle.load(f)  # dict with keys: texts, metas, vectors
-    return {"texts": [], "metas": [], "vectors": []}
+# ------------------------------------------------------------------
+# Named indexes. Every function below works on the index selected with
+# use_index() in the calling context (a ContextVar, so concurrent requests /
+# tasks can use different indexes); INDEX_NAME when none is selected.
+# ------------------------------------------------------------------
+_current: ContextVar[Optional[str]] = ContextVar("index_name", default=None)
 
-def _save_index(idx):
-    with open(INDEX_PATH, "wb") as f:
-        pickle.dump(idx, f)
+def _check_name(name: str) -> str:
+    if not isinstance(name, str) or not _NAME_RE.match(name):
+        raise ValueError(f"invalid index name {name!r} (letters, digits, '_', '-', '.'; at most 64 characters)")
+    return name
+
+def index_name() -> str:
+    """Name of the index the calling context works on."""
+    return _current.get() or _settings.INDEX_NAME
+
+def index_dir(name: Optional[str] = None) -> Path:
+    """Segment store of an index (default: the current one)."""
+    name = _check_name(name or index_name())
+    return INDEX_DIR if name == _settings.INDEX_NAME else INDEXES_DIR / name
+
+@contextmanager
+def use_index(name: Optional[str]):
+    """Run the block against index `name` (None = leave the selection as it is)."""
+    if name is None:
+        yield
+        return
+    token = _current.set(_check_name(name))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def list_indexes() -> List[str]:
+    """Names of the indexes on disk (the default one always)."""
+    named = sorted(p.name for p in INDEXES_DIR.iterdir() if p.is_dir() and _NAME_RE.match(p.name)) \
+        if INDEXES_DIR.is_dir() else []
+    return [_settings.INDEX_NAME] + [n for n in named if n != _settings.INDEX_NAME]
+
+def _dir() -> Path:
+    return index_dir()
+
+def _make_index(segments, dim):
+    """Resident index dict; live counts (total and per source) are summed once here, on write/load."""
+    sources = Counter()
+    for seg in segments:
+        sources.update(seg.sources)
+    return {"segments": segments, "dim": dim, "count": sum(s.live_count for s in segments), "sources": sources}
+
+def _empty_index():
+    return _make_index([], 0)
+
+def _open_index(manifest, prev=None):
+    """Open a snapshot, reusing segments `prev` (the resident index) already has open."""
+    have = {s.name: s for s in prev["segments"]} if prev else {}
+    root = _dir()
+    segments = [have[e["name"]].with_entry(e) if e["name"] in have else _attach_quant(Segment(root, e), root)
+                for e in manifest["segments"]]
+    return _make_index(segments, manifest.get("dim", 0))
+
+def _manifest_of(idx):
+    return {"dim": idx["dim"], "segments": [s.entry() for s in idx["segments"]]}
+
+def _migrate_legacy():
+    """One-time import of .miniindex.pkl into a single segment."""
+    with _writer():
+        if not LEGACY_INDEX_PATH.exists():
+            return  # another process got there first
+        with open(LEGACY_INDEX_PATH, "rb") as f:
+            old = pickle.load(f)
+        matrix = old["matrix"] if "matrix" in old else _normalize(old.get("vectors", []))
+        manifest = {"dim": 0, "segments": []}
+        if len(old["texts"]):
+            manifest = {"dim": int(matrix.shape[1]), "segments": [write_segment(_dir(), old["texts"], old["metas"], matrix, new_ids(len(old["texts"])))]}
+        publish(_dir(), manifest)
+        LEGACY_INDEX_PATH.rename(LEGACY_INDEX_PATH.with_suffix(".pkl.migrated"))
+    logs.info("mini-vs", f"migrated {len(old['texts'])} chunk(s) from {LEGACY_INDEX_PATH}")
+
+def _load_index(prev=None):
+    """(index, version) of the current snapshot."""
+    metrics.inc("index_loads_total")
+    with metrics.span("index_load"):
+        for attempt in range(5):
+            version = current_version(_dir())
+            try:
+                return _open_index(read_manifest(_dir(), version), prev), version
+            except FileNotFoundError:
+                if attempt == 4:
+                    raise  # snapshot collected while we were opening it; go again with the newer one
+
+# ------------------------------------------------------------------
+# Resident indexes: loaded on first use, reused across requests and
+# reloaded only when CURRENT points at a new snapshot. An LRU keeps at most
+# RESIDENT_INDEX_MAX of them, within RESIDENT_INDEX_MB (Segment.nbytes);
+# evicting one just drops its memmaps, the next request loads it again.
+# The default index (INDEX_NAME) is never evicted once loaded.
+# Readers never take a lock on the hot path. Writers hold the index's
+# lock (threads) plus its write.lock (processes), and build on the latest snapshot.
+# ------------------------------------------------------------------
+_stores: Dict[str, Dict] = {}    # name -> {"lock", "load_lock", "depth", "generation"}, never evicted
+_stores_lock = threading.Lock()
+_lru_lock = threading.Lock()
+_resident: "OrderedDict[str, tuple]" = OrderedDict()   # name -> (index, version, nbytes), oldest first
+_evictions = 0
+
+def _store() -> Dict:
+    name = index_name()
+    st = _stores.get(name)
+    if st is None:
+        with _stores_lock:
+            st = _stores.setdefault(name, {"lock": threading.RLock(),      # writers in this process
+                                           "load_lock": threading.Lock(),  # one reload at a time
+                                           "depth": 0, "generation": 0})
+    return st
+
+def _snap():
+    """(index, version) of the current index if it is resident, else None."""
+    name = index_name()
+    with _lru_lock:
+        entry = _resident.get(name)
+        if entry is None:
+            return None
+        _resident.move_to_end(name)
+    return entry[0], entry[1]
+
+def _disk_stamp():
+    return current_version(_dir())
+
+def _set_resident(idx, stamp):
+    global _evictions
+    name = index_name()
+    nbytes = sum(seg.nbytes for seg in idx["segments"])
+    with _lru_lock:
+        _resident[name] = (idx, stamp, nbytes)
+        _resident.move_to_end(name)
+        budget = _settings.RESIDENT_INDEX_MB * 2**20
+        while (len(_resident) > max(1, _settings.RESIDENT_INDEX_MAX)
+               or sum(e[2] for e in _resident.values()) > budget):
+            # never the index just loaded, nor the default one (/ready reports it resident)
+            old = next((n for n in _resident if n not in (name, _settings.INDEX_NAME)), None)
+            if old is None:
+                break
+            del _resident[old]
+            _evictions += 1
+            logs.debug("mini-vs", f"evicted index {old!r} from memory")
+    _store()["generation"] += 1
+
+def _get_index(check_disk: bool = True):
+    """
+    Return the resident copy of the current index (loading it if needed).
+    check_disk=True reads the CURRENT pointer and reloads if another process published;
+    check_disk=False only touches the disk if nothing is resident yet.
+    """
+    snap = _snap()
+    if snap is not None and not check_disk:
+        return snap[0]
+    stamp = _disk_stamp()
+    if snap is not None and snap[1] == stamp:
+        return snap[0]
+    if (not stamp and index_name() == _settings.INDEX_NAME and not (INDEX_DIR / MANIFEST).exists()
+            and LEGACY_INDEX_PATH.exists()):
+        _migrate_legacy()
+    with _store()["load_lock"]:
+        snap = _snap()
+        if snap is not None and snap[1] == _disk_stamp():
+            return snap[0]  # another thread reloaded meanwhile
+        idx, version = _load_index(snap[0] if snap else None)
+        _set_resident(idx, version)
+        return idx
+
+@contextmanager
+def _writer():
+    """Exclusive write access to the current index directory, across threads and processes (re-entrant)."""
+    st = _store()
+    with st["lock"]:
+        if st["depth"]:
+            st["depth"] += 1
+            try:
+                yield
+            finally:
+                st["depth"] -= 1
+            return
+        with file_lock(_dir() / WRITE_LOCK):
+            st["depth"] = 1
+            try:
+                yield
+            finally:
+                st["depth"] = 0
+
+def _commit(idx):
+    """Publish `idx` as the next snapshot, make it resident and drop snapshots nobody can still be opening."""
+    version = publish(_dir(), _manifest_of(idx))
+    with _store()["load_lock"]:
+        _set_resident(idx, version)
+    collect_garbage(_dir())
+
+def _index_metrics():
+    """Gauges for /metrics: the default index plus the resident-index LRU (never loads anything)."""
+    with _lru_lock:
+        entries = list(_resident.items())
+    out = [
+        ("resident_indexes", "gauge", len(entries)),
+        ("resident_index_bytes", "gauge", sum(e[2] for _, e in entries)),
+        ("resident_index_evictions_total", "counter", _evictions),
+    ]
+    default = dict(entries).get(_settings.INDEX_NAME)
+    if default is None:
+        return out
+    idx, version, _ = default
+    return out + [
+        ("index_chunks", "gauge", idx["count"]),
+        ("index_segments", "gauge", len(idx["segments"])),
+        ("index_sources", "gauge", len(idx["sources"])),
+        ("index_version", "gauge", version or 0),
+    ]
+
+metrics.register(_index_metrics)
+
+def resident_indexes() -> List[Dict]:
+    """The LRU of loaded indexes, least recently used first (for /stats)."""
+    with _lru_lock:
+        entries = list(_resident.items())
+    return [{"name": name, "chunks": idx["count"], "version": version, "bytes": nbytes}
+            for name, (idx, version, nbytes) in entries]
+
+def index_generation(check_disk: bool = False) -> int:
+    """Bumped every time the current index is (re)loaded or written."""
+    if check_disk or _snap() is None:
+        _get_index(check_disk=True)
+    return _store()["generation"]
 
 def _cosine(a, b):
-    # a,b: lists of floats
+    # a,b: lists of floats (kept as the reference path for scripts/bench_search.py)
     dot = sum(x*y for x, y in zip(a, b))
     na = math.sqrt(sum(x*x for x in a)) or 1.0
     nb = math.sqrt(sum(y*y for y in b)) or 1.0
     return dot / (na * nb)
 
-def add_texts(texts: List[str], metadatas: List[Dict]):
+def _normalize(vecs) -> np.ndarray:
+    """
+    Turn a list of vectors into a contiguous float32 matrix with unit-length rows,
+    so cosine similarity becomes a plain dot product at query time.
+    """
+    m = np.asarray(vecs, dtype=np.float32)
+    if m.size == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    if m.ndim == 1:
+        m = m.reshape(1, -1)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(m / norms, dtype=np.float32)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row ids of the k highest scores, best first (argpartition + sort of k only)."""
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+def _rank(qvec, matrix: np.ndarray, k: int):
+    """Score one query against a normalized matrix. Returns (row ids, cosine scores)."""
+    q = _normalize([qvec])[0]
+    scores = matrix @ q
+    ids = _top_k(scores, k)
+    return ids, scores[ids]
+
+def _use_ivf() -> bool:
+    return _settings.VECTOR_INDEX.lower() == "ivf"
+
+def _storage() -> str:
+    return _settings.VECTOR_STORAGE.lower()
+
+def _attach_quant(seg: Segment, root: Path) -> Segment:
+    """Give the segment its quantized copy when VECTOR_STORAGE asks for one (encoded on first open)."""
+    seg.quant = None if _storage() == "float32" else quant.open_or_build(root, seg.name, seg.vectors, _storage())
+    return seg
+
+def _build_sidecars(root: Path, entry):
+    """IVF lists (if the segment is big enough) and the VECTOR_STORAGE copy of a freshly written segment."""
+    ivf = _use_ivf() and entry["count"] >= _settings.IVF_MIN_ROWS
+    if not ivf and _storage() == "float32":
+        return
+    vectors = np.load(root / f"{entry['name']}.vec.npy", mmap_mode="r")
+    if ivf:
+        save_ivf(ivf_path(root, entry["name"]), build_ivf(vectors, _settings.IVF_NLIST or None))
+    if _storage() != "float32":
+        quant.open_or_build(root, entry["name"], vectors, _storage())
+
+def _open_segment(entry) -> Segment:
+    """Open a freshly written segment, building its IVF lists / quantized copy first."""
+    root = _dir()
+    _build_sidecars(root, entry)
+    return _attach_quant(Segment(root, entry), root)
+
+def _filter_sources(flt: Optional[Dict]) -> Optional[List[str]]:
+    """Source names a search is restricted to, or None for no filter."""
+    if not flt:
+        return None
+    unknown = set(flt) - {"source"}
+    if unknown:
+        raise ValueError(f"unsupported filter key(s): {sorted(unknown)} (only 'source')")
+    src = flt["source"]
+    return [src] if isinstance(src, str) else list(src)
+
+def _allowed_rows(seg: Segment, sources: Optional[List[str]]) -> Optional[np.ndarray]:
+    """Live local rows matching the source filter (None = no filter, every live row)."""
+    if sources is None:
+        return None
+    rows = seg.source_rows(sources)
+    if seg.alive is not None:
+        rows = rows[seg.alive[rows]]
+    return rows
+
+def _dot(seg: Segment, q: np.ndarray, rows=None) -> np.ndarray:
+    """Scores of the segment's rows (all, an index array or a slice) against q, on the quantized copy if there is one."""
+    if seg.quant is not None:
+        return seg.quant.scores(q, rows)
+    return (seg.vectors if rows is None else seg.vectors[rows]) @ q
+
+def _rescore(seg: Segment, q: np.ndarray, rows: np.ndarray, k: int):
+    """Exact float32 scores for a few candidate rows (read from disk in row order), best k."""
+    rows = np.sort(rows)
+    scores = quant.read_rows(seg.vectors, rows, seg.vectors_file) @ q
+    top = _top_k(scores, k)
+    return rows[top], scores[top]
+
+def _score_segment(seg: Segment, q: np.ndarray, k: int, nprobe: int, rows: Optional[np.ndarray] = None,
+                   lo: int = 0, hi: Optional[int] = None):
+    """
+    (local row ids, scores) of the best k live rows in one segment; `rows` restricts scoring
+    to those rows, lo:hi to a row range (a shard's piece of the segment).
+    """
+    hi = seg.count if hi is None else hi
+    whole = lo == 0 and hi == seg.count
+    rescore = seg.quant is not None and _settings.VECTOR_RESCORE > 0
+    kk = k * _settings.VECTOR_RESCORE if rescore else k
+    if rows is None and seg.ivf is not None and _use_ivf():
+        rows = np.sort(ivf_candidates(seg.ivf, q, nprobe))
+        if seg.alive is not None:
+            rows = rows[seg.alive[rows]]
+    if rows is not None:
+        if not whole:
+            rows = rows[(rows >= lo) & (rows < hi)]
+        scores = _dot(seg, q, rows)
+        top = _top_k(scores, kk)
+        rows, scores = rows[top], scores[top]
+    else:
+        scores = _dot(seg, q, None if whole else slice(lo, hi))
+        if seg.alive is not None:
+            alive = seg.alive if whole else seg.alive[lo:hi]
+            scores[~alive] = -np.inf
+            kk = min(kk, seg.live_count if whole else int(alive.sum()))
+        top = _top_k(scores, kk)
+        rows, scores = top + lo, scores[top]
+    if rescore:
+        return _rescore(seg, q, rows, k)
+    return rows, scores
+
+def _search_shard(q: np.ndarray, k: int, nprobe: int, sources: Optional[List[str]], pieces):
+    """Top-k candidates (score, segment, row) of one shard, unsorted."""
+    cands = []
+    for seg, lo, hi in pieces:
+        allowed = _allowed_rows(seg, sources)
+        if allowed is not None and not len(allowed):
+            continue
+        rows, scores = _score_segment(seg, q, k, nprobe, allowed, lo, hi)
+        cands.extend(zip(scores.tolist(), [seg] * len(rows), rows.tolist()))
+    return cands
+
+def _shards(idx):
+    """The index cut into shards.shard_count() shards (planned once per resident snapshot)."""
+    n = shards.shard_count()
+    cached = idx.get("shards")
+    if cached is None or cached[0] != n:
+        cached = idx["shards"] = (n, shards.plan(idx["segments"], n))
+    return cached[1]
+
+def _gather_remote(idx, Q, k: int, nprobe: int, sources):
+    """Per-query candidates from the shard servers, mapped back onto this process's segments."""
+    by_name = {seg.name: seg for seg in idx["segments"]}
+    out = []
+    for cands in shards.remote_search(index_name(), Q, k, nprobe, sources):
+        known = [(score, by_name[name], row) for score, name, row in cands if name in by_name]
+        if len(known) < len(cands):
+            logs.warning("shards", "shard servers are on a different snapshot; some hits dropped", every=10)
+        out.append(known)
+    return out
+
+def _search(idx, qvec, k: int, nprobe: Optional[int] = None, sources: Optional[List[str]] = None):
+    """Top k over all segments: per-shard argpartition (in parallel, see shards.py), then merge the candidates."""
+    q = _normalize([qvec])[0]
+    nprobe = nprobe or _settings.IVF_NPROBE
+    if shards.servers():
+        cands = _gather_remote(idx, q[None, :], k, nprobe, sources)[0]
+    else:
+        cands = [c for part in shards.scatter(_search_shard, _shards(idx), q, k, nprobe, sources) for c in part]
+    cands.sort(key=lambda c: c[0], reverse=True)
+    return cands[:k]
+
+def add_texts(texts: List[str], metadatas: List[Dict]) -> List[str]:
+    """Embed and append chunks. Returns their chunk ids (for delete_ids)."""
     if len(texts) != len(metadatas):
         raise ValueError("documents and metadatas length mismatch")
-    print(f"[mini-vs] embedding {len(texts)} text(s)...", flush=True)
-    vecs = embed_texts(texts)
-    idx = _load_index()
-    idx["texts"].extend(texts)
-    idx["metas"].extend(metadatas)
-    idx["vectors"].extend(vecs)
-    _save_index(idx)
-    print(f"[mini-vs] ✅ saved. total={len(idx['texts'])}", flush=True)
-
-def similarity_search(query: str, k: int = 6):
-    idx = _load_index()
-    if not idx["texts"]:
-        print("[mini-vs] (empty index)", flush=True)
+    if not texts:
         return []
-    qvec = embed_texts([query])[0]
-    scores = [ _cosine(qvec, v) for v in idx["vectors"] ]
-    # sort by highest cosine
-    ranked = sorted(
-        zip(scores, idx["texts"], idx["metas"]),
-        key=lambda x: x[0],
-        reverse=True
-    )[:k]
+    logs.debug("mini-vs", f"embedding {len(texts)} text(s)...")
+    return add_vectors(texts, metadatas, embed_texts(texts))
+
+def add_vectors(texts: List[str], metadatas: List[Dict], vectors, ids: Optional[List[str]] = None) -> List[str]:
+    """
+    Append chunks whose embeddings are already known, as one new segment.
+    Returns chunk ids (pass `ids` to choose them, e.g. when they were assigned before embedding).
+    """
+    return _append(texts, metadatas, vectors, ids)[0]
+
+def _append(texts: List[str], metadatas: List[Dict], vectors, ids: Optional[List[str]] = None,
+            replace: Optional[List[str]] = None):
+    """
+    Write one new segment and, in the same snapshot, take the `replace` sources off
+    their live chunks (_without_sources): readers see either the old chunks of a
+    source or the new ones. Returns (chunk ids, chunks replaced).
+    """
+    from src.core.ingestion import forget_chunks  # late import: ingestion builds on this module
+
+    if not (len(texts) == len(metadatas) == len(vectors)):
+        raise ValueError("texts, metadatas and vectors length mismatch")
+    if not texts:
+        return [], 0
+    new_rows = _normalize(vectors)
+    with _writer():
+        old = _get_index()
+        if old["dim"] and old["dim"] != new_rows.shape[1]:
+            raise ValueError(f"embedding dim {new_rows.shape[1]} != index dim {old['dim']}")
+        segments, replaced, gone, detached = _without_sources(old["segments"], replace or [])
+        # only the new rows hit the disk; existing segments are reused as-is
+        ids = list(ids) if ids is not None else new_ids(len(texts))
+        seg = _open_segment(write_segment(_dir(), texts, metadatas, new_rows, ids))
+        idx = _make_index(segments + [seg], int(new_rows.shape[1]))
+        _commit(idx)
+        forget_chunks(gone, detached)
+        compact_if_needed()
+    if replaced:
+        logs.info("mini-vs", f"replaced {replaced} chunk(s) of {len(replace)} source(s). total={idx['count']}")
+    logs.debug("mini-vs", f"✅ saved. total={idx['count']}")
+    return ids, replaced
+
+def delete_ids(ids: List[str]) -> int:
+    """Tombstone chunks by id (compact() reclaims the space). Returns how many were removed."""
+    if not ids:
+        return 0
+    wanted = np.asarray(list(ids), dtype="S32")
+    with _writer():
+        old = _get_index()
+        removed, segments = 0, []
+        for seg in old["segments"]:
+            rows = seg.find(wanted)
+            if len(rows):
+                seg = seg.with_deleted(rows.tolist())
+                removed += len(rows)
+            segments.append(seg)
+        if not removed:
+            return 0
+        idx = _make_index(segments, old["dim"])
+        _commit(idx)
+    logs.info("mini-vs", f"deleted {removed} chunk(s). total={idx['count']}")
+    return removed
+
+def _merge_policy(segments) -> List[Segment]:
+    """
+    The segments to merge next, in index order (empty: nothing to do). Tiered by size,
+    so a row is rewritten about log_F(rows) times over its life, not on every merge:
+      * a segment that is more than 20% tombstones is rewritten on its own;
+      * past INDEX_MAX_SEGMENTS, the smallest segment is merged with the next smallest
+        ones (F in all, F = INDEX_MERGE_FACTOR) that are at most F times its size,
+        and at least with the second smallest.
+    """
+    dead = [s for s in segments if len(s.deleted) > 0.2 * s.count]
+    if dead:
+        return [max(dead, key=lambda s: len(s.deleted))]
+    if len(segments) <= _settings.INDEX_MAX_SEGMENTS:
+        return []
+    f = max(2, _settings.INDEX_MERGE_FACTOR)
+    by_size = sorted(segments, key=lambda s: s.live_count)
+    pick = [s for s in by_size[:f] if s.live_count <= f * max(1, by_size[0].live_count)]
+    pick = {s.name for s in (pick if len(pick) >= 2 else by_size[:2])}
+    return [s for s in segments if s.name in pick]
+
+def _merge(names: List[str]) -> bool:
+    """
+    Merge the named segments of the current index into one, in place of the first.
+    The new segment (and its IVF lists / quantized copy) is written in a staging
+    directory without the writer lock; the lock is only held to move it in and
+    publish, re-applying tombstones that landed on the inputs meanwhile. Returns
+    False, dropping the work, if the inputs are gone by then (merged or reset elsewhere).
+    """
+    root = _dir()
+    by_name = {s.name: s for s in _get_index()["segments"]}
+    if not all(n in by_name for n in names):
+        return False
+    inputs = [by_name[n] for n in names]
+    live = sum(s.live_count for s in inputs)
+    stage = staging_dir(root)
+    try:
+        with metrics.span("merge"):
+            entry, maps = merge_segments(stage, inputs) if live else (None, [])
+            if entry:
+                _build_sidecars(stage, entry)
+        with _writer():
+            cur = _get_index()
+            pos = {s.name: i for i, s in enumerate(cur["segments"])}
+            if not all(n in pos for n in names):
+                return False
+            merged = set(names)
+            segments = [s for s in cur["segments"] if s.name not in merged]
+            if entry:
+                adopt_segment(stage, root, entry["name"])
+                seg = _attach_quant(Segment(root, entry), root)
+                late, refs = [], {}
+                for old, m in zip(inputs, maps):
+                    now = cur["segments"][pos[old.name]]
+                    late += [int(m[r]) for r in set(now.deleted) - set(old.deleted)]
+                    refs.update({int(m[r]): now.refs.get(r) for r in now.refs.keys() | old.refs.keys()
+                                 if m[r] >= 0 and now.refs.get(r) != old.refs.get(r)})
+                seg = seg.with_refs(refs) if refs else seg
+                segments.insert(min(pos[n] for n in names), seg.with_deleted(late) if late else seg)
+            _commit(_make_index(segments, cur["dim"]))
+    finally:
+        shutil.rmtree(stage, ignore_errors=True)
+    metrics.inc("index_merges_total")
+    logs.info("mini-vs", f"merged {len(names)} segment(s), {live} live row(s) -> {1 if live else 0}")
+    return True
+
+def _merge_pending():
+    """Merge until the tiered policy is satisfied."""
+    while True:
+        pick = _merge_policy(_get_index()["segments"])
+        if not pick:
+            return
+        _merge([s.name for s in pick])
+
+def _merger(st: Dict):
+    """Background merge thread of one index: runs until no write asked for a check since its last pass."""
+    while True:
+        with _stores_lock:
+            if not st.pop("recheck", False):
+                st["merger"] = None
+                return
+        try:
+            _merge_pending()
+        except Exception as e:   # the next write tries again
+            logs.error("mini-vs", f"background merge failed: {type(e).__name__}: {e}", every=60)
+
+def compact():
+    """Merge all segments into one and drop deleted rows (cheaper searches, fewer open files)."""
+    while True:
+        idx = _get_index()
+        if len(idx["segments"]) <= 1 and not any(s.deleted for s in idx["segments"]):
+            return
+        if _merge([s.name for s in idx["segments"]]):
+            return
+
+def compact_if_needed(wait: bool = False):
+    """
+    Merge segments per _merge_policy. Writers call this after publishing: the merge runs
+    in a background thread (one per index, and a no-op call while it is busy), so the
+    write that triggered it doesn't wait for it. wait=True merges in the calling thread.
+    """
+    if not _merge_policy(_get_index(check_disk=False)["segments"]):
+        return
+    if wait:
+        _merge_pending()
+        return
+    st = _store()
+    with _stores_lock:
+        st["recheck"] = True
+        if st.get("merger") is not None:
+            return
+        # not a daemon: a CLI that just wrote waits for the merge instead of abandoning it
+        st["merger"] = threading.Thread(target=copy_context().run, args=(_merger, st), name=f"merge-{index_name()}")
+        st["merger"].start()
+
+def _lexical(idx, query: str, k: int, sources: Optional[List[str]] = None):
+    """BM25 top k over all segments (collection stats are summed across segments)."""
+    terms = list(dict.fromkeys(bm25.tokenize(query)))
+    segs = [s for s in idx["segments"] if s.lex is not None]
+    if not terms or not segs:
+        return []
+    hashes = [bm25.term_hash(t) for t in terms]
+    n_docs = sum(s.count for s in segs)
+    avgdl = (sum(s.lex.total_len for s in segs) / n_docs) or 1.0
+    idfs = [bm25.idf(n_docs, sum(s.lex.df(h) for s in segs)) for h in hashes]
+    cands = []
+    for seg in segs:
+        allowed = _allowed_rows(seg, sources)
+        if allowed is not None and not len(allowed):
+            continue
+        rows, scores = seg.lex.score(hashes, idfs, avgdl)
+        if allowed is not None:
+            keep = np.isin(rows, allowed, assume_unique=True)
+            rows, scores = rows[keep], scores[keep]
+        elif seg.alive is not None:
+            keep = seg.alive[rows]
+            rows, scores = rows[keep], scores[keep]
+        top = _top_k(scores, k)
+        cands.extend(zip(scores[top].tolist(), [seg] * len(top), rows[top].tolist()))
+    cands.sort(key=lambda c: c[0], reverse=True)
+    return cands[:k]
+
+def _fuse(ranked_lists, k: int):
+    """Reciprocal rank fusion: every list votes 1 / (RRF_K + rank) for its rows."""
+    fused = {}
+    for ranked in ranked_lists:
+        for rank, (_, seg, i) in enumerate(ranked, 1):
+            key = (seg.name, i)
+            entry = fused.setdefault(key, [0.0, seg, i])
+            entry[0] += 1.0 / (_settings.RRF_K + rank)
+    return sorted((tuple(e) for e in fused.values()), key=lambda c: c[0], reverse=True)[:k]
+
+def _combine(mode: str, dense, lexical, k: int, with_vectors: bool, q: Optional[np.ndarray] = None) -> List[Dict]:
+    """
+    Turn ranked (score, segment, row) lists into hit dicts (reads only the k winning docs).
+    `q` (the unit query vector) scores the fused hits that only BM25 found.
+    """
+    if mode == "hybrid":
+        hits = _fuse([dense, lexical], k)
+    else:
+        hits = (dense or lexical)[:k]
+    cos = {(seg.name, i): s for s, seg, i in dense}
+    if q is not None:
+        for _, seg, i in hits:
+            if (seg.name, i) not in cos:
+                cos[(seg.name, i)] = float(quant.read_rows(seg.vectors, np.asarray([i]), seg.vectors_file)[0] @ q)
+    lex = {(seg.name, i): s for s, seg, i in lexical}
     out = []
-    for s, text, meta in ranked:
-        out.append({"text": text, "meta": meta, "score": float(1.0 - s)})  # lower is better if you like; keep as-is
-    print(f"[mini-vs] retrieved {len(out)} result(s)", flush=True)
+    for s, seg, i in hits:
+        d = seg.doc(i)
+        cid = seg.ids[i].decode() if seg.ids is not None else None
+        key = (seg.name, i)
+        meta, refs = d["meta"], seg.refs.get(i)
+        if refs:   # a chunk several files share: shown as the first, "paths" lists them all
+            meta = {**meta, "source": refs[0][0], "path": refs[0][1], "paths": [p for _, p in refs]}
+        hit = {"id": cid, "text": d["text"], "meta": meta,
+               "score": float(1.0 - cos[key]) if key in cos else None}  # lower is better if you like; keep as-is
+        if key in lex:
+            hit["bm25"] = float(lex[key])
+        if mode == "hybrid":
+            hit["rrf"] = float(s)
+        if with_vectors:
+            hit["vector"] = np.asarray(seg.vectors[i], dtype=np.float32)
+            hit["pos"] = (seg.name, i)
+        out.append(hit)
     return out
-# --- helpers for UI ---
 
-def index_count() -> int:
-    """Return number of stored chunks."""
-    idx = _load_index()
-    return len(idx["texts"])
+def similarity_search(query: str, k: int = 6, nprobe: Optional[int] = None, qvec=None, mode: Optional[str] = None,
+                      filter: Optional[Dict] = None, with_vectors: bool = False):
+    """
+    Top-k chunks for a query. `mode` ("vector" / "lexical" / "hybrid") overrides
+    RETRIEVAL_MODE; lexical needs no embedding call at all.
+    `filter={"source": name or [names]}` scores only the rows of those sources.
+    `with_vectors=True` adds each hit's stored unit vector ("vector") and position
+    ("pos" = (segment, row); consecutive rows of a source are consecutive chunks).
+    With VECTOR_INDEX=ivf, `nprobe` overrides IVF_NPROBE for this call (higher = better recall, slower).
+    Pass `qvec` if the caller already embedded the query.
+    Each hit has "score" (1 - cosine; None in lexical mode), "bm25" (lexical/hybrid) and, for hybrid, "rrf".
+    """
+    idx = _get_index()
+    sources = _filter_sources(filter)
+    if sources is not None and not any(idx["sources"].get(n) for n in sources):
+        return []
+    if not idx["count"]:
+        logs.debug("mini-vs", "(empty index)")
+        return []
+    mode = (mode or _settings.RETRIEVAL_MODE).lower()
+    dense, lexical = [], []
+    depth = k if mode != "hybrid" else max(4 * k, 20)  # fuse over a deeper pool than we return
+    if mode != "lexical" and qvec is None:
+        qvec = embed_texts([query])[0]
+    q = _normalize([qvec])[0] if mode != "lexical" else None
+    with metrics.span("search"):
+        if mode != "lexical":
+            dense = _search(idx, q, depth, nprobe, sources)
+        if mode != "vector":
+            lexical = _lexical(idx, query, depth, sources)
+        out = _combine(mode, dense, lexical, k, with_vectors, q)
+    logs.debug("mini-vs", f"retrieved {len(out)} result(s) ({mode})")
+    return out
+
+def _search_many_shard(Q: np.ndarray, k: int, pieces):
+    """Per-query top-k candidates of one shard for a block of unit queries (rows of Q)."""
+    per_query = [[] for _ in range(len(Q))]
+    for seg, lo, hi in pieces:
+        n = hi - lo
+        whole = n == seg.count
+        alive = None if seg.alive is None else (seg.alive if whole else seg.alive[lo:hi])
+        live = n if alive is None else (seg.live_count if whole else int(alive.sum()))
+        kk = min(k, live)
+        if kk <= 0:
+            continue
+        rescore = seg.quant is not None and _settings.VECTOR_RESCORE > 0
+        kc = min(kk * _settings.VECTOR_RESCORE, live) if rescore else kk
+        block = max(1, min(len(Q), (1 << 25) // max(n, 1)))  # <= 128 MB of float32 scores
+        for b0 in range(0, len(Q), block):
+            scores = _dot(seg, Q[b0:b0 + block].T, None if whole else slice(lo, hi))   # (n, block)
+            if alive is not None:
+                scores[~alive] = -np.inf
+            if kc < n:
+                top = np.argpartition(-scores, kc - 1, axis=0)[:kc]
+            else:
+                top = np.broadcast_to(np.arange(n)[:, None], scores.shape)
+            top_scores = np.take_along_axis(scores, top, axis=0)
+            for j in range(top.shape[1]):
+                if rescore:
+                    rows, exact = _rescore(seg, Q[b0 + j], top[:, j] + lo, kk)
+                    per_query[b0 + j].extend(zip(exact.tolist(), [seg] * len(rows), rows.tolist()))
+                else:
+                    per_query[b0 + j].extend(zip(top_scores[:, j].tolist(), [seg] * kk, (top[:, j] + lo).tolist()))
+    return per_query
+
+def shard_search(pieces, Q: np.ndarray, k: int, nprobe: int, sources: Optional[List[str]] = None):
+    """One shard's candidates for each row of Q (what a shard server runs, see shards.serve)."""
+    if len(Q) == 1:
+        return [_search_shard(Q[0], k, nprobe, sources, pieces)]
+    return _search_many_shard(Q, k, pieces)
+
+def _search_many(idx, qvecs, k: int):
+    """
+    Exact top k for many queries at once: one (rows x queries) matrix product per
+    segment piece (in blocks of queries, to bound memory), per shard, then per-query merge.
+    """
+    Q = _normalize(qvecs)
+    if shards.servers():
+        per_query = _gather_remote(idx, Q, k, _settings.IVF_NPROBE, None)
+    else:
+        per_query = [[] for _ in range(len(Q))]
+        for part in shards.scatter(_search_many_shard, _shards(idx), Q, k):
+            for cands, more in zip(per_query, part):
+                cands.extend(more)
+    out = []
+    for cands in per_query:
+        cands.sort(key=lambda c: c[0], reverse=True)
+        out.append(cands[:k])
+    return out
+
+def batch_search(queries: List[str], k: int = 6, qvecs=None, mode: Optional[str] = None,
+                 with_vectors: bool = False) -> List[List[Dict]]:
+    """
+    similarity_search for many queries: embeddings in batches (pass `qvecs` if known)
+    and vector scores from matrix-matrix products. One list of hits per query.
+    """
+    if not queries:
+        return []
+    idx = _get_index()
+    if not idx["count"]:
+        return [[] for _ in queries]
+    mode = (mode or _settings.RETRIEVAL_MODE).lower()
+    depth = k if mode != "hybrid" else max(4 * k, 20)
+    dense = [[] for _ in queries]
+    if mode != "lexical" and qvecs is None:
+        qvecs = embed_texts(list(queries))
+    Q = _normalize(qvecs) if mode != "lexical" else [None] * len(queries)
+    out = []
+    with metrics.span("batch_search"):
+        if mode != "lexical":
+            dense = _search_many(idx, Q, depth)
+        for query, d, q in zip(queries, dense, Q):
+            lexical = _lexical(idx, query, depth) if mode != "vector" else []
+            out.append(_combine(mode, d, lexical, k, with_vectors, q))
+    logs.debug("mini-vs", f"batch retrieved {len(queries)} quer(ies) ({mode})")
+    return out
+
+def warm_index() -> Dict:
+    """
+    Load the index and run one throwaway vector + lexical search, so the memmapped
+    vectors and BM25 postings are paged in before the first real query.
+    Returns {"chunks", "segments", "version", "seconds"}.
+    """
+    t0 = time.perf_counter()
+    idx = _get_index()
+    if idx["count"]:
+        _search(idx, np.full(idx["dim"], 1.0 / math.sqrt(idx["dim"]), dtype=np.float32), 1)
+        _lexical(idx, "warm up", 1)
+    snap = _snap()
+    return {"chunks": idx["count"], "segments": len(idx["segments"]),
+            "version": snap[1] if snap else None, "seconds": time.perf_counter() - t0}
+
+def index_resident() -> bool:
+    """True while this process holds the current index loaded (no disk access)."""
+    return index_name() in _resident
 
-def reset_index():
-    """Delete the mini index file (fresh start)."""
-    if INDEX_PATH.exists():
-        INDEX_PATH.unlink()
 # --- helpers for UI & summaries ---
-from collections import Counter
 from src.core.chunking import simple_chunk  # reuse your chunker
 
 def index_count() -> int:
-    """Total stored chunks."""
-    idx = _load_index()
-    return len(idx["texts"])
+    """Total stored chunks (served from the resident index, no disk access)."""
+    return _get_index(check_disk=False)["count"]
 
 def reset_index():
-    """Delete the mini index file (fresh start)."""
-    if INDEX_PATH.exists():
-        INDEX_PATH.unlink()
+    """Drop every segment (fresh start)."""
+    with _writer():
+        _commit(_empty_index())
+        # the file manifest of src/core/ingestion.py describes chunks that no longer exist,
+        # as do the dedup fingerprints/refs (src/core/dedup.py)
+        # (and uploads.json, src/core/jobs.py, records uploads that are now gone)
+        for name in ("files.json", "forgotten.txt", "uploads.json", "dedup.sqlite", "dedup.sqlite-wal", "dedup.sqlite-shm"):
+            (_dir() / name).unlink(missing_ok=True)
+        if index_name() == _settings.INDEX_NAME and LEGACY_INDEX_PATH.exists():
+            LEGACY_INDEX_PATH.unlink()
 
 def index_summary() -> dict:
-    """Summary: total chunks + counts per source."""
-    idx = _load_index()
-    counts = Counter([m.get("source", "?") for m in idx["metas"]])
-    return {"total_chunks": len(idx["texts"]), "by_source": dict(counts)}
+    """Summary: total chunks + counts per source (kept up to date on every write, no scan)."""
+    idx = _get_index(check_disk=False)
+    return {"total_chunks": idx["count"], "by_source": dict(idx["sources"])}
+
+def source_count(name: str) -> int:
+    """Live chunks of one source."""
+    return _get_index(check_disk=False)["sources"].get(name, 0)
+
+def source_ids(name: str) -> List[str]:
+    """Chunk ids of one source (from the per-segment source postings)."""
+    idx = _get_index()
+    out = []
+    for seg in idx["segments"]:
+        rows = _allowed_rows(seg, [name])
+        if len(rows) and seg.ids is not None:
+            out.extend(i.decode() for i in seg.ids[rows].tolist())
+    return out
+
+def _without_sources(segments, names: List[str]):
+    """
+    Take the sources `names` off their live chunks: chunks only they use are tombstoned,
+    chunks shared with other sources (deduplicated, see set_sources) just lose them.
+    Returns (segments, chunks affected, tombstoned ids, [(detached id, path)]).
+    """
+    out, affected, gone, detached = [], 0, [], []
+    wanted = set(names)
+    for seg in segments:
+        rows = _allowed_rows(seg, names) if names else None
+        if rows is None or not len(rows):
+            out.append(seg)
+            continue
+        drop, changes = [], {}
+        for r in rows.tolist():
+            refs = seg.refs.get(r)
+            keep = [x for x in refs if x[0] not in wanted] if refs else []
+            if keep:
+                changes[r] = keep
+                if seg.ids is not None:
+                    detached += [(seg.ids[r].decode(), p) for src, p in refs if src in wanted]
+            else:
+                drop.append(r)
+        if seg.ids is not None:
+            gone += [seg.ids[r].decode() for r in drop]
+        if changes:
+            seg = seg.with_refs(changes)
+        out.append(seg.with_deleted(drop) if drop else seg)
+        affected += len(rows)
+    return out, affected, gone, detached
+
+def delete_source(name: str) -> int:
+    """
+    Take one source out of the index: its chunks are tombstoned, except those other
+    sources share (deduplicated chunks), which only lose it. Returns how many chunks it had.
+    Files synced from a folder that used those chunks are dropped from the
+    sync manifest by the next sync, which re-adds whatever is still on disk.
+    """
+    from src.core.ingestion import forget_chunks  # late import: ingestion builds on this module
+
+    with _writer():
+        old = _get_index()
+        segments, removed, gone, detached = _without_sources(old["segments"], [name])
+        if not removed:
+            return 0
+        idx = _make_index(segments, old["dim"])
+        _commit(idx)
+        forget_chunks(gone, detached)
+        compact_if_needed()
+    logs.info("mini-vs", f"deleted source {name!r}: {len(gone)} chunk(s) removed, "
+                         f"{removed - len(gone)} shared one(s) kept. total={idx['count']}")
+    return removed
+
+def set_sources(refs: Dict[str, List[Dict]]) -> int:
+    """
+    Set the sources of stored chunks by id: {chunk id: [{"source", "path"}, ...]}, the
+    first being the one hits show. Ingestion calls this for deduplicated chunks, which
+    belong to every file that has them: source filters, index_summary() and
+    delete_source() then see all of those files. Returns how many chunks changed.
+    """
+    refs = {cid: lst for cid, lst in refs.items() if lst}
+    if not refs:
+        return 0
+    wanted = np.asarray(list(refs), dtype="S32")
+    with _writer():
+        old = _get_index()
+        changed, segments = 0, []
+        for seg in old["segments"]:
+            changes = {}
+            for r in seg.find(wanted).tolist():
+                lst = [[x["source"], x["path"]] for x in refs[seg.ids[r].decode()]]
+                meta = seg.doc(r)["meta"]
+                if len(lst) == 1 and lst[0] == [meta.get("source", "?"), meta.get("path")]:
+                    lst = None   # just the file it was stored for: no refs needed
+                if lst != seg.refs.get(r):
+                    changes[r] = lst
+            if changes:
+                seg = seg.with_refs(changes)
+                changed += len(changes)
+            segments.append(seg)
+        if changed:
+            _commit(_make_index(segments, old["dim"]))
+    return changed
+
+def upsert_texts(texts: List[str], metadatas: List[Dict]) -> Dict:
+    """
+    Add chunks, replacing whatever the index already holds for their sources
+    (no full rebuild). Embeds first, then swaps old for new under the write lock.
+    Returns {"added", "replaced"}.
+    """
+    if len(texts) != len(metadatas):
+        raise ValueError("documents and metadatas length mismatch")
+    if not texts:
+        return {"added": 0, "replaced": 0}
+    # embed before taking the lock: searches and other writers keep running meanwhile
+    return upsert_vectors(texts, metadatas, embed_texts(texts))
+
+def upsert_vectors(texts: List[str], metadatas: List[Dict], vectors) -> Dict:
+    """upsert_texts for chunks whose embeddings are already known. Returns {"added", "replaced"}."""
+    names = list(dict.fromkeys(m["source"] for m in metadatas if m.get("source")))
+    ids, replaced = _append(texts, metadatas, vectors, replace=names)
+    return {"added": len(ids), "replaced": replaced}
 
 def add_document_text(name: str, text: str, chunk_size: int = 800, overlap: int = 120) -> int:
-    """Chunk a raw text and add to index. Returns number of chunks added."""
+    """Chunk a raw text and add to index, replacing an earlier upload of the same name. Returns chunks added."""
     chunks = simple_chunk(text, chunk_size=chunk_size, overlap=overlap)
     metas = [{"source": name, "path": f"uploaded://{name}"} for _ in chunks]
-    add_texts(chunks, metas)
-    return len(chunks)
+    return upsert_texts(chunks, metas)["added"]
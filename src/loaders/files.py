@@ -1,5 +1,11 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator
+import hashlib, time
+
+from src.core.chunking import simple_chunk
+from src.core.dedup import fingerprints
+
+SUPPORTED = {".txt", ".pdf"}
 
 def load_paths(root: Path) -> List[Dict]:
     """
@@ -12,3 +18,43 @@ def load_paths(root: Path) -> List[Dict]:
             text = p.read_text(encoding="utf-8", errors="ignore")
             docs.append({"text": text, "meta": {"source": p.name, "path": str(p)}})
     return docs
+
+def discover(root: Path) -> Iterator[Path]:
+    """All ingestible files (.txt / .pdf) under 'root', in a stable order."""
+    for p in sorted(root.rglob("*")):
+        if p.is_file() and p.suffix.lower() in SUPPORTED:
+            yield p
+
+def extract_text(path: Path) -> str:
+    """Plain text of a .txt or .pdf file."""
+    if path.suffix.lower() == ".pdf":
+        from pypdf import PdfReader
+        with open(path, "rb") as f:
+            pdf = PdfReader(f)
+            return "\n\n".join(pg.extract_text() or "" for pg in pdf.pages)
+    return path.read_text(encoding="utf-8", errors="ignore")
+
+def extract_bytes(name: str, data: bytes) -> str:
+    """Plain text of an uploaded .txt or .pdf (by file name), straight from memory."""
+    if name.lower().endswith(".pdf"):
+        import io
+        from pypdf import PdfReader
+        pdf = PdfReader(io.BytesIO(data))
+        return "\n\n".join(pg.extract_text() or "" for pg in pdf.pages)
+    return data.decode("utf-8", errors="ignore")
+
+def extract_and_chunk(path: str, chunk_size: int, overlap: int, dedup: bool = False) -> Dict:
+    """
+    Process-pool worker for src/core/ingestion.py: hash, extract and chunk one file
+    (and fingerprint the chunks for src/core/dedup.py when `dedup` is set).
+    Returns {"path", "sha256", "chunks", "seconds"} (+ "hashes", "sigs", "tokens").
+    """
+    t0 = time.perf_counter()
+    p = Path(path)
+    digest = hashlib.sha256(p.read_bytes()).hexdigest()
+    chunks = simple_chunk(extract_text(p), chunk_size, overlap)
+    out = {"path": path, "sha256": digest, "chunks": chunks}
+    if dedup:
+        out["hashes"], out["sigs"], out["tokens"] = fingerprints(chunks)
+    out["seconds"] = time.perf_counter() - t0
+    return out
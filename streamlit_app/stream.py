@@ -6,19 +6,20 @@ ROOT = Path(__file__).resolve().parents[1]  # -> C:\Users\dell\rag-support-bot
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))  # so 'src' is importable
 
-from src.core.history import load_history, append_message, clear_history, export_path
-from src.core.rag import answer_query   # <<< NEW: use RAG directly
+from src.core.history import (
+    load_recent, load_page, append_message, clear_history, export_path, import_legacy, legacy_session,
+)
+from src.core.rag import stream_answer   # <<< NEW: use RAG directly (streaming)
 
 import streamlit as st
 import requests  # still used for optional health checks if you want
 import os
 from pathlib import Path
-import io
+import uuid
 from typing import List
-from pypdf import PdfReader
-from src.core.vectordb import (
-    add_document_text, index_count, reset_index, index_summary
-)
+from src.core.vectordb import reset_index, index_summary, index_generation, delete_source, index_dir
+from src.core.ingestion import sync_folder
+from src.core.jobs import submit_upload, list_jobs, active_jobs
 
     # If you still want to keep API_URL for debugging / future use:
 API_URL = os.getenv("API_URL", "http://localhost:8000/chat")
@@ -30,10 +31,15 @@ st.set_page_config(page_title="LEAH Foundation", page_icon="🤖", layout="cente
 st.title("🤖 LEAH Foundation")
 st.caption("Ask questions about your LEAH")
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def _summary(generation: int) -> dict:
+    """index_summary() of the resident index, recomputed only when the index changes."""
+    return index_summary()
+
 # Small status line
-index_exists = Path(".miniindex.pkl").exists()
+index_exists = (index_dir() / "CURRENT").exists() or (index_dir() / "manifest.json").exists()
 st.sidebar.header("Status")
-st.sidebar.write("Index file:", "✅ found" if index_exists else "❌ missing (.miniindex.pkl)")
+st.sidebar.write("Index:", "✅ found" if index_exists else f"❌ missing ({index_dir()}/)")
 st.sidebar.write("API endpoint (unused by UI for answers now):", API_URL)
 # ---- Admin unlock UI ----
 st.sidebar.markdown("---")
@@ -49,13 +55,27 @@ else:
     admin_mode = True
 
 
-# Chat history in session (persisted)
+# Chat session: the id lives in the URL (?sid=...), so a reload keeps the conversation
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.session_id
+    import_legacy()   # the pre-SQLite history, once, into its own session (admin export only)
+session_id = st.session_state.session_id
+
+def _as_ui(m):
+    return {"role": m["role"], "content": m["content"], "citations": m.get("citations", [])}
+
+# Chat history in session (persisted): only the tail is read, older pages on demand
 if "messages" not in st.session_state:
-    stored = load_history()
-    st.session_state.messages = [
-        {"role": m["role"], "content": m["content"], "citations": m.get("citations", [])}
-        for m in stored
-    ]
+    stored = load_recent(session_id)
+    st.session_state.messages = [_as_ui(m) for m in stored]
+    st.session_state.older_cursor = stored[0]["id"] if stored else None
+
+if st.session_state.older_cursor is not None and st.button("Show earlier messages"):
+    page, st.session_state.older_cursor = load_page(session_id, before_id=st.session_state.older_cursor)
+    st.session_state.messages = [_as_ui(m) for m in page] + st.session_state.messages
+    if not page:
+        st.session_state.older_cursor = None
 
 # Render history
 for m in st.session_state.messages:
@@ -78,51 +98,60 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
     # persist user message to disk
-    append_message("user", prompt)
+    append_message("user", prompt, session_id=session_id)
 
-    # call the local RAG pipeline directly (NO HTTP)
+    # call the local RAG pipeline directly (NO HTTP), rendering tokens as they arrive
     with st.chat_message("assistant"):
-        with st.spinner("Thinking…"):
-            try:
-                result = answer_query(prompt, top_k=4)
-                answer = result.get("answer", "No answer.")
-                citations = result.get("citations", [])
-            except Exception as e:
-                answer = f"Error running RAG: {e}"
-                citations = []
+        citations = []
 
+        def _tokens():
+            for ev in stream_answer(prompt, top_k=4):
+                if ev["type"] == "token":
+                    yield ev["text"]
+                elif ev["type"] == "error":
+                    yield ev["message"]
+                elif ev["type"] == "citations":
+                    citations.extend(ev["citations"])
+
+        try:
+            answer = st.write_stream(_tokens()) or "No answer."
+        except Exception as e:
+            answer = f"Error running RAG: {e}"
+            citations = []
             st.markdown(answer)
-            if citations:
-                with st.expander("Sources"):
-                    for c in citations:
-                        st.write(
-                            f"[{c['index']}] {c.get('source')}  \n"
-                            f"`{c.get('path')}`  \n(score: {c.get('score')})"
-                        )
-
-            # persist assistant message
-            st.session_state.messages.append(
-                {
-                    "role": "assistant",
-                    "content": answer,
-                    "citations": citations,
-                }
-            )
-            append_message("assistant", answer, citations)
+        if citations:
+            with st.expander("Sources"):
+                for c in citations:
+                    st.write(
+                        f"[{c['index']}] {c.get('source')}  \n"
+                        f"`{c.get('path')}`  \n(score: {c.get('score')})"
+                    )
+
+        # persist assistant message
+        st.session_state.messages.append(
+            {
+                "role": "assistant",
+                "content": answer,
+                "citations": citations,
+            }
+        )
+        append_message("assistant", answer, citations, session_id=session_id)
 
 # Sidebar controls – history
 st.sidebar.markdown("---")
 with st.sidebar.expander("Conversation history"):
-    try:
-        with open(export_path(), "rb") as f:
-            st.download_button("⬇️ Download history (.jsonl)", f, file_name="chat_history.jsonl")
-    except Exception:
-        st.caption("No history yet.")
+    if st.button("Prepare download"):
+        try:
+            with open(export_path(session_id), "rb") as f:
+                st.download_button("⬇️ Download history (.jsonl)", f, file_name="chat_history.jsonl")
+        except Exception:
+            st.caption("No history yet.")
 
     confirm = st.checkbox("I understand this will erase the conversation")
     if st.button("Clear chat & history", disabled=not confirm):
         st.session_state.messages = []
-        clear_history()
+        st.session_state.older_cursor = None
+        clear_history(session_id)
         st.sidebar.warning("History cleared.")
         st.rerun()
 
@@ -130,13 +159,17 @@ with st.sidebar.expander("Conversation history"):
 if admin_mode:
     st.sidebar.markdown("### Upload & Ingest")
 
-    def _read_file_bytes_to_text(uploaded_file) -> str:
-        """Return full plain text for txt/pdf uploads."""
-        if uploaded_file.type == "text/plain" or uploaded_file.name.lower().endswith(".txt"):
-            return uploaded_file.read().decode("utf-8", errors="ignore")
-        pdf = PdfReader(io.BytesIO(uploaded_file.read()))
-        pages = [p.extract_text() or "" for p in pdf.pages]
-        return "\n\n".join(pages)
+    # Uploads become background jobs keyed by content hash (src/core/jobs.py): a rerun
+    # with the file still selected, or the same file uploaded twice, is not re-embedded.
+    if "submitted_uploads" not in st.session_state:
+        st.session_state.submitted_uploads = set()
+
+    def _submit(files):
+        for uf in files:
+            if uf.file_id in st.session_state.submitted_uploads:
+                continue  # same widget value as last rerun: nothing to do, not even hashing
+            submit_upload(uf.name, uf.getvalue())
+            st.session_state.submitted_uploads.add(uf.file_id)
 
     # A) Single-file upload
     uploaded = st.sidebar.file_uploader(
@@ -144,15 +177,8 @@ if admin_mode:
         type=["txt", "pdf"],
         accept_multiple_files=False,
     )
-
     if uploaded:
-        try:
-            text = _read_file_bytes_to_text(uploaded)
-            n = add_document_text(uploaded.name, text, chunk_size=800, overlap=120)
-            st.sidebar.success(f"Ingested {n} chunks from {uploaded.name}")
-            st.sidebar.write(f"Index size: **{index_count()}** chunks")
-        except Exception as e:
-            st.sidebar.error(f"Ingest failed: {e}")
+        _submit([uploaded])
 
     # B) Multi-file upload
     st.sidebar.markdown("#### Multi-file upload")
@@ -161,50 +187,60 @@ if admin_mode:
         type=["txt", "pdf"],
         accept_multiple_files=True,
     )
-
     if multi_files:
-        total = 0
-        prog = st.sidebar.progress(0.0, text="Ingesting…")
-        for i, uf in enumerate(multi_files, 1):
-            try:
-                text = _read_file_bytes_to_text(uf)
-                total += add_document_text(uf.name, text, chunk_size=800, overlap=120)
-            except Exception as e:
-                st.sidebar.error(f"{uf.name}: {e}")
-            prog.progress(i / max(len(multi_files), 1))
-        prog.empty()
-        st.sidebar.success(f"Added {total} chunks from {len(multi_files)} file(s).")
-        st.sidebar.write(f"Index size: **{index_count()}** chunks")
+        _submit(multi_files)
+
+    # Job progress, polled once a second without rerunning the whole page
+    @st.fragment(run_every=1.0)
+    def _jobs_panel():
+        jobs = list_jobs(limit=10)
+        if not jobs:
+            return
+        st.markdown("#### Ingestion jobs")
+        for j in jobs:
+            if j["status"] in ("queued", "running"):
+                st.progress(j["progress"], text=f"{j['name']}: {j['status']} ({j['done_chunks']}/{j['chunks'] or '?'} chunks)")
+            elif j["status"] == "done":
+                st.caption(f"✅ {j['name']}: {j['chunks']} chunks" + (f" (replaced {j['replaced']})" if j["replaced"] else ""))
+            elif j["status"] == "skipped":
+                st.caption(f"↩️ {j['name']}: already indexed" + (f" — {j['error']}" if j["error"] else ""))
+            else:
+                st.caption(f"❌ {j['name']}: {j['error']}")
+        # a job finished since the last poll: refresh the rest of the page (index size, sources)
+        busy = active_jobs()
+        if st.session_state.get("jobs_busy", 0) and not busy:
+            st.session_state.jobs_busy = 0
+            st.rerun()
+        st.session_state.jobs_busy = busy
+
+    with st.sidebar:
+        _jobs_panel()
 
     st.sidebar.markdown("---")
 
-    # C) Rebuild index from folder (data/raw)
-    st.sidebar.markdown("#### Rebuild from folder")
+    # C) Sync index with folder (data/raw): only new/changed files are embedded
+    st.sidebar.markdown("#### Sync from folder")
     data_dir = Path("data/raw")
     st.sidebar.caption(f"Folder: `{data_dir.as_posix()}`")
-    if st.sidebar.button("Rebuild index from data/raw (danger)"):
+    full_rebuild = st.sidebar.checkbox("Full rebuild (wipes the index first, incl. uploads)")
+    if st.sidebar.button("Sync index with data/raw" + (" (danger)" if full_rebuild else "")):
         try:
-            reset_index()
-            added = 0
-            files = [p for p in data_dir.glob("**/*") if p.suffix.lower() in {".txt", ".pdf"}]
-            for p in files:
-                if p.suffix.lower() == ".txt":
-                    text = p.read_text(encoding="utf-8", errors="ignore")
-                else:
-                    pdf = PdfReader(p.open("rb"))
-                    pages = [pg.extract_text() or "" for pg in pdf.pages]
-                    text = "\n\n".join(pages)
-                added += add_document_text(p.name, text, chunk_size=800, overlap=120)
-            st.sidebar.success(f"Rebuilt index: {added} chunks from {len(files)} file(s).")
-            st.sidebar.write(f"Index size: **{index_count()}** chunks")
+            if full_rebuild:
+                reset_index()
+            r = sync_folder(data_dir)
+            st.sidebar.success(
+                f"Synced: {r['added']} new, {r['changed']} changed, {r['removed']} removed, "
+                f"{r['unchanged']} unchanged file(s) — +{r['chunks_added']} / -{r['chunks_deleted']} chunks."
+            )
+            st.sidebar.write(f"Index size: **{_summary(index_generation())['total_chunks']}** chunks")
         except Exception as e:
-            st.sidebar.error(f"Rebuild failed: {e}")
+            st.sidebar.error(f"Sync failed: {e}")
 
     st.sidebar.markdown("---")
 
     # D) Show what's indexed
+    summ = _summary(index_generation())
     if st.sidebar.button("Show indexed files"):
-        summ = index_summary()
         st.sidebar.write(f"**Total chunks:** {summ['total_chunks']}")
         if summ["by_source"]:
             st.sidebar.write("**By source:**")
@@ -213,3 +249,23 @@ if admin_mode:
         else:
             st.sidebar.info("No documents indexed yet.")
 
+    # E) Remove one source (no rebuild; re-uploading a file already replaces its chunks)
+    by_source = summ["by_source"]
+    if by_source:
+        victim = st.sidebar.selectbox("Remove a source", sorted(by_source))
+        if st.sidebar.button(f"Delete {victim} ({by_source[victim]} chunks)"):
+            try:
+                n = delete_source(victim)
+                st.sidebar.success(f"Deleted {n} chunks from {victim}.")
+                st.sidebar.write(f"Index size: **{_summary(index_generation())['total_chunks']}** chunks")
+            except Exception as e:
+                st.sidebar.error(f"Delete failed: {e}")
+
+    # F) Chats from before per-session history: imported once into a session of their own
+    legacy = legacy_session()
+    if legacy:
+        st.sidebar.markdown("---")
+        if st.sidebar.button("Prepare legacy history export"):
+            with open(export_path(legacy), "rb") as f:
+                st.sidebar.download_button("⬇️ Download legacy history (.jsonl)", f,
+                                           file_name="legacy_chat_history.jsonl")
@@ -0,0 +1,35 @@
+"""
+Shared fixtures. Tests run on the local fake Gemini (scripts/fake_gemini.py), each in
+its own temporary directory: the index (.miniindex/), caches and history live there.
+"""
+import os
+
+os.environ.setdefault("EMBED_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("ANSWER_CACHE_MAX_ENTRIES", "0")
+
+import pytest
+
+from scripts import fake_gemini
+
+
+@pytest.fixture(autouse=True)
+def fake_api():
+    fake_gemini.install(latency_ms=0, per_item_ms=0)
+    fake_gemini.install_model(0)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """An empty default index in a fresh working directory; returns the vectordb module."""
+    from src.core import vectordb
+
+    monkeypatch.chdir(tmp_path)
+    vectordb._resident.clear()
+    vectordb._stores.clear()
+    yield vectordb
+    for st in list(vectordb._stores.values()):
+        t = st.get("merger")
+        if t is not None:
+            t.join()
+    vectordb._resident.clear()
+    vectordb._stores.clear()
@@ -0,0 +1,37 @@
+import numpy as np
+
+from src.core.context import pack_context
+
+
+def _hit(i, vec, **extra):
+    v = np.asarray(vec, dtype=np.float32)
+    return {"id": f"c{i}", "text": f"chunk {i}", "meta": {"source": f"doc{i}.txt"},
+            "score": None, "vector": v / np.linalg.norm(v), "pos": (f"seg{i}", 0), **extra}
+
+
+def test_hybrid_keeps_the_top_fused_hit_whatever_its_cosine():
+    q = np.array([1.0, 0.0, 0.0])
+    # BM25 put the exact-code match first; its vector is far from the query's
+    code = _hit(3, [0.0, 0.0, 1.0], rrf=2 / 61, bm25=7.5)
+    others = [_hit(i, [1.0, 0.05 * i, 0.0], rrf=1 / (62 + i)) for i in range(6)]
+    blocks, _ = pack_context(q, [code] + others, top_k=2)
+    assert blocks[0]["id"] == "c3"
+
+
+def test_vector_mode_ranks_by_cosine():
+    q = np.array([1.0, 0.0, 0.0])
+    hits = [_hit(0, [0.2, 1.0, 0.0]), _hit(1, [1.0, 0.0, 0.1])]
+    blocks, _ = pack_context(q, hits, top_k=1)
+    assert [b["id"] for b in blocks] == ["c1"]
+
+
+def test_exact_code_match_survives_packing(index):
+    from src.core.rag import answer_query
+
+    texts = [f"Refund policy part {i}: refunds are processed within {i + 3} business days." for i in range(12)]
+    texts[3] = "The SKU-3 kit is refunded only unopened."
+    index.add_texts(texts, [{"source": f"doc{i}.txt", "path": f"raw/doc{i}.txt"} for i in range(12)])
+
+    assert index.similarity_search("SKU-3", k=4)[0]["meta"]["source"] == "doc3.txt"
+    result = answer_query("SKU-3", top_k=2)
+    assert "doc3.txt" in [c["source"] for c in result["citations"]]
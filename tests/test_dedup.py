@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import numpy as np
+
+from src.core.dedup import DedupIndex, fingerprints
+
+BASE = ("Every product comes with a warranty. The warranty is {} years from the date of purchase "
+        "and covers manufacturing defects, faulty parts and labour at any authorised service centre, "
+        "in every country we sell in. Keep the receipt: it is the proof of purchase the service "
+        "centre asks for, together with the serial number printed under the device.")
+
+
+def _fp(text):
+    hashes, sigs, toks = fingerprints([text])
+    return hashes[0], sigs[0], toks[0]
+
+
+def _register(d, cid, text):
+    d.register(cid, *_fp(text))
+    d.commit([cid])
+
+
+def test_one_fact_apart_is_not_a_duplicate(tmp_path):
+    a, b = BASE.format(2), BASE.format(5)
+    assert np.mean(_fp(a)[1] == _fp(b)[1]) >= 0.9   # MinHash alone would merge them
+    for near in (False, True):
+        d = DedupIndex(tmp_path / f"dedup-{near}.sqlite", threshold=0.9, near=near)
+        _register(d, "c1", a)
+        assert d.find(*_fp(b)) == (None, "")
+        d.close()
+
+
+def test_exact_and_near_duplicates(tmp_path):
+    d = DedupIndex(tmp_path / "dedup.sqlite", threshold=0.98, near=True)
+    _register(d, "c1", BASE.format(2))
+    assert d.find(*_fp("  " + BASE.format(2).upper())) == ("c1", "exact")
+    assert d.find(*_fp(BASE.format(2).replace(".", "!").replace(",", ";"))) == ("c1", "near")
+    d.close()
+    off = DedupIndex(tmp_path / "dedup.sqlite", threshold=0.98)
+    assert off.find(*_fp(BASE.format(2).replace(".", "!"))) == (None, "")
+    off.close()
+
+
+def test_sync_keeps_both_wordings_and_cites_only_real_copies(index):
+    from src.core.ingestion import sync_folder
+    from src.core.rag import _citations
+
+    raw = Path("raw")
+    raw.mkdir()
+    (raw / "a.txt").write_text(BASE.format(2))
+    (raw / "b.txt").write_text(BASE.format(5))
+    (raw / "c.txt").write_text(BASE.format(2))
+    report = sync_folder(raw, workers=1)
+    assert (report["chunks_added"], report["exact_dups"], report["near_dups"]) == (2, 1, 0)
+
+    hits = index.similarity_search("warranty years", k=5)
+    texts = {h["text"]: h for h in hits}
+    assert set(texts) == {BASE.format(2), BASE.format(5)}
+    two = _citations([texts[BASE.format(2)]])[0]
+    assert sorted([two["path"]] + two.get("also", [])) == [str(raw / "a.txt"), str(raw / "c.txt")]
+    five = _citations([texts[BASE.format(5)]])[0]
+    assert five["path"] == str(raw / "b.txt") and "also" not in five
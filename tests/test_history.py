@@ -0,0 +1,35 @@
+import json
+import re
+
+import pytest
+
+from src.core import history
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history.HIST_DIR.mkdir(parents=True)
+    monkeypatch.setattr(history, "_store", None)
+    yield
+    if history._store is not None:
+        history._store._db.close()
+
+
+def test_legacy_history_goes_to_its_own_session(store):
+    old = [{"role": "user", "content": "my order number is 1234"}, {"role": "assistant", "content": "Thanks."}]
+    history.HIST_FILE.write_text("".join(json.dumps(r) + "\n" for r in old), encoding="utf-8")
+
+    assert history.import_legacy() == 2
+    assert history.import_legacy() == 0   # once only
+    assert history.load_recent("a-new-visitor") == []
+
+    legacy = history.legacy_session()
+    assert re.fullmatch(r"legacy-[0-9a-f]{32}", legacy)
+    with open(history.export_path(legacy), encoding="utf-8") as f:
+        assert [json.loads(line)["content"] for line in f] == [r["content"] for r in old]
+
+
+def test_no_legacy_file_no_legacy_session(store):
+    assert history.import_legacy() == 0
+    assert history.legacy_session() is None
@@ -0,0 +1,77 @@
+import numpy as np
+
+from scripts.fake_gemini import fake_vector
+from src.core.segments import KEEP_VERSIONS
+
+
+def _add(index, n, source):
+    texts = [f"{source} part {i}: refunds, returns and shipping times" for i in range(n)]
+    return index.add_texts(texts, [{"source": source, "path": f"raw/{source}"}] * n)
+
+
+def _live(index):
+    idx = index._get_index()
+    return sorted((seg.ids[i].decode(), seg.doc(i)["text"]) for seg in idx["segments"] for i in seg.live_rows())
+
+
+def test_compact_keeps_live_rows_and_results(index):
+    ids = [cid for i in range(4) for cid in _add(index, 10, f"doc{i}.txt")]
+    index.delete_ids(ids[5:15])
+    index.set_sources({ids[0]: [{"source": "doc0.txt", "path": "raw/doc0.txt"},
+                                {"source": "copy.txt", "path": "raw/copy.txt"}]})
+    live, summary = _live(index), index.index_summary()
+    q = fake_vector("refunds")
+    vector = [h["id"] for h in index.similarity_search("refunds", k=8, qvec=q, mode="vector")]
+    # BM25 statistics are per segment, so only the clear winner is stable across a merge
+    lexical = index.similarity_search("doc2.txt part 3", k=8, mode="lexical")[0]["id"]
+
+    index.compact()
+    idx = index._get_index()
+    assert len(idx["segments"]) == 1 and not idx["segments"][0].deleted
+    assert _live(index) == live and index.index_summary() == summary
+    assert [h["id"] for h in index.similarity_search("refunds", k=8, qvec=q, mode="vector")] == vector
+    assert index.similarity_search("doc2.txt part 3", k=8, mode="lexical")[0]["id"] == lexical
+    assert index.source_ids("copy.txt") == [ids[0]]
+
+
+def test_writes_during_a_merge_are_kept(index, monkeypatch):
+    ids = [cid for i in range(3) for cid in _add(index, 5, f"doc{i}.txt")]
+    staged = index.merge_segments
+
+    def merge_then_write(root, segments):
+        out = staged(root, segments)   # staged without the lock: these land in the inputs meanwhile
+        index.delete_ids([ids[1]])
+        index.set_sources({ids[0]: [{"source": "doc0.txt", "path": "raw/doc0.txt"},
+                                    {"source": "x.txt", "path": "raw/x.txt"}]})
+        return out
+
+    monkeypatch.setattr(index, "merge_segments", merge_then_write)
+    index.compact()
+    assert index.index_summary() == {"total_chunks": 14,
+                                     "by_source": {"doc0.txt": 4, "doc1.txt": 5, "doc2.txt": 5, "x.txt": 1}}
+    assert ids[1] not in [cid for cid, _ in _live(index)]
+
+
+def test_background_merges_bound_the_segment_count(index, monkeypatch):
+    monkeypatch.setattr(index._settings, "INDEX_MAX_SEGMENTS", 4)
+    for i in range(20):
+        _add(index, 3, f"doc{i}.txt")
+    merger = index._stores[index.index_name()].get("merger")
+    if merger is not None:
+        merger.join()
+    idx = index._get_index()
+    assert len(idx["segments"]) <= 4 and idx["count"] == 60
+
+
+def test_reader_on_a_merged_away_snapshot(index):
+    for i in range(3):
+        _add(index, 5, f"doc{i}.txt")
+    old = index._get_index()
+    texts = [seg.doc(i)["text"] for seg in old["segments"] for i in seg.live_rows()]
+    index.compact()
+    for i in range(KEEP_VERSIONS + 1):
+        _add(index, 1, f"late{i}.txt")
+    assert [seg.doc(i)["text"] for seg in old["segments"] for i in seg.live_rows()] == texts
+    q = index._normalize([fake_vector("refunds")])[0]
+    assert len(index._search(old, q, 5)) == 5
+    assert np.isfinite([s for s, _, _ in index._lexical(old, "refunds", 5)]).all()
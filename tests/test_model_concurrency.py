@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from scripts.fake_gemini import FakeModel, _Response
+
+
+class CountingModel(FakeModel):
+    """FakeModel that records the most generate_content calls ever in flight at once."""
+
+    def __init__(self):
+        super().__init__(latency_ms=40)
+        self.inflight = 0
+        self.peak = 0
+
+    def _enter(self):
+        with self._lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+
+    def _leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self._enter()
+        if stream:
+            return self._counted_stream()
+        try:
+            time.sleep(self.latency_ms / 1000.0)
+            return _Response(self.ANSWER)
+        finally:
+            self._leave()
+
+    def _counted_stream(self):
+        try:
+            for w in self.ANSWER.split(" "):
+                time.sleep(self.latency_ms / 1000.0 / 4)
+                yield _Response(w + " ")
+        finally:
+            self._leave()
+
+
+@pytest.fixture
+def model(index, monkeypatch):
+    from src.core import rag
+
+    index.add_texts(["Refunds are accepted within 30 days of purchase."], [{"source": "faq.txt"}])
+    m = CountingModel()
+    monkeypatch.setattr(rag, "_model", m)
+    monkeypatch.setattr(rag, "_model_slots", threading.BoundedSemaphore(2))
+    return m
+
+
+def _run_all(fns):
+    threads = [threading.Thread(target=f) for f in fns]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_streams_share_the_model_concurrency_cap(model):
+    from src.core.rag import stream_answer
+
+    answers = []
+    _run_all([lambda: answers.append(list(stream_answer("refund window?", top_k=1))) for _ in range(6)])
+    assert len(answers) == 6 and all(evs[-1]["type"] == "citations" for evs in answers)
+    assert model.peak == 2
+
+
+def test_batches_run_on_the_shared_model_pool(model, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from src.core import rag
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(rag, "_model_pool", pool)
+    monkeypatch.setattr(rag, "_model_slots", threading.BoundedSemaphore(32))
+    items = [{"id": i, "query": f"refund question {i}"} for i in range(5)]
+    records = []
+    _run_all([lambda: records.extend(rag.answer_batch(items, top_k=1, generate=True, concurrency=4))
+              for _ in range(3)])
+    pool.shutdown()
+    assert len(records) == 15 and all(r["answer"] for r in records)
+    assert model.peak == 2
@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+
+
+def test_ready_survives_tenant_traffic_with_a_one_index_lru(index, monkeypatch):
+    from src.app import main
+
+    monkeypatch.setattr(index._settings, "RESIDENT_INDEX_MAX", 1)
+    with index.use_index("tenant-a"):
+        index.add_texts(["Tenant A ships on Mondays."], [{"source": "a.txt"}])
+    index.add_texts(["Refunds are accepted within 30 days."], [{"source": "faq.txt"}])
+
+    client = TestClient(main.app)   # no lifespan: nothing warms up, the default index is resident already
+    assert client.get("/ready").status_code == 200
+    assert client.post("/chat", json={"query": "when do you ship?", "index": "tenant-a"}).status_code == 200
+    assert client.get("/ready").status_code == 200
+    assert "tenant-a" in index._resident
+
+
+def test_lru_evicts_other_indexes(index, monkeypatch):
+    monkeypatch.setattr(index._settings, "RESIDENT_INDEX_MAX", 1)
+    index.add_texts(["default"], [{"source": "d.txt"}])
+    for name in ("t1", "t2"):
+        with index.use_index(name):
+            index.add_texts([name], [{"source": f"{name}.txt"}])
+    assert list(index._resident) == ["support-knowledge", "t2"]
@@ -0,0 +1,31 @@
+import numpy as np
+
+from scripts.fake_gemini import fake_vector
+from src.core.segments import KEEP_VERSIONS
+
+
+def _add(index, n, source):
+    texts = [f"{source} chunk {i} about refunds and shipping" for i in range(n)]
+    return index.add_texts(texts, [{"source": source, "path": f"raw/{source}"}] * n)
+
+
+def test_old_snapshot_reads_after_gc(index, monkeypatch):
+    monkeypatch.setattr(index._settings, "VECTOR_STORAGE", "int8")   # searches re-score float32 rows
+    for i in range(3):
+        _add(index, 20, f"doc{i}.txt")
+    old = index._get_index()
+    q = np.asarray(fake_vector("refunds"), dtype=np.float32)
+    before = index._search(old, q, 5)
+    hits_before = index._combine("hybrid", before, index._lexical(old, "refunds", 5), 5, False,
+                                 index._normalize([q])[0])
+
+    index.compact()   # one new segment: the old ones are only in older snapshots
+    for i in range(KEEP_VERSIONS + 1):
+        _add(index, 5, f"late{i}.txt")
+    assert not any((index.INDEX_DIR / f"{s.name}.vec.npy").exists() for s in old["segments"])
+
+    after = index._search(old, q, 5)
+    assert [(s, seg.name, r) for s, seg, r in after] == [(s, seg.name, r) for s, seg, r in before]
+    hits_after = index._combine("hybrid", after, index._lexical(old, "refunds", 5), 5, False,
+                                index._normalize([q])[0])
+    assert hits_after == hits_before